@@ -1 +1,37 @@
-# calculate percent of portfolio
\ No newline at end of file
+import numpy as np
+from parsers.columnar import HoldingsBatch, INT_NA
+
+# calculate percent of portfolio
+
+def filing_totals(batch: HoldingsBatch) -> np.ndarray:
+    """Total reported value per filing (indexed like batch.filings). Missing values count as 0"""
+    value = np.where(batch.ints["value_dollar"] == INT_NA, 0, batch.ints["value_dollar"])
+    value = np.maximum(value, 0) # parser uses -1 for missing <value>
+    return np.bincount(batch.filing_idx, weights=value, minlength=len(batch.filings))
+
+
+def percent_of_portfolio(batch: HoldingsBatch) -> np.ndarray:
+    """Per holding row: value as % of its filing's total value"""
+    totals = filing_totals(batch)
+    value = np.maximum(batch.ints["value_dollar"], 0).astype(np.float64)
+    row_totals = totals[batch.filing_idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(row_totals > 0, value / row_totals * 100, 0.0)
+
+
+def top_holdings(batch: HoldingsBatch, accession_number: str, n: int = 10) -> list[dict]:
+    """Largest n positions of one filing by value, with percent of portfolio"""
+    fi = batch.accessions().index(accession_number)
+    rows = np.flatnonzero(batch.filing_idx == fi)
+    pct = percent_of_portfolio(batch)[rows]
+    value = batch.ints["value_dollar"]
+    key = np.where(value[rows] == INT_NA, -1, value[rows]) # missing sorts last (-INT_NA overflows back to INT_NA)
+    order = rows[np.argsort(-key, kind="stable")][:n]
+    pct_by_row = dict(zip(rows.tolist(), pct.tolist()))
+    issuers, cusips = batch.categories["issuer"], batch.categories["cusip"]
+    return [{
+        "issuer": issuers[batch.codes["issuer"][r]],
+        "cusip": cusips[batch.codes["cusip"][r]],
+        "value_dollar": None if value[r] == INT_NA else int(value[r]),
+        "percent_of_portfolio": round(pct_by_row[r], 4),
+    } for r in order.tolist()]
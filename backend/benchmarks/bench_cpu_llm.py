@@ -0,0 +1,84 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from backend/: python benchmarks/bench_cpu_llm.py
+from data_models import FormGEntry
+from edgar_client import EdgarClient
+from http_cache import HttpCache
+from llm.llm_cache import LLMCache
+from parsers.g13_parser import Form13GParser
+from parsers.g13_rules import RULES_MODEL
+
+'''
+Quantized CPU backend (llm/gguf_llm_client.py) on the 13G filings the GPU Qwen model already extracted:
+filings/min for each worker layout, and field accuracy against the cached Qwen answers (exact match; strings compared
+case/whitespace-insensitively). The llm input is rebuilt exactly as Form13GParser sends it.
+python benchmarks/bench_cpu_llm.py --cik CIK0000763212 --model_path models/Qwen3-4B-Q4_K_M.gguf --workers 1 2 4 [--tune]
+'''
+
+
+def same(a, b) -> bool:
+    if isinstance(a, str) and isinstance(b, str):
+        return " ".join(a.lower().split()) == " ".join(b.lower().split())
+    if isinstance(a, float) or isinstance(b, float):
+        return a is not None and b is not None and abs(float(a) - float(b)) < 0.005
+    return a == b
+
+
+def cached_filings(cik: str, limit: int):
+    """[(llm input text, cached llm answer)] for this fund's llm-extracted 13G filings"""
+    cache = LLMCache.open()
+    client = EdgarClient(cik, user_agent="My Name myname@gmail.com", http_cache=HttpCache())
+    parser = Form13GParser(client, None, cache=cache, use_rules=False)
+    out = []
+    for e in cache.entries():
+        if e.tags["model"] in (None, RULES_MODEL):
+            continue
+        entry = cache.get_entry(e.tags["accession"], e.tags["prompt_version"] or "", e.tags["model"] or "")
+        doc = entry["primary_doc"] or client.get_manifest(e.tags["accession"]).primary_doc
+        out.append((parser.llm_input(client.fetch_file(e.tags["accession"], doc))[0], entry["data"]))
+        if len(out) == limit:
+            break
+    return out
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--cik", type=str, required=True, help="Fund CIK the cached filings belong to, e.g. CIK0000763212")
+    parse.add_argument("--model_path", type=str, required=True, help="GGUF file, e.g. a Q4_K_M or Q8_0 build of a small instruct model")
+    parse.add_argument("--limit", type=int, default=24)
+    parse.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Parallel model instances (cores split between them)")
+    parse.add_argument("--threads", type=str, default="auto", help="Total generation threads, 'auto' = physical cores")
+    parse.add_argument("--tune", action="store_true", help="Measure the best thread count first (tune_threads)")
+    args = parse.parse_args()
+
+    from llm.gguf_llm_client import GgufLLMClient, logical_cores, physical_cores, tune_threads
+    filings = cached_filings(args.cik, args.limit)
+    if not filings:
+        sys.exit("no llm-extracted 13G filings in the cache for this fund")
+    texts = [t for t, _ in filings]
+    threads = args.threads
+    if args.tune:
+        print("Tuning threads (1 instance):")
+        threads = tune_threads(args.model_path, texts[0])
+    print(f"{len(texts)} filings, {Path(args.model_path).name}, {physical_cores()} physical / {logical_cores()} logical cores, "
+          f"threads {threads}")
+
+    print(f"{'workers':>8}{'thr/wkr':>8}{'seconds':>10}{'filings/min':>13}{'valid':>7}{'field acc':>11}")
+    for n in args.workers:
+        llm = GgufLLMClient(args.model_path, n_threads=threads, n_workers=n)
+        llm.extract_and_validate_batch(texts[:n], entry_model=FormGEntry, max_tries=0) # load all instances, warm caches
+        start = time.perf_counter()
+        results = llm.extract_and_validate_batch(texts, entry_model=FormGEntry, max_tries=0)
+        elapsed = time.perf_counter() - start
+        fields = matched = valid = 0
+        for result, (_, expected) in zip(results, filings):
+            fields += len(expected)
+            if isinstance(result, Exception):
+                continue
+            valid += 1
+            matched += sum(same(result.get(f), v) for f, v in expected.items())
+        print(f"{n:>8}{llm.n_threads:>8}{elapsed:>10.1f}{len(texts) / elapsed * 60:>13.1f}{valid:>7}{matched / fields:>11.3f}")
+        del llm
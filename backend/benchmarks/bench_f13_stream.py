@@ -0,0 +1,70 @@
+import argparse
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from anywhere: python benchmarks/bench_f13_stream.py
+from parsers.f13_parser import parse_infotable_xml, iter_infotable_rows
+
+'''
+Whole-tree (ET.fromstring + findall) vs streaming (XMLPullParser + clear) 13F infotable parsing on a synthetic filing.
+python benchmarks/bench_f13_stream.py --rows 100000
+'''
+
+NS = "http://www.sec.gov/edgar/document/thirteenf/informationtable"
+ROW = """<infoTable><nameOfIssuer>ISSUER NUMBER {i}</nameOfIssuer><titleOfClass>COM</titleOfClass><cusip>{cusip}</cusip>
+<value>{value}</value><shrsOrPrnAmt><sshPrnamt>{shares}</sshPrnamt><sshPrnamtType>SH</sshPrnamtType></shrsOrPrnAmt>
+<investmentDiscretion>SOLE</investmentDiscretion><votingAuthority><Sole>{shares}</Sole><Shared>0</Shared><None>0</None></votingAuthority></infoTable>
+"""
+
+
+def write_synthetic_infotable(path: Path, n_rows: int) -> None:
+    with path.open("w", encoding="utf-8") as fh:
+        fh.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<informationTable xmlns="{NS}">\n')
+        for i in range(n_rows):
+            fh.write(ROW.format(i=i, cusip=f"{i:08d}0", value=1000 + i, shares=10 * i))
+        fh.write("</informationTable>\n")
+
+
+def file_chunks(path: Path, chunk_size: int = 64 * 1024):
+    with path.open("rb") as fh:
+        while chunk := fh.read(chunk_size):
+            yield chunk
+
+
+def measure(fn):
+    """(rows, seconds, peak traced bytes). Timed and memory-traced in separate runs, tracemalloc slows parsing a lot"""
+    gc.collect()
+    start = time.perf_counter()
+    n = fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--rows", type=int, default=100_000)
+    args = parse.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp).joinpath("infotable.xml")
+        write_synthetic_infotable(path, args.rows)
+        size_mb = path.stat().st_size / 1e6
+        meta = ("0000000000", "2024-11-12", "CIK0000000000", "https://example.com/infotable.xml")
+
+        # both count rows without keeping them, so peak memory is the parser's, not the result list's
+        tree = measure(lambda: len(parse_infotable_xml(path.read_bytes(), *meta)))
+        stream = measure(lambda: sum(1 for _ in iter_infotable_rows(file_chunks(path), *meta)))
+
+    print(f"{args.rows} rows, {size_mb:.1f} MB xml")
+    print(f"{'parser':<10}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}")
+    for name, (n, secs, peak) in (("tree", tree), ("stream", stream)):
+        print(f"{name:<10}{n:>10}{secs:>10.2f}{n / secs:>12.0f}{peak / 1e6:>10.1f}")
@@ -0,0 +1,59 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from anywhere: python benchmarks/bench_f13_text.py
+from parsers.f13_text_parser import parse_text_table
+
+'''
+Throughput of the legacy plain-text 13F table parser, single core, on synthetic filings in the layouts seen on EDGAR
+(fixed width under a separator line, pipe delimited, tab separated).
+python benchmarks/bench_f13_text.py --filings 2000 --rows 300
+'''
+
+HEADER = """<DOCUMENT>
+<TYPE>13F-HR
+<TEXT>
+                                 FORM 13F INFORMATION TABLE
+<TABLE>
+<CAPTION>
+                                                      VALUE     SHARES/   SH/ PUT/ INVSTMT  OTHER        VOTING AUTHORITY
+NAME OF ISSUER               TITLE OF CLASS  CUSIP    (x$1000)  PRN AMT   PRN CALL DSCRETN  MANAGERS   SOLE     SHARED   NONE
+---------------------------- -------------- --------- --------- --------- --- ---- -------- -------- -------- -------- --------
+<S>                          <C>            <C>       <C>       <C>       <C> <C>  <C>      <C>      <C>      <C>      <C>
+"""
+FOOTER = "</TABLE>\n</TEXT>\n</DOCUMENT>\n"
+
+
+def fixed_width_row(i: int) -> str:
+    return (f"{'ISSUER NUMBER ' + str(i):<28} {'COM':<14} {i:08d}0 {1000 + i:>9,} {10 * i:>9,} SH       SOLE     "
+            f"{'':<8} {10 * i:>8,} {0:>8} {0:>8}\n")
+
+
+def synthetic_filing(n_rows: int, layout: str) -> bytes:
+    if layout == "fixed":
+        body = "".join(fixed_width_row(i) for i in range(n_rows))
+        return (HEADER + body + FOOTER).encode("latin-1")
+    sep = "|" if layout == "pipe" else "\t"
+    rows = (sep.join([f"ISSUER NUMBER {i}", "COM", f"{i:08d}0", f"{1000 + i:,}", f"{10 * i:,}", "SH", "", "SOLE", "",
+                      f"{10 * i:,}", "0", "0"]) for i in range(n_rows))
+    return ("\n".join(rows) + "\n").encode("latin-1")
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--filings", type=int, default=2000)
+    parse.add_argument("--rows", type=int, default=300, help="Holdings per filing")
+    args = parse.parse_args()
+
+    meta = ("0000000000", "2012-08-14", "CIK0000000000", "https://example.com/13f-hr.txt")
+    print(f"{args.filings} filings x {args.rows} rows per layout")
+    print(f"{'layout':<8}{'rows':>10}{'seconds':>10}{'filings/min':>14}{'rows/s':>12}")
+    for layout in ("fixed", "pipe", "tab"):
+        doc = synthetic_filing(args.rows, layout)
+        assert len(parse_text_table(doc, *meta)) == args.rows, layout
+        start = time.perf_counter()
+        n = sum(len(parse_text_table(doc, *meta)) for _ in range(args.filings))
+        secs = time.perf_counter() - start
+        print(f"{layout:<8}{n:>10}{secs:>10.2f}{args.filings / secs * 60:>14.0f}{n / secs:>12.0f}")
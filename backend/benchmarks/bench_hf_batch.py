@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from backend/: python benchmarks/bench_hf_batch.py
+from data_models import FormGEntry
+from llm.llm_cache import LLMCache
+from parsers.g13_rules import RULES_MODEL
+
+'''
+Filings/min of HfLLMClient at several generate() batch sizes, on 13G texts the llm cache has already seen
+(llm input text is rebuilt from the cached primary docs with --cik, or synthetic cover pages without it).
+Batch size 1 goes through extract_and_validate_batch too, so the numbers only differ by batching.
+python benchmarks/bench_hf_batch.py --model Qwen/Qwen3-0.6B --filings 32 --batch_sizes 1 4 8 16 [--no_thinking] [--free]
+'''
+
+COVER = """SCHEDULE 13G (Amendment No. {i}) Issuer Number {i} Inc. (Name of Issuer) Common Stock (Title of Class of Securities)
+{cusip} (CUSIP Number) September 30, 2024 (Date of Event Which Requires Filing of this Statement)
+1 NAMES OF REPORTING PERSONS Fund Manager {i} LLC 2 CHECK THE APPROPRIATE BOX IF A MEMBER OF A GROUP
+5 SOLE VOTING POWER {sole:,} 6 SHARED VOTING POWER -0- 7 SOLE DISPOSITIVE POWER {sole:,} 8 SHARED DISPOSITIVE POWER -0-
+9 AGGREGATE AMOUNT BENEFICIALLY OWNED BY EACH REPORTING PERSON {sole:,}
+11 PERCENT OF CLASS REPRESENTED BY AMOUNT IN ROW (9) {pct:.2f}% 12 TYPE OF REPORTING PERSON IA
+"""
+
+
+def synthetic_texts(n: int):
+    # varying lengths so the length bucketing has something to sort
+    return [COVER.format(i=i, cusip=f"{i:08d}0", sole=1000 * (i + 1), pct=(i % 9) + 5.1) + "Item 4. Ownership. " * (i % 7 * 20)
+            for i in range(n)]
+
+
+def cached_texts(cik: str, n: int):
+    from edgar_client import EdgarClient
+    from http_cache import HttpCache
+    from parsers.g13_parser import Form13GParser
+    cache = LLMCache.open()
+    client = EdgarClient(cik, user_agent="My Name myname@gmail.com", http_cache=HttpCache())
+    parser = Form13GParser(client, None, cache=cache, use_rules=False)
+    texts = []
+    for e in cache.entries():
+        if e.tags["model"] == RULES_MODEL:
+            continue
+        entry = cache.get_entry(e.tags["accession"], e.tags["prompt_version"] or "", e.tags["model"] or "")
+        doc = entry["primary_doc"] or client.get_manifest(e.tags["accession"]).primary_doc
+        texts.append(parser.llm_input(client.fetch_file(e.tags["accession"], doc))[0])
+        if len(texts) == n:
+            break
+    return texts
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--model", type=str, default="Qwen/Qwen3-0.6B")
+    parse.add_argument("--filings", type=int, default=32)
+    parse.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parse.add_argument("--max_new_tokens", type=int, default=1024)
+    parse.add_argument("--no_thinking", action="store_true", help="enable_thinking=False (shorter outputs)")
+    parse.add_argument("--max_thinking_tokens", type=int, default=None)
+    parse.add_argument("--free", action="store_true", help="constrained_json=False: unconstrained decoding, to compare")
+    parse.add_argument("--cik", type=str, default=None, help="Use cached 13G filings of this fund instead of synthetic cover pages")
+    args = parse.parse_args()
+
+    from llm.hf_llm_client import HfLLMClient # torch/transformers: only when actually benchmarking (bench_vllm_client imports this file)
+    texts = cached_texts(args.cik, args.filings) if args.cik else synthetic_texts(args.filings)
+    llm = HfLLMClient(args.model)
+    llm.max_new_tokens = args.max_new_tokens
+    llm.enable_thinking = not args.no_thinking
+    llm.max_thinking_tokens = args.max_thinking_tokens
+    llm.constrained_json = not args.free
+    llm.extract_data_llm_batch(texts[:1], batch_size=1) # warm up (cuda init, kernels)
+
+    print(f"{len(texts)} filings, model {args.model} on {llm.model.device}, max_new_tokens {args.max_new_tokens}, "
+          f"{'free' if args.free else 'constrained json'}, thinking {'off' if args.no_thinking else 'on'}")
+    print(f"{'batch':>6}{'seconds':>10}{'filings/min':>13}{'valid':>7}")
+    base = None
+    for bs in args.batch_sizes:
+        llm.batch_size = bs
+        start = time.perf_counter()
+        results = llm.extract_and_validate_batch(texts, entry_model=FormGEntry, max_tries=0)
+        elapsed = time.perf_counter() - start
+        per_min = len(texts) / elapsed * 60
+        base = base or per_min
+        valid = sum(not isinstance(r, Exception) for r in results)
+        print(f"{bs:>6}{elapsed:>10.1f}{per_min:>13.1f}{valid:>7}   x{per_min / base:.2f}")
@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from backend/: python benchmarks/bench_hf_prefix_cache.py
+from edgar_client import EdgarClient
+from http_cache import HttpCache
+from parsers.g13_parser import Form13GParser
+
+'''
+System prompt kv cache in HfLLMClient: speed and equality with the uncached path.
+Runs every filing in llm/llm_cache.json (the accessions the prompt was developed on) greedy, with prefix_cache off
+then on, one at a time (extract_data_llm) and batched (extract_data_llm_batch, the default 13G path):
+- prefill: max_new_tokens=1, i.e. time to first token (where the cached prefix saves the work)
+- full: complete extraction; outputs must match the uncached single-filing ones
+python benchmarks/bench_hf_prefix_cache.py --cik CIK0000763212 --model Qwen/Qwen3-0.6B [--no_thinking] [--batch_size 8]
+'''
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--cik", type=str, required=True, help="Fund CIK the filings belong to, e.g. CIK0000763212")
+    parse.add_argument("--model", type=str, default="Qwen/Qwen3-0.6B")
+    parse.add_argument("--json", type=str, default="llm/llm_cache.json")
+    parse.add_argument("--max_new_tokens", type=int, default=1024)
+    parse.add_argument("--no_thinking", action="store_true")
+    parse.add_argument("--batch_size", type=int, default=8)
+    args = parse.parse_args()
+
+    from llm.hf_llm_client import HfLLMClient
+    with open(args.json, "r") as f:
+        raw = json.load(f)
+    accessions = list(raw)
+    client = EdgarClient(args.cik, user_agent="My Name myname@gmail.com", http_cache=HttpCache())
+    llm = HfLLMClient(args.model)
+    llm.do_sample = False # greedy, so both paths are comparable token for token
+    llm.enable_thinking = not args.no_thinking
+    parser = Form13GParser(client, llm, use_rules=False)
+    texts = []
+    for acc in accessions:
+        doc = client.get_manifest(acc).primary_doc
+        texts.append(parser.llm_input(client.fetch_file(acc, doc))[0])
+    llm.extract_data_llm(texts[0]) # warm up
+
+    runs = {"single": lambda: [llm.extract_data_llm(t) for t in texts],
+            "batched": lambda: llm.extract_data_llm_batch(texts, batch_size=args.batch_size)}
+    results = {}
+    for path, run in runs.items():
+        for mode, max_new_tokens in (("prefill", 1), ("full", args.max_new_tokens)):
+            llm.max_new_tokens = max_new_tokens
+            for cached in (False, True):
+                llm.prefix_cache = cached
+                start = time.perf_counter()
+                outputs = run()
+                results[path, mode, cached] = (time.perf_counter() - start, outputs)
+
+    print(f"\n{len(texts)} filings, model {args.model} on {llm.model.device}, system prefix {len(llm._prefix()[0])} tokens")
+    print(f"{'':<18}{'uncached s':>12}{'cached s':>10}{'speedup':>9}")
+    for path in runs:
+        for mode in ("prefill", "full"):
+            off, on = results[path, mode, False][0], results[path, mode, True][0]
+            print(f"{path + ' ' + mode:<18}{off:>12.2f}{on:>10.2f}{off / on:>8.2f}x")
+    reference = results["single", "full", False][1]
+    for path, cached in (("single", True), ("batched", False), ("batched", True)):
+        same = [a == b for a, b in zip(reference, results[path, "full", cached][1])]
+        print(f"{path} {'cached' if cached else 'uncached'}: {sum(same)}/{len(same)} identical to single uncached")
+        for acc, ok in zip(accessions, same):
+            if not ok:
+                print(f"  differs: {acc}")
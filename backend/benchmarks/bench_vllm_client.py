@@ -0,0 +1,51 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from backend/: python benchmarks/bench_vllm_client.py
+from data_models import FormGEntry
+from llm.stub_llm_server import StubLLMServer
+from llm.vllm_llm_client import VllmLLMClient
+from bench_hf_batch import synthetic_texts
+
+'''
+Filings/min of VllmLLMClient at several in-flight limits. Without --base_url it starts the stub server
+(fixed --latency per request, like a server that batches everything in flight), so the numbers show the client side only.
+python benchmarks/bench_vllm_client.py --filings 64 --in_flight 1 4 16 32
+python benchmarks/bench_vllm_client.py --base_url http://localhost:8000/v1 --model Qwen/Qwen3-14B --max_new_tokens 2048
+'''
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--base_url", type=str, default=None, help="OpenAI-compatible server; default: in-process stub")
+    parse.add_argument("--model", type=str, default="stub")
+    parse.add_argument("--filings", type=int, default=64)
+    parse.add_argument("--in_flight", type=int, nargs="+", default=[1, 4, 16, 32])
+    parse.add_argument("--max_new_tokens", type=int, default=2048)
+    parse.add_argument("--latency", type=float, default=0.5, help="stub only: seconds per request")
+    args = parse.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = StubLLMServer(model=args.model, latency=args.latency, max_running=max(args.in_flight)).start()
+        base_url = server.base_url
+    texts = synthetic_texts(args.filings)
+
+    print(f"{len(texts)} filings against {base_url} ({args.model})")
+    print(f"{'in flight':>10}{'seconds':>10}{'filings/min':>13}{'valid':>7}")
+    base = None
+    for n in args.in_flight:
+        llm = VllmLLMClient(args.model, base_url=base_url, max_in_flight=n)
+        llm.max_new_tokens = args.max_new_tokens
+        start = time.perf_counter()
+        results = llm.extract_and_validate_batch(texts, entry_model=FormGEntry, max_tries=0)
+        elapsed = time.perf_counter() - start
+        per_min = len(texts) / elapsed * 60
+        base = base or per_min
+        valid = sum(not isinstance(r, Exception) for r in results)
+        print(f"{n:>10}{elapsed:>10.1f}{per_min:>13.1f}{valid:>7}   x{per_min / base:.2f}")
+        llm.close()
+    if server is not None:
+        server.stop()
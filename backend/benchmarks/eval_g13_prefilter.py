@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1])) # run from backend/: python benchmarks/eval_g13_prefilter.py
+from data_models import FormGEntry
+from edgar_client import EdgarClient
+from http_cache import HttpCache
+from llm.llm_cache import LLMCache
+from parsers.g13_parser import Form13GParser
+from parsers.g13_prefilter import MAX_INPUT_TOKENS, value_recall
+from parsers.g13_rules import RULES_MODEL
+
+'''
+Does the 13G prefilter + token budget keep what the LLM needs? Replays cached LLM extractions:
+- input tokens: full document text vs what budget_13g_text keeps
+- value recall: share of the cached answer's values still present in the kept text (no LLM needed)
+- with --llm: re-extract from the kept text and compare field by field with the cached answer
+python benchmarks/eval_g13_prefilter.py --cik CIK0000763212 [--max_tokens 2048] [--llm --config_file config_hf.json]
+'''
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--cik", type=str, required=True, help="Fund CIK the cached filings belong to, e.g. CIK0000763212")
+    parse.add_argument("--max_tokens", type=int, default=MAX_INPUT_TOKENS)
+    parse.add_argument("--limit", type=int, default=50)
+    parse.add_argument("--llm", action="store_true", help="Re-run the LLM on the kept text and compare with the cache")
+    parse.add_argument("--config_file", type=str, default="config_hf.json")
+    args = parse.parse_args()
+
+    llm = None
+    if args.llm:
+        from llm.helpers import get_llm_client
+        llm = get_llm_client(json.load(open(os.path.join("config", args.config_file))), debug=False)
+    cache = LLMCache.open()
+    client = EdgarClient(args.cik, user_agent="My Name myname@gmail.com", http_cache=HttpCache())
+    parser = Form13GParser(client, llm, cache=cache, use_rules=False)
+    parser.max_input_tokens = args.max_tokens
+
+    cached = [e for e in cache.entries() if e.tags["model"] != RULES_MODEL][:args.limit]
+    totals = {"raw": 0, "kept": 0, "recall": 0.0, "fields": 0, "same": 0}
+    print(f"{'accession':<20}{'raw tok':>9}{'kept tok':>9}{'recall':>8}  missing / llm diffs")
+    for e in cached:
+        acc = e.tags["accession"]
+        entry = cache.get_entry(acc, e.tags["prompt_version"] or "", e.tags["model"] or "")
+        doc = entry["primary_doc"] or client.get_manifest(acc).primary_doc
+        llm_text, report = parser.llm_input(client.fetch_file(acc, doc))
+        recall, missing = value_recall(llm_text, entry["data"])
+        totals["raw"] += report["raw_tokens"]
+        totals["kept"] += report["kept_tokens"]
+        totals["recall"] += recall
+        notes = missing
+        if llm is not None:
+            fresh = llm.extract_and_validate(llm_text, entry_model=FormGEntry, max_tries=1)
+            diffs = [f for f in entry["data"] if fresh.get(f) != entry["data"][f]]
+            totals["fields"] += len(entry["data"])
+            totals["same"] += len(entry["data"]) - len(diffs)
+            notes = missing + [f"llm:{f}" for f in diffs]
+        print(f"{acc:<20}{report['raw_tokens']:>9}{report['kept_tokens']:>9}{recall:>8.2f}  {' '.join(notes)}")
+
+    n = len(cached)
+    if n:
+        print(f"\n{n} filings: {totals['kept']} / {totals['raw']} input tokens (-{1 - totals['kept'] / max(totals['raw'], 1):.0%}), "
+              f"mean value recall {totals['recall'] / n:.3f}")
+        if totals["fields"]:
+            print(f"field agreement with cached extraction: {totals['same'] / totals['fields']:.3f}")
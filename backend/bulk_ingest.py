@@ -0,0 +1,205 @@
+import argparse
+import gzip
+import heapq
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from edgar_client import EdgarClient, RateLimiter
+from http_cache import HttpCache
+from sync import FORM_MATCHERS
+
+'''
+Offline discovery of filings from EDGAR bulk files, instead of crawling submissions feeds fund by fund.
+- full-index: https://www.sec.gov/Archives/edgar/full-index/{year}/QTR{n}/form.idx (fixed width) or master.idx (| delimited)
+- bulk submissions: https://www.sec.gov/Archives/edgar/daily-index/bulkdata/submissions.zip (one CIK##########.json per filer,
+  plus CIK##########-submissions-###.json history shards)
+Both are read from local downloads and turned into WorkItems; only the filings themselves are fetched from EDGAR.
+The parsers run one fund at a time, but the indexes are ordered by form/company, not CIK: group_by_cik sorts the
+items in chunks of SORT_CHUNK and spills them to temp files, so a whole-universe run stays bounded in memory.
+
+Example run: cd backend; python bulk_ingest.py --index full-index/2024/QTR4/form.idx --form_type 13f --dest csv
+'''
+
+
+class WorkItem(NamedTuple):
+    cik: str # full CIK with leading zeros, e.g. CIK0000763212
+    form: str
+    accession: str # with dashes, like the submissions feed
+    filing_date: str = ""
+
+
+def _full_cik(cik) -> str:
+    return f"CIK{int(cik):010d}"
+
+
+def _open_text(path: str):
+    """open .idx or .idx.gz as text"""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="latin-1")
+    return open(path, "r", encoding="latin-1")
+
+
+ACC_FROM_FILENAME = re.compile(r"(\d{10}-\d{2}-\d{6})")
+
+
+def iter_full_index(path: str) -> Iterator[WorkItem]:
+    """Stream WorkItems from a quarterly form.idx or master.idx, line by line"""
+    with _open_text(path) as fh:
+        columns = None # form.idx: {name: (start, end)} char spans from the header
+        delimited = False # master.idx
+        for line in fh:
+            if columns is None and not delimited:
+                if line.startswith("CIK|Company Name|"):
+                    delimited = True
+                elif line.startswith("Form Type") and "File Name" in line:
+                    names = ["Form Type", "Company Name", "CIK", "Date Filed", "File Name"]
+                    starts = [line.index(n) for n in names]
+                    columns = {n: (s, e) for n, s, e in zip(names, starts, starts[1:] + [None])}
+                continue
+            if not line.strip() or line.startswith("---"):
+                continue
+
+            if delimited:
+                parts = line.rstrip("\n").split("|")
+                if len(parts) != 5:
+                    continue
+                cik, _, form, date, filename = parts
+            else:
+                def col(name):
+                    s, e = columns[name]
+                    return line[s:e].strip()
+                # company names can overflow their column, so take cik/date/file from the right-hand tokens
+                tokens = line.split()
+                if len(tokens) < 4:
+                    continue
+                form, cik, date, filename = col("Form Type"), tokens[-3], tokens[-2], tokens[-1]
+            m = ACC_FROM_FILENAME.search(filename)
+            if not m or not cik.strip().isdigit():
+                continue
+            yield WorkItem(_full_cik(cik), form.strip(), m.group(1), date.strip())
+
+
+def iter_submissions_zip(path: str, ciks: Optional[Iterable[str]] = None) -> Iterator[WorkItem]:
+    """Stream WorkItems from the bulk submissions.zip without extracting it: each member is decoded straight off the zip stream.
+    ciks: optional set of full CIKs to keep; other members are skipped before they're read"""
+    wanted = set(ciks) if ciks else None
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            name = os.path.basename(info.filename)
+            if not name.startswith("CIK") or not name.endswith(".json"):
+                continue
+            cik = name[:13] # CIK + 10 digits
+            if wanted is not None and cik not in wanted:
+                continue
+            with zf.open(info) as member:
+                data = json.load(member)
+            block = data["filings"]["recent"] if "filings" in data else data # shards are just the columnar block
+            for acc, form, date in zip(block.get("accessionNumber", []), block.get("form", []), block.get("filingDate", [])):
+                yield WorkItem(cik, form, acc, date)
+
+
+def filter_forms(items: Iterable[WorkItem], form_type: str) -> Iterator[WorkItem]:
+    matches = FORM_MATCHERS[form_type]
+    return (w for w in items if matches(w.form))
+
+
+SORT_CHUNK = 500_000 # work items sorted in memory at once (~300 bytes each, so ~150MB); more spill to disk
+
+
+def _spill(chunk: List[WorkItem]):
+    """One sorted run in an anonymous temp file, one tab separated item per line"""
+    fh = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for w in chunk:
+        fh.write("\t".join(w) + "\n")
+    fh.seek(0)
+    return fh
+
+
+def _read_run(fh) -> Iterator[WorkItem]:
+    for line in fh:
+        yield WorkItem(*line.rstrip("\n").split("\t"))
+
+
+def group_by_cik(items: Iterable[WorkItem], chunk_size: int = SORT_CHUNK) -> Iterator[Tuple[str, List[WorkItem]]]:
+    """(cik, its items) in CIK order, items in input order. External merge sort: at most chunk_size items in memory"""
+    runs = []
+    chunk: List[WorkItem] = []
+    try:
+        for w in items:
+            chunk.append(w)
+            if len(chunk) >= chunk_size:
+                runs.append(_spill(sorted(chunk, key=lambda w: w.cik)))
+                chunk = []
+        chunk.sort(key=lambda w: w.cik)
+        merged = heapq.merge(*(_read_run(fh) for fh in runs), chunk, key=lambda w: w.cik) # stable: earlier runs first
+        for cik, group in groupby(merged, key=lambda w: w.cik):
+            yield cik, list(group)
+    finally:
+        for fh in runs:
+            fh.close()
+
+
+def run_work_items(items: Iterable[WorkItem], form_type: str, user_agent: str, dest: str = "csv",
+                   limit: Optional[int] = None, llm_client=None, http_cache: Optional[HttpCache] = None) -> Dict[str, int]:
+    """Feed WorkItems straight into the parsers, one fund at a time. All funds share one session, rate limiter and http cache.
+    Returns {cik: n rows/filings extracted}"""
+    from parsers.f13_parser import Form13FParser
+    from parsers.g13_parser import Form13GParser
+    from db.savers import save_13f_to_db, save_13g_to_db, save_to_csv
+
+    limiter = RateLimiter()
+    session = None
+    results: Dict[str, int] = {}
+    for cik, group in group_by_cik(filter_forms(items, form_type)):
+        accessions = list(dict.fromkeys(w.accession for w in group)) # dedup, same filing can be in several indexes
+        client = EdgarClient(cik, user_agent=user_agent, limiter=limiter, session=session, http_cache=http_cache)
+        session = client.session
+        if form_type == "13f":
+            data = Form13FParser(client).parse_all(accessions, limit=limit, columnar=True)
+            out_csv, save_db = "data/extracted_13f.csv", save_13f_to_db
+        else:
+            data = Form13GParser(client, llm_client).parse_all(accessions, limit=limit)
+            out_csv, save_db = "data/extracted_13g.csv", save_13g_to_db
+        if dest in ("csv", "both"):
+            save_to_csv(data, out_csv)
+        if dest in ("db", "both"):
+            save_db(data)
+        results[cik] = len(data)
+    return results
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="Bulk EDGAR ingestion from local full-index / submissions.zip files")
+    parse.add_argument("--index", nargs="*", default=[], help="Local form.idx / master.idx files (optionally .gz)")
+    parse.add_argument("--submissions_zip", type=str, help="Local bulk submissions.zip")
+    parse.add_argument("--form_type", type=str, choices=["13f", "13g"], required=True)
+    parse.add_argument("--limit", type=int, required=False, help="Max number of filings to process per fund")
+    parse.add_argument("--dest", type=str, choices=["csv", "db", "both"], default="csv")
+    parse.add_argument("--config_file", type=str, default="config_hf.json", help="Name of config json file in config folder, for 13G LLM processing")
+    parse.add_argument("--list_only", action="store_true", help="Only print the work items, don't fetch anything")
+    args = parse.parse_args()
+
+    def all_items():
+        for path in args.index:
+            yield from iter_full_index(path)
+        if args.submissions_zip:
+            yield from iter_submissions_zip(args.submissions_zip)
+
+    if args.list_only:
+        for w in filter_forms(all_items(), args.form_type):
+            print(f"{w.cik}\t{w.form}\t{w.accession}\t{w.filing_date}")
+    else:
+        llm_client = None
+        if args.form_type == "13g":
+            from llm.helpers import get_llm_client
+            llm_client = get_llm_client(json.load(open(os.path.join("config", args.config_file))), debug=False)
+        http_cache = HttpCache()
+        counts = run_work_items(all_items(), args.form_type, user_agent="My Name myname@gmail.com",
+                                dest=args.dest, limit=args.limit, llm_client=llm_client, http_cache=http_cache)
+        print(f"Ingested {sum(counts.values())} records from {len(counts)} funds")
+        print(http_cache.summary())
@@ -0,0 +1,230 @@
+import argparse
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+'''
+Size/age limits, invalidation and stats shared by the parser caches (f13 PackedCache, 13G LLMCache).
+A cache only has to provide:
+- entries() -> iterable of CacheEntry
+- delete(keys) -> # deleted
+- optionally compact_if_needed() -> dict, called after evictions so deleted bytes leave the disk too (PackedCache)
+The manager keeps hit/miss counts and last access times in a small json next to the cache (merged across processes on save),
+evicts expired entries (max_age_days), then least recently used ones until the cache is under max_bytes.
+
+python cache_manager.py report
+python cache_manager.py evict --cache llm --max_mb 100
+python cache_manager.py invalidate --cache f13 --parser_version_below 2
+python cache_manager.py invalidate --cache llm --stale_prompt
+'''
+
+
+class CacheEntry(NamedTuple):
+    key: str
+    size: int # bytes
+    cache_time: float
+    tags: dict # parser_version / prompt_version / model, whatever the cache stores
+
+
+AGE_BUCKETS = [("<1d", 1), ("1-7d", 7), ("7-30d", 30), ("30-90d", 90), (">90d", None)]
+
+# default limits per cache; None = unbounded
+CACHE_LIMITS = {
+    "f13": {"max_bytes": 2 * 1024**3, "max_age_days": None},
+    "llm": {"max_bytes": 256 * 1024**2, "max_age_days": None},
+}
+
+
+class CacheManager:
+    _shared: Dict[str, "CacheManager"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, name: str, cache, stats_file: str, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.name = name
+        self.cache = cache
+        self.stats_file = Path(stats_file)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0} # this process, not yet saved
+        self.access: Dict[str, float] = {} # key -> last access, this process
+        self.saved = self._read_stats()
+
+    @classmethod
+    def shared(cls, name: str, cache, stats_file: str) -> "CacheManager":
+        """One manager per cache name and process, with CACHE_LIMITS defaults"""
+        with cls._shared_lock:
+            manager = cls._shared.get(name)
+            if manager is None or manager.cache is not cache:
+                manager = cls._shared[name] = cls(name, cache, stats_file, **CACHE_LIMITS.get(name, {}))
+            return manager
+
+    # bookkeeping
+    def hit(self, key: str) -> None:
+        with self.lock:
+            self.counts["hits"] += 1
+            self.access[key] = time.time()
+
+    def miss(self, key: str) -> None:
+        with self.lock:
+            self.counts["misses"] += 1
+
+    def touch(self, key: str) -> None:
+        """Count a write as a use too, so fresh entries aren't the first evicted"""
+        with self.lock:
+            self.access[key] = time.time()
+
+    def _read_stats(self) -> dict:
+        try:
+            return json.loads(self.stats_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "access": {}}
+
+    @contextmanager
+    def _stats_lock(self):
+        """Threads of this process (save_lock) and other processes (flock on <stats>.lock) take turns at read-merge-write"""
+        self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.save_lock, open(self.stats_file.with_suffix(".lock"), "a") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """Merge this process' counts/access times into the stats file (other processes may have saved since we read it)"""
+        with self.lock:
+            counts, access = self.counts, self.access
+            self.counts, self.access = {"hits": 0, "misses": 0}, {}
+        live = {e.key for e in self.cache.entries()}
+        with self._stats_lock():
+            stats = self._read_stats()
+            stats["hits"] += counts["hits"]
+            stats["misses"] += counts["misses"]
+            for key, t in access.items():
+                stats["access"][key] = max(t, stats["access"].get(key, 0))
+            stats["access"] = {k: t for k, t in stats["access"].items() if k in live} # forget evicted/deleted keys
+            fd, tmp = tempfile.mkstemp(dir=self.stats_file.parent, prefix=self.stats_file.name + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(stats, fh)
+                os.replace(tmp, self.stats_file)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+        self.saved = stats
+
+    def last_access(self, entry: CacheEntry) -> float:
+        return max(self.access.get(entry.key, 0), self.saved["access"].get(entry.key, 0), entry.cache_time)
+
+    # limits
+    def enforce(self) -> dict:
+        """Drop entries older than max_age_days, then least recently used ones until total size <= max_bytes"""
+        entries = list(self.cache.entries())
+        doomed: List[str] = []
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            doomed = [e.key for e in entries if e.cache_time < cutoff]
+        expired = len(doomed)
+        if self.max_bytes is not None:
+            gone = set(doomed)
+            alive = [e for e in entries if e.key not in gone]
+            total = sum(e.size for e in alive)
+            for e in sorted(alive, key=self.last_access):
+                if total <= self.max_bytes:
+                    break
+                doomed.append(e.key)
+                total -= e.size
+        if doomed:
+            self.cache.delete(doomed)
+        return {"expired": expired, "evicted": len(doomed) - expired}
+
+    def invalidate(self, predicate: Callable[[CacheEntry], bool]) -> int:
+        """Delete every entry the predicate matches, e.g. lambda e: e.tags.get("model") == "old-model" """
+        return self.cache.delete([e.key for e in self.cache.entries() if predicate(e)])
+
+    def flush(self) -> dict:
+        """End of a run: apply limits, reclaim evicted bytes on disk and persist stats"""
+        result = self.enforce()
+        compact = getattr(self.cache, "compact_if_needed", None)
+        if compact is not None:
+            compacted = compact()
+            if compacted:
+                result["compacted"] = compacted
+        self.save()
+        return result
+
+    def report(self) -> dict:
+        entries = list(self.cache.entries())
+        hits = self.saved["hits"] + self.counts["hits"]
+        misses = self.saved["misses"] + self.counts["misses"]
+        now = time.time()
+        ages = {label: 0 for label, _ in AGE_BUCKETS}
+        for e in entries:
+            days = (now - e.cache_time) / 86400
+            label = next(label for label, limit in AGE_BUCKETS if limit is None or days < limit)
+            ages[label] += 1
+        return {
+            "cache": self.name,
+            "entries": len(entries),
+            "bytes": sum(e.size for e in entries),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "age": ages,
+        }
+
+
+def open_manager(name: str) -> CacheManager:
+    """CLI helper: manager for a cache by name, at its default location"""
+    if name == "f13":
+        from parsers.f13_parser import Form13FParser
+        return Form13FParser(client=None).cache_manager
+    if name == "llm":
+        from llm.llm_cache import LLMCache
+        return LLMCache.open().manager
+    raise ValueError(f"Unknown cache {name}")
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="Report / evict / invalidate parser caches")
+    parse.add_argument("command", choices=["report", "evict", "invalidate"])
+    parse.add_argument("--cache", choices=["f13", "llm", "all"], default="all")
+    parse.add_argument("--max_mb", type=float, help="evict: size limit (default: CACHE_LIMITS)")
+    parse.add_argument("--max_age_days", type=float, help="evict: drop entries older than this")
+    parse.add_argument("--parser_version_below", type=int, help="invalidate: entries from older parser versions")
+    parse.add_argument("--model", type=str, help="invalidate: entries produced by this model")
+    parse.add_argument("--prompt_version", type=str, help="invalidate: entries made with this prompt version")
+    parse.add_argument("--stale_prompt", action="store_true", help="invalidate: entries not made with the current llm/prompt.txt (incl. old entries with no prompt version)")
+    args = parse.parse_args()
+
+    for name in (["f13", "llm"] if args.cache == "all" else [args.cache]):
+        manager = open_manager(name)
+        if args.command == "evict":
+            if args.max_mb is not None:
+                manager.max_bytes = int(args.max_mb * 1024**2)
+            if args.max_age_days is not None:
+                manager.max_age_days = args.max_age_days
+            print(name, manager.flush())
+        elif args.command == "invalidate":
+            from llm.llm_cache import prompt_version
+            current_prompt = prompt_version()
+            def stale(e: CacheEntry) -> bool:
+                if args.parser_version_below is not None and e.tags.get("parser_version", 0) < args.parser_version_below:
+                    return True
+                if args.model is not None and e.tags.get("model") == args.model:
+                    return True
+                if args.prompt_version is not None and e.tags.get("prompt_version") == args.prompt_version:
+                    return True
+                return args.stale_prompt and "prompt_version" in e.tags and e.tags["prompt_version"] != current_prompt
+            print(f"{name}: invalidated {manager.invalidate(stale)} entries")
+            manager.save()
+        print(json.dumps(manager.report(), indent=2))
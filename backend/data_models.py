@@ -1,5 +1,6 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
+from typing import List
 
 ''' Validation model for LLM-extracted data.'''
 
@@ -23,4 +24,19 @@ class FormGEntry(BaseModel):
             datetime.strptime(v, '%Y/%m/%d')
         except ValueError:
             raise ValueError("report_date must be in 'yyyy/mm/dd' format")
-        return v
\ No newline at end of file
+        return v
+
+def consistency_problems(entry: dict) -> List[str]:
+    """Cross-field checks on a 13G entry (rule or LLM output). Empty list = consistent"""
+    problems = []
+    owned = entry.get("shares_owned")
+    if owned is not None:
+        for a, b in (("voting_sole", "voting_shared"), ("shares_dispo_sole", "shares_dispo_shared")):
+            if entry.get(a) is not None and entry.get(b) is not None and entry[a] + entry[b] > owned:
+                problems.append(f"{a} + {b} > shares_owned")
+    pct = entry.get("percent_of_class")
+    if pct is not None and not 0 <= pct <= 100:
+        problems.append("percent_of_class out of range")
+    if pct == 0 and owned:
+        problems.append("percent_of_class is 0 but shares_owned > 0")
+    return problems
@@ -0,0 +1,156 @@
+from typing import Iterable, List, Optional, Tuple
+
+'''
+Ingestion work queue in Postgres. Any number of workers on any machine claim jobs with FOR UPDATE SKIP LOCKED,
+so no two workers get the same filing and no separate broker is needed.
+
+job lifecycle: pending -> running (leased until lease_expiry) -> done
+                                  -> pending again on error, or once the lease expires (worker died)
+                                  -> failed after max_attempts
+A worker renews its leases between jobs (renew_leases), so a slow batch isn't re-claimed while it's still running;
+complete/fail only touch jobs the worker still holds.
+'''
+
+JOBS_TABLE = "ingest_jobs"
+
+
+def create_jobs_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {JOBS_TABLE} (
+                job_id BIGSERIAL PRIMARY KEY,
+                cik TEXT NOT NULL,
+                accession_number TEXT NOT NULL,
+                form TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'running', 'done', 'failed')),
+                attempts INT NOT NULL DEFAULT 0,
+                lease_expiry TIMESTAMPTZ,
+                worker TEXT,
+                last_error TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                UNIQUE (accession_number, form)
+            );""")
+        # claim query scans claimable jobs in job_id order
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {JOBS_TABLE}_claimable ON {JOBS_TABLE} (state, job_id);")
+    conn.commit()
+
+
+def enqueue_jobs(conn, jobs: Iterable[Tuple[str, str, str]]) -> int:
+    """jobs: (cik, accession_number, form) tuples. Already-queued filings are skipped. Returns # new jobs"""
+    jobs = list(jobs)
+    if not jobs:
+        return 0
+    with conn.cursor() as cur:
+        cur.executemany(f"""
+            INSERT INTO {JOBS_TABLE} (cik, accession_number, form)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (accession_number, form) DO NOTHING;
+            """, jobs)
+        n_new = cur.rowcount
+    conn.commit()
+    return n_new
+
+
+def claim_jobs(conn, worker: str, batch_size: int = 10, lease_seconds: int = 600, max_attempts: int = 3) -> List[dict]:
+    """Lease up to batch_size jobs for this worker. Expired leases (crashed/stuck workers) are claimable again.
+    Rows locked by another worker's in-progress claim are skipped, not waited on."""
+    with conn.cursor() as cur:
+        # expired leases that already used every attempt won't be claimed again
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE} SET state = 'failed', last_error = COALESCE(last_error, 'lease expired'), updated_at = now()
+            WHERE state = 'running' AND lease_expiry < now() AND attempts >= %s;
+            """, (max_attempts,))
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE} j
+            SET state = 'running',
+                attempts = j.attempts + 1,
+                lease_expiry = now() + make_interval(secs => %s),
+                worker = %s,
+                updated_at = now()
+            WHERE j.job_id IN (
+                SELECT job_id FROM {JOBS_TABLE}
+                WHERE (state = 'pending' OR (state = 'running' AND lease_expiry < now()))
+                  AND attempts < %s
+                ORDER BY job_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING j.job_id, j.cik, j.accession_number, j.form, j.attempts;
+            """, (lease_seconds, worker, max_attempts, batch_size))
+        rows = cur.fetchall()
+    conn.commit()
+    return [{"job_id": r[0], "cik": r[1], "accession_number": r[2], "form": r[3], "attempts": r[4]} for r in rows]
+
+
+def renew_leases(conn, worker: str, job_ids: List[int], lease_seconds: int = 600) -> List[int]:
+    """Extend this worker's leases. Returns the ids it still holds: a job whose lease already expired and was
+    re-claimed by another worker is not renewed (and shouldn't be processed here any more)"""
+    if not job_ids:
+        return []
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE} SET lease_expiry = now() + make_interval(secs => %s), updated_at = now()
+            WHERE job_id = ANY(%s) AND worker = %s AND state = 'running'
+            RETURNING job_id;
+            """, (lease_seconds, job_ids, worker))
+        held = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    return held
+
+
+def complete_jobs(conn, job_ids: List[int], worker: Optional[str] = None) -> None:
+    """worker: only jobs this worker still holds (a re-claimed job belongs to its new worker)"""
+    if not job_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE} SET state = 'done', lease_expiry = NULL, last_error = NULL, updated_at = now()
+            WHERE job_id = ANY(%s) AND (%s::text IS NULL OR worker = %s);
+            """, (job_ids, worker, worker))
+    conn.commit()
+
+
+def fail_job(conn, job_id: int, error: str, max_attempts: int = 3, worker: Optional[str] = None) -> None:
+    """Put the job back in the queue, or mark it failed once it has used up its attempts"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE}
+            SET state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                lease_expiry = NULL, last_error = %s, updated_at = now()
+            WHERE job_id = %s AND (%s::text IS NULL OR worker = %s);
+            """, (max_attempts, error[:2000], job_id, worker, worker))
+    conn.commit()
+
+
+def drop_worker_staging_tables(conn) -> int:
+    """Permanent per-worker staging tables (staging_13f_<host>_<pid>) left by older workers; workers now stage in
+    TEMP tables"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT tablename FROM pg_tables
+            WHERE schemaname = current_schema() AND tablename ~ '^staging_13[fg]_.+';
+            """)
+        names = [r[0] for r in cur.fetchall()]
+        for name in names:
+            cur.execute(f'DROP TABLE IF EXISTS "{name}";')
+    conn.commit()
+    return len(names)
+
+
+def queue_counts(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT state, COUNT(*) FROM {JOBS_TABLE} GROUP BY state;")
+        return dict(cur.fetchall())
+
+
+def reset_failed(conn, form: Optional[str] = None) -> int:
+    """Requeue failed jobs (e.g. after a parser fix)"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE {JOBS_TABLE} SET state = 'pending', attempts = 0, updated_at = now()
+            WHERE state = 'failed' AND (%s::text IS NULL OR form = %s);
+            """, (form, form))
+        n = cur.rowcount
+    conn.commit()
+    return n
@@ -1,11 +1,33 @@
+import csv
 import io
 import os
+from typing import Union
 import pandas as pd
+from parsers.columnar import HoldingsBatch
 from .connect_db import get_conn
 from .load_data import merge_13f_staging_to_schema, merge_13g_staging_to_schema
 
-def save_to_csv(data: list[dict], path: str):
+def _existing_accessions(path: str) -> set:
+    """accession_number column of an existing csv, read without building a DataFrame"""
+    with open(path, newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader, [])
+        if "accession_number" not in header:
+            return set()
+        i = header.index("accession_number")
+        return {row[i] for row in reader if len(row) > i}
+
+
+def save_to_csv(data: Union[list[dict], HoldingsBatch], path: str):
     """ Add new rows to CSV, avoiding duplicates based on accession_number """
+    if isinstance(data, HoldingsBatch):
+        # written straight from the columns; whole filings already in the file are skipped
+        new_file = not os.path.exists(path)
+        skip = set() if new_file else _existing_accessions(path)
+        with open(path, "a", newline="") as fh:
+            n = data.write_csv(fh, header=new_file, skip_accessions=skip)
+        print(f"Saved {n} records to {'NEW file ' if new_file else ''}{path}.")
+        return
     df_new = pd.DataFrame(data)
     if os.path.exists(path):
         df_existing = pd.read_csv(path, dtype=str)
@@ -17,13 +39,14 @@ def save_to_csv(data: list[dict], path: str):
         df_new.to_csv(path, index=False)
         print(f"Saved records to NEW file {path}.")
 
-def save_13f_to_db(data: list[dict], staging_table: str = "staging_13f"):
-    """Load 13F CSV data into a staging table, and merge with 13F schema in postgres"""
+def save_13f_to_db(data: Union[list[dict], HoldingsBatch], staging_table: str = "staging_13f", temp: bool = False):
+    """Load 13F CSV data into a staging table, and merge with 13F schema in postgres.
+    temp: TEMP staging table, private to this connection and dropped when it closes (concurrent workers)"""
     if not data:
         print("No 13F data to save")
         return
     conn = get_conn()
-    df = pd.DataFrame(data)
+    columnar = isinstance(data, HoldingsBatch)
     try:
         # Ensure funds are loaded before merging
         from .load_data import load_funds
@@ -32,9 +55,9 @@ def save_13f_to_db(data: list[dict], staging_table: str = "staging_13f"):
         with conn.cursor() as cur:
         # _show_db_info(conn, cur)
             # Drop/create staging for each run
-            cur.execute(f"DROP TABLE IF EXISTS {staging_table};")
+            cur.execute(f"DROP TABLE IF EXISTS {'pg_temp.' if temp else ''}{staging_table};") # never the shared table when temp
             cur.execute(f"""
-                CREATE TABLE {staging_table} (
+                CREATE {'TEMP ' if temp else ''}TABLE {staging_table} (
                     accession_number TEXT,
                     report_date DATE,
                     cik TEXT,
@@ -52,19 +75,23 @@ def save_13f_to_db(data: list[dict], staging_table: str = "staging_13f"):
                     primary_doc_url TEXT
                 )""")
             
-            csv_io = io.StringIO() # creates in-memory text buffer (file-like obj) to r/w from like a file
-            df.to_csv(csv_io, index=False)
-            csv_io.seek(0)
+            if not columnar:
+                csv_io = io.StringIO() # creates in-memory text buffer (file-like obj) to r/w from like a file
+                pd.DataFrame(data).to_csv(csv_io, index=False)
+                csv_io.seek(0)
 
         # COPY raw CSV into staging
         with conn.cursor() as cur:
             # COPY FROM copies data from a file to a table (appending)
             with cur.copy(f"COPY {staging_table} FROM STDIN WITH CSV HEADER") as copy:
-                copy.write(csv_io.read())
+                if columnar:
+                    data.write_csv(copy) # stream rows from the columns, no DataFrame / full csv string
+                else:
+                    copy.write(csv_io.read())
         conn.commit()
         merge_13f_staging_to_schema(staging_table, conn)
         conn.commit()
-        print(f"Saved {len(df)} 13F rows to DB {staging_table} and merged")
+        print(f"Saved {len(data)} 13F rows to DB {staging_table} and merged")
 
     except Exception as e:
         print("Error during COPY for 13F:", e)
@@ -74,8 +101,9 @@ def save_13f_to_db(data: list[dict], staging_table: str = "staging_13f"):
         conn.close()
 
         
-def save_13g_to_db(data: list[dict], staging_table: str = "staging_13g"):
-    """Load 13G CSV data into a staging table, and merge with 13G schema in postgres"""
+def save_13g_to_db(data: list[dict], staging_table: str = "staging_13g", temp: bool = False):
+    """Load 13G CSV data into a staging table, and merge with 13G schema in postgres.
+    temp: TEMP staging table, private to this connection and dropped when it closes (concurrent workers)"""
     if not data:
         print("No 13G data to save")
         return
@@ -88,9 +116,9 @@ def save_13g_to_db(data: list[dict], staging_table: str = "staging_13g"):
         conn.commit()
         with conn.cursor() as cur:
             # drop/create staging for each run
-            cur.execute(f"DROP TABLE IF EXISTS {staging_table};")
+            cur.execute(f"DROP TABLE IF EXISTS {'pg_temp.' if temp else ''}{staging_table};") # never the shared table when temp
             cur.execute(f"""
-                CREATE TABLE {staging_table} (
+                CREATE {'TEMP ' if temp else ''}TABLE {staging_table} (
                     accession_number TEXT,
                     cik TEXT,
                     primary_doc TEXT,
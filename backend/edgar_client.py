@@ -1,49 +1,201 @@
 import random
+import threading
 import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Iterable, Iterator, List, Optional
+from http_cache import HttpCache
 
 # def _strip_acc(acc_number: str) -> str:
 #         """Strip dashes from accession number"""
 #         return acc_number.replace('-', '')
 
+SEC_MAX_RPS = 10 # SEC fair access cap: https://www.sec.gov/os/accessing-edgar-data
+
+
+class RateLimiter:
+    """Token bucket shared by every thread (and every EdgarClient) that talks to SEC.
+    429/5xx responses call slow_down(), which pauses ALL callers and halves the rate;
+    successes slowly recover the rate back to max_rate.
+    """
+    def __init__(self, max_rate: float = SEC_MAX_RPS - 1, min_rate: float = 1.0, max_in_flight: Optional[int] = None):
+        """max_in_flight: optional cap on concurrent requests across everyone sharing this limiter"""
+        self.max_rate = max_rate # stay a bit under the cap
+        self.min_rate = min_rate
+        self.rate = max_rate # tokens per second
+        self.tokens = max_rate
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0 # global backoff, set by slow_down()
+        self.lock = threading.Lock()
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight slot (if capped) and a rate token for the duration of one request"""
+        if self.in_flight is None:
+            self.acquire()
+            yield
+            return
+        with self.in_flight:
+            self.acquire()
+            yield
+
+    def acquire(self):
+        """Block until a request is allowed"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.rate, self.tokens + (now - self.last_refill) * self.rate)
+                    self.last_refill = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_s = (1 - self.tokens) / self.rate
+                else:
+                    wait_s = self.paused_until - now
+            time.sleep(wait_s)
+
+    def slow_down(self, attempt: int = 1):
+        """Global backoff signal: pause everyone and halve the rate"""
+        with self.lock:
+            pause = min(60, (2 ** attempt) + random.random())
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            self.last_refill = self.paused_until
+        print(f"Rate limiter: backing off {pause:.1f}s, rate now {self.rate:.1f} req/s")
+
+    def recover(self):
+        """Creep back up toward max_rate after a successful request"""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+
+class FilingManifest:
+    """Everything we need from one accession's index.json, built from a single fetch and shared by all parsers.
+    documents: list of {"name", "size", "last_modified"} dicts from the filing directory
+    """
+    def __init__(self, acc: str, base_url: str, documents: List[Dict]):
+        self.acc = acc
+        self.base_url = base_url # filing folder url, ends in /{acc}
+        self.documents = documents
+        self.sizes = {d["name"]: d["size"] for d in documents}
+
+        candidates = [d for d in documents if d["name"].endswith((".htm", ".html"))] # prefer htm
+        if not candidates:
+            candidates = [d for d in documents if d["name"].endswith(".txt")]
+        # Assuming largest is the primary. missing sizes = small
+        candidates.sort(key=lambda d: d["size"])
+        primary = candidates[-1] if candidates else None
+        self.primary_doc: Optional[str] = primary["name"] if primary else None
+        self.last_modified: str = primary["last_modified"].split(" ")[0] if primary else "" # just the date part, no time
+        self.infotable_file: Optional[str] = next((d["name"] for d in documents if "infotable" in d["name"]), None)
+
+    @classmethod
+    def from_index_json(cls, acc: str, base_url: str, index_json: Dict) -> "FilingManifest":
+        documents = []
+        for item in index_json["directory"]["item"]:
+            try:
+                size = int(item.get("size") or 0)
+            except ValueError: # size is "" for folders
+                size = 0
+            documents.append({"name": item["name"], "size": size, "last_modified": item.get("last-modified", "")})
+        return cls(acc, base_url, documents)
+
+    @property
+    def report_date(self) -> str:
+        return self.last_modified
+
+    def url(self, filename: str) -> str:
+        return f"{self.base_url}/{filename}"
+
+    def find(self, *suffixes: str) -> List[str]:
+        """Document names ending in any of the suffixes, largest first"""
+        docs = [d for d in self.documents if d["name"].lower().endswith(suffixes)]
+        return [d["name"] for d in sorted(docs, key=lambda d: d["size"], reverse=True)]
+
+
 class EdgarClient:
-    def __init__(self, cik_full: str, user_agent: str):
+    def __init__(self, cik_full: str, user_agent: str, limiter: Optional[RateLimiter] = None,
+                 session: Optional[requests.Session] = None, max_workers: int = 8, http_cache: Optional[HttpCache] = None):
+        """limiter/session/http_cache can be shared across clients (multi-fund crawls), so all funds stay under one SEC rate cap"""
         self.submissions_url = f"https://data.sec.gov/submissions/{cik_full}.json"
         self.cik = cik_full
         cik_stripped = cik_full.replace("CIK", "").lstrip("0")
         self.filing_baseurl = f"https://www.sec.gov/Archives/edgar/data/{cik_stripped}"
-        self.session = requests.Session()
+        self.limiter = limiter or RateLimiter()
+        self.http_cache = http_cache # None = no http caching
+        self.max_workers = max_workers
+        self._manifests: Dict[str, FilingManifest] = {} # acc -> manifest, memoized for the client's lifetime
+        self._manifest_lock = threading.Lock()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+        self.session = session
         self.session.headers.update({"User-Agent": user_agent})
 
-    def fetch_json_with_retry(self, url, max_attempts=5) -> Dict:
-        """ no caching -- that is handled in parsers """
+    def _get_with_retry(self, url, max_attempts=5, headers: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        """Rate-limited GET. 429/5xx and network errors slow down the shared limiter instead of sleeping per request.
+        Returns the response for 200, or 304 when conditional headers were sent.
+        stream=True: body isn't downloaded yet, caller reads it with iter_content"""
         for attempt in range(1, max_attempts+1):
             try:
-                r = self.session.get(url)
+                with self.limiter.slot():
+                    r = self.session.get(url, headers=headers, stream=stream)
             except requests.RequestException as e: # network failure
-                time.sleep(min(60, (2 ** attempt) + random.random()))
                 if attempt == max_attempts:
                     raise e
+                self.limiter.slow_down(attempt)
                 continue
-            
-            if r.status_code == 200:
-                # print("fetched json successfully")
-                return r.json()
-            
+
+            if r.status_code == 200 or (r.status_code == 304 and headers):
+                self.limiter.recover()
+                return r
+
             if r.status_code==429 or r.status_code>=500: # rate limiting, or server error
                 print(f"backoff for {url}")
-                time.sleep((2 ** attempt) + random.random())
                 if attempt == max_attempts:
                     r.raise_for_status()
+                self.limiter.slow_down(attempt)
                 continue
             # other error -> fail immediately
             r.raise_for_status()
-        
+
         raise RuntimeError(f"Exceeded max attempts fetching {url}")
 
+    def fetch_bytes(self, url, max_attempts=5) -> bytes:
+        """GET through the http cache (if any). Archived filings are served from disk without a request,
+        other urls are revalidated with a conditional GET"""
+        if self.http_cache is None:
+            return self._get_with_retry(url, max_attempts=max_attempts).content
+
+        cached = self.http_cache.lookup(url)
+        if cached is not None:
+            body, meta = cached
+            if self.http_cache.is_immutable(url):
+                self.http_cache.record("hits", len(body))
+                return body
+            r = self._get_with_retry(url, max_attempts=max_attempts, headers=self.http_cache.conditional_headers(meta))
+            if r.status_code == 304:
+                self.http_cache.record("revalidated", len(body))
+                return body
+        else:
+            r = self._get_with_retry(url, max_attempts=max_attempts)
+        self.http_cache.record("misses")
+        self.http_cache.put(url, r.content, r.headers)
+        return r.content
+
+    def fetch_json_with_retry(self, url, max_attempts=5) -> Dict:
+        """ raw responses may come from the http cache; parsed rows are cached in parsers """
+        return json.loads(self.fetch_bytes(url, max_attempts=max_attempts))
+
     def get_submissions_feed(self) -> Dict:
         """Get the overall EDGAR submissions json feed"""
         return self.fetch_json_with_retry(self.submissions_url)
@@ -52,18 +204,20 @@ class EdgarClient:
         """Get index.json for one accession number"""
         return self.fetch_json_with_retry(f"{self.filing_baseurl}/{acc}/index.json")
 
+    def get_manifest(self, acc: str) -> FilingManifest:
+        """FilingManifest for one accession. index.json is fetched at most once per accession per client"""
+        manifest = self._manifests.get(acc)
+        if manifest is None:
+            manifest = FilingManifest.from_index_json(acc, f"{self.filing_baseurl}/{acc}", self.get_index_json(acc))
+            with self._manifest_lock:
+                manifest = self._manifests.setdefault(acc, manifest)
+        return manifest
+
     def get_primary_doc_name_date(self, acc: str) -> Tuple[str, str]:
         """Get primary doc file name and last modified date. Usually "infotable" for 13f, variable for 13g"""
-        items = self.get_index_json(acc)['directory']['item']
-        candidates = [f for f in items if f["name"].endswith((".htm", ".html"))] # prefer htm
-        if not candidates:
-            candidates = [f for f in items if f["name"].endswith(".txt")]
-        # Assuming largest is the primary. missing sizes = small
-        candidates.sort(key=lambda x: x.get("size", 0))
-        primary_doc_name = candidates[-1]["name"]
-        report_date = candidates[-1].get("last-modified", "").split(" ")[0]  # just the date part, no time
-        return primary_doc_name, report_date
-    
+        manifest = self.get_manifest(acc)
+        return manifest.primary_doc, manifest.report_date
+
     def extract_text_from_primary_doc(content_bytes: bytes) -> str:
         """Extract text from primary doc. For Form 13g, usually html or txt
         content_bytes: response.content from get() request for the primary doc file
@@ -72,15 +226,60 @@ class EdgarClient:
         all_text = soup.get_text(" ", strip=True) # extracting all the text from a page
         #todo further parse text?
         return all_text
-        
+
 
     def fetch_file(self, acc: str, filename: str) -> bytes:
         """Form url and fetch the file for an accession number
         returns: (file content bytes)"""
 
         url = f"{self.filing_baseurl}/{acc}/{filename}"
-        r = self.session.get(url)
-        r.raise_for_status()
-        return r.content
-    
-    
\ No newline at end of file
+        return self.fetch_bytes(url)
+
+    def iter_file_chunks(self, acc: str, filename: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Like fetch_file, but yields the body in chunks as it downloads, so the whole file is never held in memory.
+        Served from the http cache when present; otherwise the download is spooled into the cache as it streams."""
+        url = f"{self.filing_baseurl}/{acc}/{filename}"
+        cached = self.http_cache.body_path(url) if self.http_cache is not None else None
+        if cached is not None:
+            self.http_cache.record("hits", cached.stat().st_size)
+            with cached.open("rb") as fh:
+                while chunk := fh.read(chunk_size):
+                    yield chunk
+            return
+
+        r = self._get_with_retry(url, stream=True)
+        with r:
+            chunks = r.iter_content(chunk_size=chunk_size)
+            if self.http_cache is not None:
+                self.http_cache.record("misses")
+                chunks = self.http_cache.put_stream(url, chunks, r.headers)
+            yield from chunks
+
+    def fetch_many(self, reqs: Iterable[Tuple[str, str]], max_workers: Optional[int] = None) -> Iterator[Tuple[str, str, object]]:
+        """Fetch a batch of (acc, filename) files concurrently, all through the shared rate limiter.
+        Yields (acc, filename, content bytes OR the Exception raised) as each one completes, so one bad file doesn't stop the batch.
+        At most max_workers requests are in flight at once.
+        """
+        max_workers = max_workers or self.max_workers
+        reqs = iter(reqs)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            in_flight = {}
+            def submit_next() -> bool:
+                nxt = next(reqs, None)
+                if nxt is None:
+                    return False
+                in_flight[pool.submit(self.fetch_file, *nxt)] = nxt
+                return True
+
+            for _ in range(max_workers):
+                if not submit_next():
+                    break
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    acc, filename = in_flight.pop(fut)
+                    try:
+                        yield acc, filename, fut.result()
+                    except Exception as e:
+                        yield acc, filename, e
+                    submit_next()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+
+class HttpCache:
+    """On-disk cache of raw EDGAR responses, sits under EdgarClient (below the parser-level caches).
+
+    Each entry is two files under cache_dir: <sha1(url)>.body and <sha1(url)>.meta.json (url, ETag, Last-Modified, size).
+    - Archived filings (/Archives/edgar/data/...) never change once filed, so they're served from disk with no request.
+    - Everything else (submissions feed) is revalidated with a conditional GET; a 304 costs a round trip but no body.
+    Total body size is capped at max_bytes, evicting least recently used entries.
+    """
+    IMMUTABLE_MARKERS = ("/Archives/edgar/data/",)
+
+    def __init__(self, cache_dir: str = "cache/http", max_bytes: int = 2 * 1024**3):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0}
+        # in-memory index: key -> meta (+ last_access), rebuilt from the meta files on startup
+        self.index: Dict[str, dict] = {}
+        self.total_bytes = 0
+        for meta_path in self.dir.glob("*.meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                body_path = self._body_path(meta_path.name[:-len(".meta.json")])
+                meta["last_access"] = body_path.stat().st_mtime
+            except Exception:
+                meta_path.unlink(missing_ok=True) # corrupt or orphaned
+                continue
+            self.index[self._key(meta["url"])] = meta
+            self.total_bytes += meta["size"]
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> Path:
+        return self.dir.joinpath(f"{key}.body")
+
+    def _meta_path(self, key: str) -> Path:
+        return self.dir.joinpath(f"{key}.meta.json")
+
+    def _tmp(self, key: str):
+        """(open file, path) of a new temp file next to the entry, unique across threads and processes sharing cache_dir"""
+        fd, path = tempfile.mkstemp(dir=self.dir, prefix=f"{key}.", suffix=".tmp")
+        return os.fdopen(fd, "wb"), Path(path)
+
+    def is_immutable(self, url: str) -> bool:
+        return any(m in url for m in self.IMMUTABLE_MARKERS)
+
+    def lookup(self, url: str) -> Optional[Tuple[bytes, dict]]:
+        """Return (body, meta) if cached, else None. Does not count stats -- caller knows if it was a hit or a revalidation"""
+        key = self._key(url)
+        with self.lock:
+            meta = self.index.get(key)
+        if meta is None:
+            return None
+        try:
+            body = self._body_path(key).read_bytes()
+        except OSError:
+            self._drop(key)
+            return None
+        now = time.time()
+        meta["last_access"] = now
+        try:
+            os.utime(self._body_path(key), (now, now)) # persist recency for LRU across runs
+        except OSError:
+            pass
+        return body, meta
+
+    def body_path(self, url: str) -> Optional[Path]:
+        """Path of the cached body (for reading it in chunks), or None"""
+        key = self._key(url)
+        with self.lock:
+            meta = self.index.get(key)
+        if meta is None or not self._body_path(key).exists():
+            return None
+        meta["last_access"] = time.time()
+        return self._body_path(key)
+
+    def put_stream(self, url: str, chunks: Iterable[bytes], headers) -> Iterator[bytes]:
+        """Pass chunks through to the caller while spooling them to disk; the entry is committed once the stream ends"""
+        key = self._key(url)
+        fh, body_tmp = self._tmp(key)
+        size = 0
+        try:
+            with fh:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size <= self.max_bytes:
+                        fh.write(chunk)
+                    yield chunk
+        except BaseException:
+            body_tmp.unlink(missing_ok=True) # partial download / caller stopped early: don't cache it
+            raise
+        if size > self.max_bytes:
+            body_tmp.unlink(missing_ok=True)
+            return
+        self._commit(key, url, body_tmp, size, headers)
+
+    def conditional_headers(self, meta: dict) -> Dict[str, str]:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, url: str, body: bytes, headers) -> None:
+        if len(body) > self.max_bytes:
+            return
+        key = self._key(url)
+        body_tmp = None
+        try:
+            fh, body_tmp = self._tmp(key)
+            with fh:
+                fh.write(body)
+        except Exception as e:
+            print(f"Error writing http cache for {url}: {e}")
+            if body_tmp is not None:
+                body_tmp.unlink(missing_ok=True)
+            return
+        self._commit(key, url, body_tmp, len(body), headers)
+
+    def _commit(self, key: str, url: str, body_tmp: Path, size: int, headers) -> None:
+        """Move a fully written body into place, write its meta, and account for it"""
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": size,
+            "stored_at": time.time(),
+        }
+        meta_tmp = None
+        try:
+            # write to temp files + replace, so readers never see half an entry
+            fh, meta_tmp = self._tmp(key)
+            with fh:
+                fh.write(json.dumps(meta).encode("utf-8"))
+            body_tmp.replace(self._body_path(key))
+            meta_tmp.replace(self._meta_path(key))
+        except Exception as e:
+            print(f"Error writing http cache for {url}: {e}")
+            body_tmp.unlink(missing_ok=True)
+            if meta_tmp is not None:
+                meta_tmp.unlink(missing_ok=True)
+            return
+        meta["last_access"] = time.time()
+        with self.lock:
+            old = self.index.get(key)
+            if old is not None:
+                self.total_bytes -= old["size"]
+            self.index[key] = meta
+            self.total_bytes += meta["size"]
+        self._evict()
+
+    def _drop(self, key: str) -> None:
+        with self.lock:
+            meta = self.index.pop(key, None)
+            if meta is not None:
+                self.total_bytes -= meta["size"]
+        self._body_path(key).unlink(missing_ok=True)
+        self._meta_path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until under max_bytes"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        with self.lock:
+            by_age = sorted(self.index.items(), key=lambda kv: kv[1]["last_access"])
+        for key, _ in by_age:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
+
+    # stats
+    def record(self, kind: str, nbytes: int = 0) -> None:
+        with self.lock:
+            self.stats[kind] += 1
+            if kind in ("hits", "revalidated"):
+                self.stats["bytes_saved"] += nbytes
+
+    def summary(self) -> str:
+        s = self.stats
+        total = s["hits"] + s["revalidated"] + s["misses"]
+        return (f"HTTP cache: {s['hits']} hits, {s['revalidated']} revalidated (304), {s['misses']} misses "
+                f"of {total} requests; {s['bytes_saved'] / 1e6:.1f} MB saved; "
+                f"{len(self.index)} entries / {self.total_bytes / 1e6:.1f} MB on disk")
@@ -1,3 +1,15 @@
+import datetime
+import json
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def _read_prompt(path: str, mtime: float) -> str:
+    # keyed on mtime: read once, but an edited prompt.txt is still picked up
+    with open(path, "r") as f:
+        return f.read().strip()
+
 
 class BaseLLMClient:
     def extract_data_llm(self, file_text) -> str:
@@ -6,7 +18,59 @@ class BaseLLMClient:
     def extract_and_validate(self, file_text, entry_model, max_retries=1) -> dict:
         pass
 
+    def extract_and_validate_batch(self, file_texts, entry_model, max_tries=1) -> list:
+        """One validated dict or the exception per input, in order. Clients that can batch generation override this"""
+        results = []
+        for file_text in file_texts:
+            try:
+                results.append(self.extract_and_validate(file_text, entry_model=entry_model, max_tries=max_tries))
+            except Exception as e:
+                results.append(e)
+        return results
+
         
+    def build_messages(self, filing_text, system_prompt_file="llm/prompt.txt"):
+        # prepare the model input
+        folder = '.'
+        path = os.path.join(folder, system_prompt_file)
+        system_prompt = _read_prompt(path, os.path.getmtime(path))
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": filing_text}
+        ]
+        return messages
+
+    def _validate_response(self, data: str, entry_model) -> dict:
+        """json decode + type coercion + pydantic validation of one llm response"""
+        data_json = json.loads(data)
+        # If model returned a JSON string (double-encoded), try decode again
+        if isinstance(data_json, str):
+            try:
+                data_json = json.loads(data_json)
+            except json.JSONDecodeError:
+                pass # leave as string, handled below
+        print("Parsed JSON:", data_json)
+
+        try:
+            data_json = self._coerce_types(data_json) # coerce types for some number-looking fields
+        except ValueError as e: # treat as validation errors for max_retries
+            raise ValueError(f"type coercion error: {e}")
+
+        validated = entry_model(**data_json) # validate filing data with pydantic mode. returns a model instance
+        if getattr(self, "debug", False):
+            try:
+                with open(self.debug_log_path, "a", encoding="utf-8") as fh:
+                    fh.write(f"=== {datetime.datetime.utcnow().isoformat()} UTC VALIDATION ===\n")
+                    fh.write("PARSED_JSON:\n")
+                    fh.write(json.dumps(data_json, ensure_ascii=False, indent=2) + "\n\n")
+                    fh.write("VALIDATED ENTRIES:\n")
+                    fh.write(validated.json(ensure_ascii=False, indent=2) + "\n\n")
+                    fh.write("=== END ===\n\n")
+            except Exception:
+                pass
+        return validated.dict()
+
     ### Helper functions for parsing/cleaning values ###
     def _parse_int(self, value):
         if value is None:
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Union
+from data_models import consistency_problems
+from llm.base_llm_client import BaseLLMClient
+from parsers.g13_rules import valid_cusip
+
+'''
+Small-model-first cascade for 13G extraction: a small fast model answers every filing, and only answers that fail
+FormGEntry validation or the checks below go to the large model.
+Checks (config "checks"):
+  cusip        9 chars with a correct check digit (g13_rules.valid_cusip)
+  consistency  data_models.consistency_problems: percent in 0-100, voting/dispositive counts <= shares owned, ...
+  empty        name_filer / issuer not blank
+Every filing appends one json line to log_file (tier, escalation reasons, per-tier seconds) and self.stats keeps the
+totals, so thresholds can be tuned from real runs:  provider "cascade" with {"small": {...}, "large": {...}} configs.
+'''
+
+CHECKS = ("cusip", "consistency", "empty")
+CASCADE_LOG = "llm/cascade_log.jsonl"
+
+
+def escalation_reasons(data: dict, checks=CHECKS) -> List[str]:
+    """Why a validated small-model answer shouldn't be trusted. Empty list = accept"""
+    reasons = []
+    if "cusip" in checks and not valid_cusip(str(data.get("cusip") or "").upper()):
+        reasons.append("cusip check digit")
+    if "consistency" in checks:
+        reasons += consistency_problems(data)
+    if "empty" in checks:
+        reasons += [f"{f} empty" for f in ("name_filer", "issuer") if not str(data.get(f) or "").strip()]
+    return reasons
+
+
+class CascadeLLMClient(BaseLLMClient):
+    def __init__(self, small: BaseLLMClient, large: BaseLLMClient, checks=CHECKS, log_file: Optional[str] = CASCADE_LOG):
+        self.small = small
+        self.large = large
+        self.checks = tuple(checks)
+        self.log_file = log_file
+        # cache key: an answer may come from either tier, so the pair is the "model"
+        self.model_name = f"cascade:{getattr(small, 'model_name', '')}>{getattr(large, 'model_name', '')}"
+        self.batch_size = max(getattr(small, "batch_size", 1), getattr(large, "batch_size", 1))
+        self.tokenizer = getattr(large, "tokenizer", None) or getattr(small, "tokenizer", None) # input is budgeted once, for both
+        self.concurrent = getattr(small, "concurrent", False) and getattr(large, "concurrent", False)
+        self.stats = {"filings": 0, "small_ok": 0, "escalated": 0, "large_ok": 0, "failed": 0,
+                      "small_seconds": 0.0, "large_seconds": 0.0, "reasons": {}}
+        self.lock = threading.Lock()
+
+    def _small_verdicts(self, results) -> List[List[str]]:
+        """escalation reasons per small-model result ([] = accepted)"""
+        verdicts = []
+        for r in results:
+            if isinstance(r, Exception):
+                verdicts.append([f"invalid: {type(r).__name__}"])
+            else:
+                verdicts.append(escalation_reasons(r, self.checks))
+        return verdicts
+
+    def _record(self, verdicts, final, small_seconds: float, large_seconds: float):
+        n_large = sum(1 for v in verdicts if v)
+        with self.lock:
+            s = self.stats
+            s["filings"] += len(verdicts)
+            s["small_seconds"] += small_seconds
+            s["large_seconds"] += large_seconds
+            for reasons, result in zip(verdicts, final):
+                if not reasons:
+                    s["small_ok"] += 1
+                    continue
+                s["escalated"] += 1
+                s["large_ok" if not isinstance(result, Exception) else "failed"] += 1
+                for reason in reasons:
+                    key = reason.split(":")[0]
+                    s["reasons"][key] = s["reasons"].get(key, 0) + 1
+        if self.log_file:
+            try:
+                with open(self.log_file, "a", encoding="utf-8") as fh:
+                    for reasons, result in zip(verdicts, final):
+                        fh.write(json.dumps({"time": time.time(), "tier": "large" if reasons else "small", "reasons": reasons,
+                                             "ok": not isinstance(result, Exception),
+                                             "small_s": round(small_seconds / len(verdicts), 3),
+                                             "large_s": round(large_seconds / n_large, 3) if reasons else 0.0}) + "\n")
+            except OSError:
+                pass
+        print(self.summary())
+
+    def extract_and_validate_batch(self, file_texts: List[str], entry_model, max_tries=1) -> List[Union[dict, Exception]]:
+        if not file_texts:
+            return []
+        start = time.perf_counter()
+        first = self.small.extract_and_validate_batch(file_texts, entry_model=entry_model, max_tries=0) # cheap tier: no retries
+        small_seconds = time.perf_counter() - start
+        verdicts = self._small_verdicts(first)
+        escalate = [i for i, reasons in enumerate(verdicts) if reasons]
+
+        final = list(first)
+        large_seconds = 0.0
+        if escalate:
+            start = time.perf_counter()
+            second = self.large.extract_and_validate_batch([file_texts[i] for i in escalate], entry_model=entry_model, max_tries=max_tries)
+            large_seconds = time.perf_counter() - start
+            for i, result in zip(escalate, second):
+                final[i] = result
+        self._record(verdicts, final, small_seconds, large_seconds)
+        return final
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1) -> dict:
+        result = self.extract_and_validate_batch([file_text], entry_model, max_tries)[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def summary(self) -> str:
+        s = self.stats
+        n = s["filings"] or 1
+        small_avg = s["small_seconds"] / n
+        large_avg = s["large_seconds"] / (s["escalated"] or 1)
+        reasons = ", ".join(f"{k} {v}" for k, v in sorted(s["reasons"].items(), key=lambda kv: -kv[1]))
+        return (f"Cascade: {s['filings']} filings, {s['small_ok']} small ({s['small_ok'] / n:.0%}), {s['escalated']} escalated "
+                f"({s['large_ok']} ok, {s['failed']} failed); {small_avg:.2f}s/filing small, {large_avg:.2f}s/filing large"
+                + (f"; reasons: {reasons}" if reasons else ""))
+
+    def report(self) -> Dict:
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
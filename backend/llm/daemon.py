@@ -0,0 +1,277 @@
+import argparse
+import copy
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional, Union
+from data_models import FormGEntry
+from llm.base_llm_client import BaseLLMClient
+
+'''
+Long-lived extraction daemon: loads the 13G model once and serves it over a Unix socket, so CLI runs don't pay
+the model load (minutes for Qwen3-14B) each time -- and runs that never miss the llm cache never touch it at all.
+
+Server:  python -m llm.daemon serve --config_file config_hf.json [--idle_minutes 60]
+Status:  python -m llm.daemon status | stop   (every daemon, or --socket one)
+Client:  "daemon": true in the llm config makes get_llm_client return a DaemonLLMClient. It knows the model name and
+         budget from the config alone (the llm cache key needs nothing else), connects on the first real call
+         (first cache miss that needs the LLM), and starts the daemon itself if none is listening ("autostart").
+One daemon per model: the socket defaults to llm/llm_daemon-<model>.sock, so cascade tiers with "daemon": true each
+get their own. Runs that autostart the same daemon take <socket>.lock first, so only one of them loads the model.
+
+Protocol: one connection per request, one json line each way.
+  {"op": "ping"}                                  -> {"model_name", "provider", "pid"}
+  {"op": "extract", "texts": [...], "max_tries"}  -> {"results": [{"data": {...}} | {"error": "..."}]}
+  {"op": "encode", "text"} / {"op": "decode", "ids"}  (the model's tokenizer, for the 13G token budget)
+  {"op": "stop"}
+'''
+
+SOCKET_DIR = "llm"
+DAEMON_LOG = "llm/llm_daemon.log"
+STARTUP_TIMEOUT = 900 # seconds to wait for an autostarted daemon to load the model
+
+
+class DaemonError(Exception):
+    pass
+
+
+def config_model_name(config: dict) -> str:
+    return config.get("model_name") or os.path.basename(config.get("model_path", "")) # same default as GgufLLMClient
+
+
+def socket_for(model_name: str) -> str:
+    """Default socket of the daemon serving model_name (unix socket paths are capped at ~100 bytes)"""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_") or "model"
+    if len(slug) > 48:
+        slug = slug[:39] + "-" + hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(SOCKET_DIR, f"llm_daemon-{slug}.sock")
+
+
+def _request(socket_path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise DaemonError("daemon closed the connection")
+    reply = json.loads(line)
+    if "error" in reply and "results" not in reply:
+        raise DaemonError(reply["error"])
+    return reply
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: "LLMDaemon" = self.server
+        server.last_request = time.monotonic()
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = server.dispatch(request)
+        except Exception as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class LLMDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, llm: BaseLLMClient, socket_path: Optional[str] = None, provider: str = "", idle_minutes: float = 0):
+        """llm: the loaded client. idle_minutes > 0: exit after that long without requests"""
+        socket_path = socket_path or socket_for(getattr(llm, "model_name", ""))
+        if os.path.exists(socket_path):
+            try:
+                _request(socket_path, {"op": "ping"}, timeout=2)
+                raise DaemonError(f"a daemon is already listening on {socket_path}")
+            except (OSError, DaemonError) as e:
+                if isinstance(e, DaemonError):
+                    raise
+                os.unlink(socket_path) # stale socket from a killed daemon
+        super().__init__(socket_path, _Handler)
+        self.llm = llm
+        self.socket_path = socket_path
+        self.provider = provider
+        self.idle_seconds = idle_minutes * 60
+        self.last_request = time.monotonic()
+        self.model_lock = threading.Lock() # one generate() at a time; batch requests go through extract_and_validate_batch
+        # encode/decode requests run beside generate(), whose padded batch encode changes the tokenizer (padding_side,
+        # the rust tokenizer's padding state): HF tokenizers get their own copy, anything else waits for the model
+        tokenizer = getattr(llm, "tokenizer", None)
+        if hasattr(tokenizer, "padding_side"):
+            self.tokenizer, self.tokenizer_lock = copy.deepcopy(tokenizer), threading.Lock()
+        else:
+            self.tokenizer, self.tokenizer_lock = tokenizer, self.model_lock
+
+    def dispatch(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"model_name": getattr(self.llm, "model_name", ""), "provider": self.provider, "pid": os.getpid()}
+        if op == "extract":
+            with self.model_lock:
+                results = self.llm.extract_and_validate_batch(request["texts"], entry_model=FormGEntry,
+                                                              max_tries=request.get("max_tries", 1))
+            return {"results": [{"error": f"{type(r).__name__}: {r}"} if isinstance(r, Exception) else {"data": r}
+                                for r in results]}
+        if op == "encode":
+            with self.tokenizer_lock:
+                return {"ids": self.tokenizer.encode(request["text"], add_special_tokens=False)}
+        if op == "decode":
+            with self.tokenizer_lock:
+                return {"text": self.tokenizer.decode(request["ids"], skip_special_tokens=True)}
+        if op == "stop":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"stopping": True}
+        raise DaemonError(f"unknown op {op}")
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(min(60, self.idle_seconds))
+            if time.monotonic() - self.last_request > self.idle_seconds:
+                print(f"Idle for {self.idle_seconds / 60:.0f} min, stopping")
+                self.shutdown()
+                return
+
+    def run(self):
+        print(f"LLM daemon ({getattr(self.llm, 'model_name', '')}) listening on {self.socket_path}, pid {os.getpid()}")
+        if self.idle_seconds:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class RemoteTokenizer:
+    """encode/decode through the daemon's tokenizer: what Form13GParser needs for the token budget"""
+    def __init__(self, client: "DaemonLLMClient"):
+        self.client = client
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        return self.client._call({"op": "encode", "text": text})["ids"]
+
+    def decode(self, ids: List[int], skip_special_tokens: bool = True) -> str:
+        return self.client._call({"op": "decode", "ids": list(ids)})["text"]
+
+
+class DaemonLLMClient(BaseLLMClient):
+    concurrent = True # the daemon serializes model calls itself
+
+    def __init__(self, config: dict, socket_path: Optional[str] = None, autostart: Optional[bool] = None,
+                 timeout: Optional[float] = None):
+        """config: the llm config the daemon should be serving. Nothing is loaded or connected here"""
+        self.config = config
+        self.model_name = config_model_name(config)
+        self.socket_path = socket_path or config.get("socket") or socket_for(self.model_name)
+        self.autostart = config.get("autostart", True) if autostart is None else autostart
+        self.timeout = timeout # per request; None = wait as long as generation takes
+        self.batch_size = int(config.get("batch_size", 1))
+        # only local models have a tokenizer; api providers use the char estimate in g13_prefilter
+        self.tokenizer = RemoteTokenizer(self) if config.get("provider") in ("huggingface", "gguf") else None
+        self.connected = False
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        """First call: find (or start) the daemon and check it serves our model, so cache keys stay right"""
+        with self.lock:
+            if self.connected:
+                return
+            try:
+                info = _request(self.socket_path, {"op": "ping"}, timeout=5)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.autostart:
+                    raise DaemonError(f"no LLM daemon on {self.socket_path} (python -m llm.daemon serve ...)")
+                info = self._start_daemon()
+            if info["model_name"] != self.model_name:
+                raise DaemonError(f"daemon on {self.socket_path} serves {info['model_name']}, config wants {self.model_name}")
+            self.connected = True
+
+    def _ping(self) -> Optional[dict]:
+        try:
+            return _request(self.socket_path, {"op": "ping"}, timeout=5)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+
+    def _start_daemon(self) -> dict:
+        with open(self.socket_path + ".lock", "a") as lock:
+            # another run is starting this daemon: wait for it rather than load the model a second time
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            info = self._ping()
+            if info is not None:
+                return info
+            print(f"Starting LLM daemon for {self.model_name} (log: {DAEMON_LOG})...")
+            with open(DAEMON_LOG, "ab") as log:
+                proc = subprocess.Popen([sys.executable, "-m", "llm.daemon", "serve", "--config_file", "-", "--socket", self.socket_path],
+                                        stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+            proc.stdin.write(json.dumps({**self.config, "daemon": False}).encode("utf-8")) # config over stdin: keeps api keys off the command line
+            proc.stdin.close()
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while time.monotonic() < deadline:
+                exited = proc.poll() is not None
+                info = self._ping()
+                if info is not None: # ours, or one started by hand meanwhile (ours then exits: "already listening")
+                    return info
+                if exited:
+                    raise DaemonError(f"LLM daemon exited with {proc.returncode}, see {DAEMON_LOG}")
+                time.sleep(1)
+            raise DaemonError(f"LLM daemon not up after {STARTUP_TIMEOUT}s, see {DAEMON_LOG}")
+
+    def _call(self, payload: dict) -> dict:
+        self._connect()
+        return _request(self.socket_path, payload, timeout=self.timeout)
+
+    def extract_and_validate_batch(self, file_texts, entry_model, max_tries=1) -> List[Union[dict, Exception]]:
+        """entry_model is always FormGEntry on the daemon side"""
+        if not file_texts:
+            return []
+        results = self._call({"op": "extract", "texts": list(file_texts), "max_tries": max_tries})["results"]
+        return [r["data"] if "data" in r else DaemonError(r["error"]) for r in results]
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1) -> dict:
+        result = self.extract_and_validate_batch([file_text], entry_model, max_tries)[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="13G LLM extraction daemon (run from backend/: python -m llm.daemon ...)")
+    parse.add_argument("command", choices=["serve", "status", "stop"])
+    parse.add_argument("--config_file", type=str, default="config_hf.json", help="Name in config/, or - to read the config json from stdin")
+    parse.add_argument("--socket", type=str, default=None, help="Default: the model's socket (serve), every daemon (status/stop)")
+    parse.add_argument("--idle_minutes", type=float, default=0, help="Exit after this long without requests, 0 = never")
+    parse.add_argument("--debug", action="store_true")
+    args = parse.parse_args()
+
+    if args.command == "serve":
+        from llm.helpers import get_llm_client
+        if args.config_file == "-":
+            config = json.load(sys.stdin)
+        else:
+            config = json.load(open(os.path.join("config", args.config_file)))
+        config["daemon"] = False # load the model here
+        socket_path = args.socket or config.get("socket") or socket_for(config_model_name(config))
+        start = time.time()
+        llm = get_llm_client(config, debug=args.debug)
+        print(f"Loaded {llm.model_name} in {time.time() - start:.0f}s")
+        LLMDaemon(llm, socket_path, provider=config["provider"], idle_minutes=args.idle_minutes).run()
+    else:
+        sockets = [args.socket] if args.socket else sorted(glob.glob(os.path.join(SOCKET_DIR, "llm_daemon*.sock")))
+        if not sockets:
+            print(f"No LLM daemon sockets in {SOCKET_DIR}/")
+        for socket_path in sockets:
+            try:
+                print(socket_path, _request(socket_path, {"op": "ping" if args.command == "status" else "stop"}, timeout=5))
+            except (FileNotFoundError, ConnectionRefusedError):
+                print(f"No LLM daemon on {socket_path}")
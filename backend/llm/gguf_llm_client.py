@@ -0,0 +1,186 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import List, Optional, Union
+from llama_cpp import Llama, LlamaGrammar
+from pydantic import ValidationError
+from data_models import FormGEntry
+from llm.base_llm_client import BaseLLMClient
+
+'''
+CPU backend: quantized GGUF models (int8 Q8_0 / int4 Q4_K_M builds of small instruct models, e.g.
+Qwen3-4B-Q4_K_M.gguf) through llama.cpp (pip install llama-cpp-python), for ingest nodes without a GPU.
+- threads: generation is memory-bandwidth bound and runs best on physical cores only; prompt prefill is compute bound
+  and can use every logical core (n_threads_batch). n_threads="auto" picks those, tune_threads() measures.
+- decoding is constrained to the FormGEntry json schema with a llama.cpp grammar (same idea as constrained_json
+  in hf_llm_client), no thinking, so a filing costs ~100 generated tokens.
+- batch-aware scheduling: extract_and_validate_batch runs n_workers model instances (weights are mmapped, so they
+  share one copy in memory; each has its own kv cache), each on cores / n_workers threads, pulling the longest
+  remaining filing first so the workers finish together. llama.cpp releases the GIL while evaluating.
+- each instance keeps its last prompt's kv cache and reuses the longest common prefix, i.e. the system prompt.
+EXPERIMENTAL: not yet run against a real GGUF model. Speed and accuracy vs the GPU model are unmeasured until
+benchmarks/bench_cpu_llm.py has been run; tests/test_gguf_client.py covers the scheduling with llama_cpp stubbed.
+'''
+
+DEFAULT_CTX = 8192 # 13G input is budgeted to ~4k tokens (g13_prefilter) + prompt + output
+
+
+def logical_cores() -> int:
+    """CPUs this process may run on (container cpu affinity respected)"""
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+
+def physical_cores(cpuinfo_path: str = "/proc/cpuinfo") -> int:
+    """Physical cores available to this process, logical count if unknown"""
+    logical = logical_cores()
+    try:
+        with open(cpuinfo_path, "r") as f:
+            info = f.read()
+        siblings = re.search(r"^siblings\s*:\s*(\d+)", info, re.MULTILINE)
+        cores = re.search(r"^cpu cores\s*:\s*(\d+)", info, re.MULTILINE)
+        if siblings and cores and int(siblings.group(1)) > int(cores.group(1)): # hyperthreading: 2 logical per core
+            return max(1, logical * int(cores.group(1)) // int(siblings.group(1)))
+    except OSError:
+        pass
+    return logical
+
+
+class GgufLLMClient(BaseLLMClient):
+    concurrent = True # own worker instances, callers don't need to serialize
+
+    def __init__(self, model_path, model_name=None, n_threads: Union[int, str] = "auto", n_workers=1, n_ctx=DEFAULT_CTX,
+                 n_batch=512, debug=False, debug_log_path="llm_debug.log"):
+        self.model_path = model_path
+        self.model_name = model_name or os.path.basename(model_path) # llm cache key: the quantization is part of the name
+        self.n_workers = max(1, n_workers)
+        cores = physical_cores()
+        self.n_threads = max(1, (cores if n_threads == "auto" else int(n_threads)) // self.n_workers)
+        self.n_threads_batch = max(self.n_threads, logical_cores() // self.n_workers)
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.batch_size = self.n_workers # Form13GParser.parse_all batches when > 1
+        self.max_new_tokens = 512 # the json object is ~100 tokens
+        self.debug = debug
+        self.debug_log_path = debug_log_path
+        print("gguf provider is experimental: check it with benchmarks/bench_cpu_llm.py before relying on its output")
+        self.grammar = LlamaGrammar.from_json_schema(json.dumps(FormGEntry.model_json_schema()), verbose=False)
+        self.models = queue.Queue() # idle instances
+        self._n_loaded = 0
+        self._load_lock = threading.Lock()
+        first = self._load()
+        self.models.put(first)
+        self.tokenizer = _GgufTokenizer(first) # for the 13G token budget; vocab lookups are safe while the instance generates
+
+    def _load(self) -> Llama:
+        start = time.time()
+        llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_batch=self.n_batch, n_threads=self.n_threads,
+                    n_threads_batch=self.n_threads_batch, use_mmap=True, verbose=self.debug)
+        self._n_loaded += 1
+        print(f"Loaded {self.model_name} instance {self._n_loaded}/{self.n_workers} in {time.time() - start:.1f}s "
+              f"({self.n_threads} threads, {self.n_threads_batch} for prefill)")
+        return llm
+
+    def _checkout(self) -> Llama:
+        """An idle instance; loads another one (up to n_workers) instead of waiting"""
+        try:
+            return self.models.get_nowait()
+        except queue.Empty:
+            with self._load_lock:
+                if self._n_loaded < self.n_workers:
+                    return self._load()
+            return self.models.get()
+
+    def build_messages(self, filing_text, system_prompt_file="llm/prompt.txt"):
+        messages = super().build_messages(filing_text, system_prompt_file)
+        if "qwen3" in self.model_name.lower():
+            messages[-1]["content"] += "\n/no_think" # Qwen3 soft switch: the grammar allows no <think> block anyway
+        return messages
+
+    def extract_data_llm(self, file_text) -> str:
+        llm = self._checkout()
+        try:
+            response = llm.create_chat_completion(
+                messages=self.build_messages(file_text),
+                grammar=self.grammar,
+                max_tokens=self.max_new_tokens,
+                temperature=0.0,
+            )
+        finally:
+            self.models.put(llm)
+        llm_response = response["choices"][0]["message"]["content"] or ""
+        if self.debug:
+            try:
+                with open(self.debug_log_path, "a", encoding="utf-8") as fh:
+                    fh.write(f"=== {self.model_name} ===\nLLM_RAW_RESPONSE:\n{llm_response}\n\nUSAGE: {response.get('usage')}\n---\n\n")
+            except Exception:
+                pass
+        return llm_response
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1) -> dict:
+        last_exception = None
+        for attempt in range(1, max_tries + 2):
+            try:
+                return self._validate_response(self.extract_data_llm(file_text), entry_model)
+            except (json.JSONDecodeError, ValidationError, ValueError) as e:
+                print(f"LLM extraction/validation error (attempt {attempt}/{max_tries+1}): {e}")
+                last_exception = e
+        raise last_exception
+
+    def extract_and_validate_batch(self, file_texts: List[str], entry_model, max_tries=1) -> List[Union[dict, Exception]]:
+        """n_workers instances in parallel, longest filing first; results in input order"""
+        results: List[Optional[Union[dict, Exception]]] = [None] * len(file_texts)
+        todo = queue.Queue()
+        for i in sorted(range(len(file_texts)), key=lambda i: len(file_texts[i]), reverse=True):
+            todo.put(i)
+
+        def work():
+            while True:
+                try:
+                    i = todo.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[i] = self.extract_and_validate(file_texts[i], entry_model, max_tries=max_tries)
+                except Exception as e:
+                    results[i] = e
+
+        threads = [threading.Thread(target=work) for _ in range(min(self.n_workers, len(file_texts)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+
+class _GgufTokenizer:
+    """encode/decode with the gguf model's own vocab (what parsers/g13_prefilter expects from a tokenizer)"""
+    def __init__(self, model: Llama):
+        self.model = model
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        return self.model.tokenize(text.encode("utf-8"), add_bos=add_special_tokens, special=False)
+
+    def decode(self, ids: List[int], skip_special_tokens: bool = True) -> str:
+        return self.model.detokenize(list(ids)).decode("utf-8", errors="ignore")
+
+
+def tune_threads(model_path: str, sample_text: str, candidates: Optional[List[int]] = None, n_ctx: int = DEFAULT_CTX,
+                 max_tokens: int = 64) -> int:
+    """Time one extraction-sized generation at each thread count, return the fastest.
+    Each candidate loads its own instance (cheap after the first: the weights stay in the page cache)"""
+    cores = physical_cores()
+    candidates = candidates or sorted({max(1, cores // 4), max(1, cores // 2), cores, cores + cores // 2})
+    messages = BaseLLMClient().build_messages(sample_text)
+    timings = {}
+    for n in candidates:
+        llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n, n_threads_batch=max(n, logical_cores()), verbose=False)
+        llm.create_chat_completion(messages=messages, max_tokens=1) # warm up, and the prompt is cached from here
+        start = time.perf_counter()
+        llm.create_chat_completion(messages=messages, max_tokens=max_tokens, temperature=0.0)
+        timings[n] = time.perf_counter() - start
+        print(f"  {n:>3} threads: {timings[n]:.2f}s for {max_tokens} tokens")
+        del llm
+    return min(timings, key=timings.get)
@@ -1,11 +1,49 @@
-from llm.hf_llm_client import HfLLMClient
-from llm.openai_llm_client import OpenAILLMClient
+# clients are imported inside each branch: torch/transformers (or openai) only load for the provider actually used,
+# so 13F-only and daemon runs start in well under a second
 
 
 def get_llm_client(config, debug):
-        if config['provider'] == 'huggingface':
-            return HfLLMClient(config['model_name'], debug=debug)
+        if config.get('daemon') and config.get('provider') != 'cascade': # cascade tiers each have their own daemon setting
+            # model lives in a long-lived process (llm/daemon.py); nothing loads or connects until the first cache miss
+            from llm.daemon import DaemonLLMClient
+            client = DaemonLLMClient(config)
+        elif config['provider'] == 'huggingface':
+            from llm.hf_llm_client import HfLLMClient
+            client = HfLLMClient(config['model_name'], debug=debug)
+            # decoding options: enable_thinking, max_thinking_tokens, constrained_json (FormGEntry json template), max_new_tokens,
+            # prefix_cache (system prompt kv cache)
+            for key in ('enable_thinking', 'max_thinking_tokens', 'constrained_json', 'max_new_tokens', 'prefix_cache'):
+                if key in config:
+                    setattr(client, key, config[key])
         elif config['provider'] == 'openai':
-            return OpenAILLMClient(config['api_key'], config['model_name'], debug=debug)
+            from llm.openai_llm_client import DEFAULT_API_VERSION, DEFAULT_AZURE_ENDPOINT, OpenAILLMClient
+            # base_url: plain OpenAI / compatible endpoint instead of Azure. batch_job: Batch API (cheaper, up to 24h)
+            client = OpenAILLMClient(config['api_key'], config['model_name'], debug=debug, base_url=config.get('base_url'),
+                                     azure_endpoint=config.get('azure_endpoint', DEFAULT_AZURE_ENDPOINT),
+                                     api_version=config.get('api_version', DEFAULT_API_VERSION),
+                                     max_concurrency=int(config.get('max_concurrency', 16)),
+                                     batch_job=bool(config.get('batch_job', False)),
+                                     poll_seconds=float(config.get('poll_seconds', 60)))
+        elif config['provider'] == 'vllm':
+            # OpenAI-compatible server (vllm serve ...); keeps max_in_flight requests going for its continuous batching
+            from llm.vllm_llm_client import DEFAULT_BASE_URL, VllmLLMClient
+            client = VllmLLMClient(config['model_name'], base_url=config.get('base_url', DEFAULT_BASE_URL),
+                                   api_key=config.get('api_key'), max_in_flight=int(config.get('max_in_flight', 32)),
+                                   timeout=(5, float(config.get('timeout', 600))), debug=debug)
+        elif config['provider'] == 'cascade':
+            # small model first, large model only for answers that fail validation/consistency checks
+            from llm.cascade_llm_client import CHECKS, CASCADE_LOG, CascadeLLMClient
+            client = CascadeLLMClient(get_llm_client(config['small'], debug), get_llm_client(config['large'], debug),
+                                      checks=config.get('checks', CHECKS), log_file=config.get('log_file', CASCADE_LOG))
+        elif config['provider'] == 'gguf':
+            # experimental: quantized model on CPU through llama.cpp (no GPU nodes); n_workers parallel instances share the mmapped weights
+            from llm.gguf_llm_client import GgufLLMClient
+            client = GgufLLMClient(config['model_path'], model_name=config.get('model_name'), n_threads=config.get('n_threads', 'auto'),
+                                   n_workers=int(config.get('n_workers', 1)), n_ctx=int(config.get('n_ctx', 8192)), debug=debug)
         else:
-            raise ValueError("Unknown LLM provider")
\ No newline at end of file
+            raise ValueError("Unknown LLM provider")
+        if config.get('max_input_tokens'):
+            client.max_input_tokens = int(config['max_input_tokens']) # 13G prefilter budget (parsers/g13_prefilter.py)
+        if config.get('batch_size'):
+            client.batch_size = int(config['batch_size']) # filings per generate() call (Form13GParser.parse_all batches when > 1)
+        return client
@@ -1,15 +1,111 @@
 import datetime
 from llm.base_llm_client import BaseLLMClient
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import os
+import torch
+from transformers import (AutoTokenizer, AutoModelForCausalLM, LogitsProcessor, LogitsProcessorList,
+                          StoppingCriteria, StoppingCriteriaList)
 import json
 import time
+from typing import List, Optional, Tuple, Union
 from pydantic import ValidationError
 from data_models import FormGEntry
+from llm.json_constraint import JsonObjectPrefix, schema_fields
+from llm.kv_prefix import pad_after_prefix, repeat_cache, split_prefix
+
+THINK_END_ID = 151668 # </think> in the Qwen3 tokenizer
+PREFIX_SENTINEL = "\x00FILING\x00" # stand-in user content, to find where the filing text starts in the chat template
+TOP_K = 64 # constrained decoding: valid tokens are looked for among the top-k logits first
+
+
+class JsonSchemaLogitsProcessor(LogitsProcessor):
+    """Masks every token that would take a row's output off the FormGEntry json template (llm/json_constraint.py).
+    With thinking on, a row is free until it emits </think> (forced after max_thinking_tokens); once its object
+    closes only eos is allowed. One instance per generate() call: it keeps per-row state between steps"""
+    def __init__(self, tokenizer, fields, thinking: bool, max_thinking_tokens: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.checker = JsonObjectPrefix(fields)
+        self.token_text = {} # id -> decoded text, filled on demand (decoding the whole vocab up front takes seconds)
+        self.eos_id = tokenizer.eos_token_id
+        self.thinking = thinking
+        self.max_thinking_tokens = max_thinking_tokens
+        self.prompt_len = None
+        self.states = [] # per row: json prefix state, or None while thinking
+        self.thought = [] # per row: thinking tokens so far
+
+    def _text(self, token_id: int) -> str:
+        text = self.token_text.get(token_id)
+        if text is None:
+            text = self.token_text[token_id] = self.tokenizer.decode([token_id])
+        return text
+
+    def done(self, row: int) -> bool:
+        return self.states[row] is not None and self.checker.is_done(self.states[row])
+
+    def _advance(self, input_ids):
+        if self.prompt_len is None:
+            self.prompt_len = input_ids.shape[1]
+            self.states = [None if self.thinking else self.checker.start() for _ in range(input_ids.shape[0])]
+            self.thought = [0] * input_ids.shape[0]
+            return
+        for r, token_id in enumerate(input_ids[:, -1].tolist()):
+            if self.states[r] is None: # still thinking
+                self.thought[r] += 1
+                if token_id == THINK_END_ID:
+                    self.states[r] = self.checker.start()
+            elif not self.checker.is_done(self.states[r]):
+                self.states[r] = self.checker.feed(self.states[r], self._text(token_id)) or self.states[r]
+
+    def __call__(self, input_ids, scores):
+        self._advance(input_ids)
+        masked = torch.full_like(scores, float("-inf"))
+        for r, state in enumerate(self.states):
+            if state is None:
+                if self.max_thinking_tokens is not None and self.thought[r] >= self.max_thinking_tokens:
+                    masked[r, THINK_END_ID] = 0 # thinking budget spent: close it
+                else:
+                    masked[r] = scores[r]
+                continue
+            if self.checker.is_done(state):
+                masked[r, self.eos_id] = 0
+                continue
+            allowed = self._allowed(state, torch.topk(scores[r], TOP_K).indices.tolist())
+            if not allowed: # rare: nothing valid near the top, walk the whole vocab in logit order
+                allowed = self._allowed(state, torch.argsort(scores[r], descending=True).tolist(), first_only=True)
+            masked[r, allowed] = scores[r, allowed]
+        return masked
+
+    def _allowed(self, state, candidates, first_only=False) -> List[int]:
+        out = []
+        for token_id in candidates:
+            if token_id == self.eos_id:
+                continue
+            text = self._text(token_id)
+            if text and self.checker.feed(state, text) is not None:
+                out.append(token_id)
+                if first_only:
+                    break
+        return out
+
+
+class JsonDoneCriteria(StoppingCriteria):
+    """Row is finished as soon as its json object closes (no extra eos step, no trailing text)"""
+    def __init__(self, processor: JsonSchemaLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # the processor only sees the new token on its next call, so look ahead with it here
+        checker, states = self.processor.checker, self.processor.states
+        done = []
+        for r, token_id in enumerate(input_ids[:, -1].tolist()):
+            state = states[r]
+            if state is not None and not checker.is_done(state):
+                state = checker.feed(state, self.processor._text(token_id))
+            done.append(state is not None and checker.is_done(state))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
 
 
 class HfLLMClient(BaseLLMClient):
     def __init__(self, model_name, debug=False, debug_log_path="llm_debug.log"):
+        self.model_name = model_name
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModelForCausalLM.from_pretrained(
             model_name,
@@ -18,60 +114,170 @@ class HfLLMClient(BaseLLMClient):
         )
         self.debug = debug
         self.debug_log_path = debug_log_path
+        self.batch_size = 8 # filings per generate() call in extract_data_llm_batch ("batch_size" in the llm config)
+        self.max_new_tokens = 32768 # recommended output len for most queries
+        self.enable_thinking = True # "enable_thinking" in the llm config
+        self.max_thinking_tokens = None # constrained mode: force </think> after this many tokens ("max_thinking_tokens")
+        self.constrained_json = True # decode straight into the FormGEntry json template, stop when it closes ("constrained_json")
+        self.json_fields = schema_fields(FormGEntry)
+        self.prefix_cache = True # reuse the system prompt's kv cache across filings ("prefix_cache")
+        self.do_sample = None # None: model's generation_config; False: greedy (benchmarks comparing outputs)
+        self._prefix_state = None # (system prompt + thinking flag, prefix token ids, past_key_values)
 
-    def build_messages(self, filing_text, system_prompt_file="llm/prompt.txt"):
-        # prepare the model input
-        folder = '.'
-        with open(os.path.join(folder, system_prompt_file), "r") as f:
-            system_prompt = f.read().strip()
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": filing_text}
-        ]
-        return messages
-    
-    def extract_data_llm(self, file_text) -> str:
-        messages = self.build_messages(file_text)
-        text = self.tokenizer.apply_chat_template(
-            messages,
+    def _chat_prompt(self, file_text) -> str:
+        return self.tokenizer.apply_chat_template(
+            self.build_messages(file_text),
             tokenize=False,
             add_generation_prompt=True,
-            enable_thinking=True # Switches between thinking and non-thinking modes. Default is True.
+            enable_thinking=self.enable_thinking # Switches between thinking and non-thinking modes. Default is True.
         )
+
+    def _split_thinking(self, output_ids: List[int]) -> Tuple[str, str]:
+        """(thinking_content, llm_response) of one generated row"""
+        try:
+            # rindex finding 151668 (</think>)
+            index = len(output_ids) - output_ids[::-1].index(THINK_END_ID)
+        except ValueError:
+            index = 0
+        thinking_content = self.tokenizer.decode(output_ids[:index], skip_special_tokens=True).strip("\n")
+        llm_response = self.tokenizer.decode(output_ids[index:], skip_special_tokens=True).strip("\n")
+        return thinking_content, llm_response
+
+    def _log_debug(self, text, thinking_content, llm_response):
+        if not self.debug:
+            return
+        try:
+            with open(self.debug_log_path, "a", encoding="utf-8") as fh:
+                fh.write(f"=== {datetime.datetime.utcnow().isoformat()} UTC ===\n")
+                fh.write("PROMPT (tokenized input):\n")
+                fh.write(text + "\n\n")
+                fh.write("THINKING_CONTENT:\n")
+                fh.write(thinking_content + "\n\n")
+                fh.write("LLM_RAW_RESPONSE:\n")
+                fh.write(llm_response + "\n\n")
+                fh.write("---\n\n")
+        except Exception:
+            # keep behavior non-failing if logging fails
+            pass
+
+    def _prefix(self) -> Tuple[List[int], object]:
+        """(token ids, prefilled kv cache) of the chat prompt up to the filing text (system turn + "<|im_start|>user\\n").
+        Computed once per system prompt / thinking flag"""
+        messages = self.build_messages(PREFIX_SENTINEL)
+        key = (messages[0]["content"], self.enable_thinking)
+        if self._prefix_state is None or self._prefix_state[0] != key:
+            text = self._chat_prompt(PREFIX_SENTINEL)
+            prefix_ids = self.tokenizer(text[:text.index(PREFIX_SENTINEL)], return_tensors="pt").input_ids.to(self.model.device)
+            with torch.no_grad():
+                past_key_values = self.model(prefix_ids, use_cache=True).past_key_values
+            self._prefix_state = (key, prefix_ids[0].tolist(), past_key_values)
+        return self._prefix_state[1], self._prefix_state[2]
+
+    def _prefix_kv(self, input_ids: List[int]):
+        """Copy of the prefix kv cache for one prompt, or None if input_ids don't start with exactly the prefix tokens.
+        generate() then only prefills the filing's tokens"""
+        prefix_ids, past_key_values = self._prefix()
+        if split_prefix(prefix_ids, input_ids) is None:
+            return None
+        return repeat_cache(past_key_values, 1)
+
+    def _prefix_batch(self, rows_ids: List[List[int]]):
+        """(model_inputs, kv cache) for a batch laid out [prefix][pad][filing] (llm/kv_prefix.py), or None when any row
+        doesn't share the exact prefix tokens or the cache can't be expanded: the batch then goes left padded, uncached"""
+        prefix_ids, past_key_values = self._prefix()
+        suffixes = [split_prefix(prefix_ids, ids) for ids in rows_ids]
+        if any(suffix is None for suffix in suffixes):
+            return None
+        cache = repeat_cache(past_key_values, len(rows_ids))
+        if cache is None:
+            return None
+        input_ids, attention_mask = pad_after_prefix(prefix_ids, suffixes, self.tokenizer.pad_token_id)
+        model_inputs = {"input_ids": torch.tensor(input_ids, device=self.model.device),
+                        "attention_mask": torch.tensor(attention_mask, device=self.model.device)}
+        return model_inputs, cache
+
+    def _generate_kwargs(self) -> dict:
+        """max_new_tokens + (constrained mode) a fresh json processor/stopping criteria for one generate() call"""
+        kwargs = {"max_new_tokens": self.max_new_tokens}
+        if self.do_sample is not None:
+            kwargs["do_sample"] = self.do_sample
+        if self.constrained_json:
+            processor = JsonSchemaLogitsProcessor(self.tokenizer, self.json_fields, self.enable_thinking, self.max_thinking_tokens)
+            kwargs["logits_processor"] = LogitsProcessorList([processor])
+            kwargs["stopping_criteria"] = StoppingCriteriaList([JsonDoneCriteria(processor)])
+        return kwargs
+
+    def extract_data_llm(self, file_text) -> str:
+        text = self._chat_prompt(file_text)
         model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
+        kwargs = self._generate_kwargs()
+        if self.prefix_cache:
+            past_key_values = self._prefix_kv(model_inputs.input_ids[0].tolist())
+            if past_key_values is not None:
+                kwargs["past_key_values"] = past_key_values
         print("\nGenerating...\n")
         # conduct text completion
         generated_ids = self.model.generate(
             **model_inputs,
-            max_new_tokens=32768 # recommended output len for most queries
+            **kwargs
         )
         output_ids = generated_ids[0][len(model_inputs.input_ids[0]):].tolist() 
 
         # parsing thinking content
-        try:
-            # rindex finding 151668 (</think>)
-            index = len(output_ids) - output_ids[::-1].index(151668)
-        except ValueError:
-            index = 0
+        thinking_content, llm_response = self._split_thinking(output_ids)
+        self._log_debug(text, thinking_content, llm_response)
+        return llm_response
 
-        thinking_content = self.tokenizer.decode(output_ids[:index], skip_special_tokens=True).strip("\n")
-        llm_response = self.tokenizer.decode(output_ids[index:], skip_special_tokens=True).strip("\n")
-        if self.debug:
+    def extract_data_llm_batch(self, file_texts: List[str], batch_size: Optional[int] = None) -> List[str]:
+        """Responses for several filings, in input order. Prompts are sorted by token length and generated
+        batch_size at a time, so each batch pads to about the same length. With prefix_cache the shared system prompt
+        is prefilled once and the padding goes between it and the filing (_prefix_batch); otherwise rows are left padded"""
+        batch_size = batch_size or self.batch_size
+        prompts = [self._chat_prompt(t) for t in file_texts]
+        prompt_ids = self.tokenizer(prompts).input_ids
+        lengths = [len(ids) for ids in prompt_ids]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i]) # length bucketing
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left" # decoder-only: new tokens must follow the last prompt token in every row
+
+        responses: List[Optional[str]] = [None] * len(prompts)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            kwargs = self._generate_kwargs()
+            prefixed = self._prefix_batch([prompt_ids[i] for i in rows]) if self.prefix_cache else None
+            if prefixed is not None:
+                model_inputs, kwargs["past_key_values"] = prefixed
+            else:
+                model_inputs = self.tokenizer([prompts[i] for i in rows], return_tensors="pt", padding=True).to(self.model.device)
+            print(f"\nGenerating batch of {len(rows)} ({lengths[rows[0]]}-{lengths[rows[-1]]} tokens"
+                  f"{', cached prefix' if prefixed is not None else ''})...\n")
+            generated_ids = self.model.generate(**model_inputs, **kwargs)
+            prompt_len = model_inputs["input_ids"].shape[1] # same for all rows, whichever padding
+            for r, i in enumerate(rows):
+                # rows that finished early are padded with pad_token after eos; decode(skip_special_tokens) drops them
+                thinking_content, llm_response = self._split_thinking(generated_ids[r][prompt_len:].tolist())
+                self._log_debug(prompts[i], thinking_content, llm_response)
+                responses[i] = llm_response
+        return responses
+
+    def extract_and_validate_batch(self, file_texts: List[str], entry_model: FormGEntry, max_tries=1) -> List[Union[dict, Exception]]:
+        """Batched extract_and_validate: one validated dict or the exception per input, in input order.
+        Rows that fail decode/validation are retried one at a time with extract_and_validate"""
+        results: List[Union[dict, Exception]] = []
+        for file_text, data in zip(file_texts, self.extract_data_llm_batch(file_texts)):
             try:
-                with open(self.debug_log_path, "a", encoding="utf-8") as fh:
-                    fh.write(f"=== {datetime.utcnow().isoformat()} UTC ===\n")
-                    fh.write("PROMPT (tokenized input):\n")
-                    fh.write(text + "\n\n")
-                    fh.write("THINKING_CONTENT:\n")
-                    fh.write(thinking_content + "\n\n")
-                    fh.write("LLM_RAW_RESPONSE:\n")
-                    fh.write(llm_response + "\n\n")
-                    fh.write("---\n\n")
-            except Exception:
-                # keep behavior non-failing if logging fails
-                pass
-        return llm_response
+                results.append(self._validate_response(data, entry_model))
+            except (json.JSONDecodeError, ValidationError, ValueError) as e:
+                print(f"LLM extraction/validation error (batched): {e}")
+                if max_tries < 1:
+                    results.append(e)
+                    continue
+                try:
+                    results.append(self.extract_and_validate(file_text, entry_model, max_tries=max_tries - 1))
+                except Exception as retry_error:
+                    results.append(retry_error)
+        return results
 
     def extract_and_validate(self, file_text, entry_model: FormGEntry, max_tries = 1) -> dict:
         """Call the LLM via extract_data_llm to extract JSON from the given file_text, parse it, and validate with the given pydantic model.
@@ -86,33 +292,7 @@ class HfLLMClient(BaseLLMClient):
             attempt += 1
             try:
                 data = self.extract_data_llm(file_text) # get extraction for one file
-                data_json = json.loads(data)
-                # If model returned a JSON string (double-encoded), try decode again
-                if isinstance(data_json, str):
-                    try:
-                        data_json = json.loads(data_json)
-                    except json.JSONDecodeError:
-                        pass # leave as string, handled below
-                print("Parsed JSON:", data_json)
-                
-                try:
-                    data_json = self._coerce_types(data_json) # coerce types for some number-looking fields
-                except ValueError as e: # treat as validation errors for max_retries
-                    raise ValueError(f"type coercion error: {e}")
-                
-                validated = entry_model(**data_json) # validate filing data with pydantic mode. returns a model instance
-                if self.debug:
-                    try:
-                        with open(self.debug_log_path, "a", encoding="utf-8") as fh:
-                            fh.write(f"=== {datetime.utcnow().isoformat()} UTC VALIDATION ===\n")
-                            fh.write("PARSED_JSON:\n")
-                            fh.write(json.dumps(data_json, ensure_ascii=False, indent=2) + "\n\n")
-                            fh.write("VALIDATED ENTRIES:\n")
-                            fh.write(validated.json(ensure_ascii=False, indent=2) + "\n\n")
-                            fh.write("=== END ===\n\n")
-                    except Exception:
-                        pass
-                return validated.dict()
+                return self._validate_response(data, entry_model)
 
             except (json.JSONDecodeError, ValidationError, ValueError) as e:
                 print(f"LLM extraction/validation error (attempt {attempt}/{max_tries+1}): {e}")
@@ -0,0 +1,106 @@
+from typing import List, Optional, Tuple, Type
+from pydantic import BaseModel
+
+'''
+Prefix checker for "one flat JSON object with these keys, in this order" -- what FormGEntry needs.
+Constrained decoding (hf_llm_client.JsonSchemaLogitsProcessor) keeps only tokens whose text keeps the output a valid
+prefix, so the model can't produce free text, markdown fences, "NA" for an int, or a missing key, and generation
+stops at the closing brace instead of running on to max_new_tokens.
+
+Template for FormGEntry:  {"name_filer": <string>, "report_date": <string>, ..., "shares_dispo_shared": <integer>}
+Keys and punctuation are fixed (whitespace between them is free); value slots accept JSON strings (escapes allowed,
+no raw newlines, capped length), integers, or numbers (no exponent). States are plain tuples so the
+processor can advance one per row per step and try candidate tokens without copying anything.
+'''
+
+MAX_STRING = 200 # chars per string value, so a looping model can't fill max_new_tokens inside one string
+MAX_DIGITS = 20
+WS = " \t\n\r"
+DIGITS = "0123456789"
+HEX = "0123456789abcdefABCDEF"
+
+
+def schema_fields(model: Type[BaseModel]) -> List[Tuple[str, str]]:
+    """[(field, json type)] in declaration order from the pydantic model's json schema"""
+    props = model.model_json_schema()["properties"]
+    return [(name, p.get("type", "string")) for name, p in props.items()]
+
+
+class JsonObjectPrefix:
+    def __init__(self, fields: List[Tuple[str, str]]):
+        self.segments: List[Tuple[str, Optional[str]]] = [] # ("lit", text) or (json type, None)
+        for i, (name, kind) in enumerate(fields):
+            self.segments.append(("lit", ("{" if i == 0 else ",") + f'"{name}":'))
+            self.segments.append((kind if kind in ("string", "integer", "number") else "string", None))
+        self.segments.append(("lit", "}"))
+        # per literal position: inside a quoted key (no whitespace skipping there)
+        self.in_quotes = []
+        for kind, text in self.segments:
+            flags, inside = [], False
+            for ch in text or "":
+                flags.append(inside and ch != '"')
+                if ch == '"':
+                    inside = not inside
+            self.in_quotes.append(flags)
+        self.done_state = (len(self.segments), 0, 0)
+
+    def start(self):
+        return (0, 0, 0) # (segment, position in literal / value sub-state, chars in value)
+
+    def is_done(self, state) -> bool:
+        return state == self.done_state
+
+    def feed(self, state, text: str):
+        """State after text, or None if text can't continue a valid object"""
+        for ch in text:
+            state = self._step(state, ch)
+            if state is None:
+                return None
+        return state
+
+    def _step(self, state, ch):
+        seg, pos, n = state
+        if seg == len(self.segments):
+            return state if ch in WS else None # nothing after the closing brace
+        kind, text = self.segments[seg]
+        if kind == "lit":
+            if ch == text[pos]:
+                pos += 1
+                return (seg + 1, 0, 0) if pos == len(text) else (seg, pos, 0)
+            if ch in WS and not self.in_quotes[seg][pos]:
+                return state
+            return None
+        if kind == "string":
+            # pos: 0 before the opening quote, 1 in the string, 2 after a backslash, 3-6 in \uXXXX
+            if pos == 0:
+                return (seg, 1, 0) if ch == '"' else (state if ch in WS else None)
+            if pos == 1:
+                if ch == '"':
+                    return (seg + 1, 0, 0)
+                if ch == "\\":
+                    return (seg, 2, n)
+                if ch < " " or n >= MAX_STRING:
+                    return None
+                return (seg, 1, n + 1)
+            if pos == 2:
+                if ch == "u":
+                    return (seg, 3, n)
+                return (seg, 1, n + 1) if ch in '"\\/bfnrt' else None
+            if ch not in HEX:
+                return None
+            return (seg, 1, n + 1) if pos == 6 else (seg, pos + 1, n)
+        # integer / number. pos: 0 start, 1 after '-', 2 integer digits, 3 after '.', 4 fraction digits
+        if pos == 0:
+            if ch in WS:
+                return state
+            if ch == "-":
+                return (seg, 1, 0)
+        if ch in DIGITS:
+            if n >= MAX_DIGITS:
+                return None
+            return (seg, 4 if pos >= 3 else 2, n + 1)
+        if ch == "." and pos == 2 and kind == "number":
+            return (seg, 3, n)
+        if pos in (2, 4):
+            return self._step((seg + 1, 0, 0), ch) # value ended, char belongs to the next literal
+        return None
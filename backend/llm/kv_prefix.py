@@ -0,0 +1,45 @@
+import copy
+from typing import List, Optional, Sequence, Tuple
+
+'''
+Shared-prefix kv cache for batched generate() (HfLLMClient.extract_data_llm_batch).
+With plain left padding the system prompt sits at a different offset in every row, so one prefilled cache can't serve
+them all. Instead each row is laid out as
+    [prefix tokens][pad ... pad][filing tokens]
+i.e. the filings are right-aligned after the shared prefix and the padding sits in the middle, masked out.
+generate() takes position ids from the attention mask (cumsum), so every row's filing tokens get the same positions
+as in the unbatched prompt, and the prefix kv is prefilled once and repeated across the batch.
+The list helpers have no torch dependency (tests/test_kv_prefix.py).
+'''
+
+
+def split_prefix(prefix_ids: Sequence[int], input_ids: Sequence[int]) -> Optional[List[int]]:
+    """Tokens after the shared prefix, or None when input_ids don't start with exactly prefix_ids (the chat template
+    tokenized differently across the boundary) or nothing follows it: the caller falls back to the uncached path"""
+    n = len(prefix_ids)
+    if len(input_ids) <= n or list(input_ids[:n]) != list(prefix_ids):
+        return None
+    return list(input_ids[n:])
+
+
+def pad_after_prefix(prefix_ids: Sequence[int], suffixes: List[List[int]], pad_id: int) -> Tuple[List[List[int]], List[List[int]]]:
+    """(input_ids, attention_mask) rows: prefix, then padding, then each suffix right-aligned"""
+    width = max(len(s) for s in suffixes)
+    input_ids, attention_mask = [], []
+    for suffix in suffixes:
+        pad = width - len(suffix)
+        input_ids.append(list(prefix_ids) + [pad_id] * pad + suffix)
+        attention_mask.append([1] * len(prefix_ids) + [0] * pad + [1] * len(suffix))
+    return input_ids, attention_mask
+
+
+def repeat_cache(past_key_values, batch: int):
+    """Copy of a batch-1 kv cache repeated to `batch` rows (generate() appends to the cache it's given). None if this
+    cache type can't be expanded, so the caller goes uncached"""
+    cache = copy.deepcopy(past_key_values)
+    if batch == 1:
+        return cache
+    if hasattr(cache, "batch_repeat_interleave"): # transformers DynamicCache
+        cache.batch_repeat_interleave(batch)
+        return cache
+    return None
@@ -1,20 +1,168 @@
+import argparse
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from cache_manager import CacheEntry, CacheManager
+
+'''
+LLM output cache in SQLite (WAL mode): inserts are O(1) and several ingest processes can read/write the same file at once
+(readers never block, writers queue on busy_timeout).
+
+One row per (accession, prompt_version, model), so a prompt edit or a model switch misses instead of returning the old
+answer -- and only for that prompt/model, other rows stay valid. Rows also carry a content hash of the text that was sent
+to the LLM, so identical text under another accession (re-filed/amended docs) reuses the answer without a call.
+
+Old llm/llm_cache.json files (flat {accession: data}) are imported automatically the first time an empty db is opened
+next to one, or with: python -m llm.llm_cache import --json <file>
+The file doesn't record prompt or model: rows are stamped with the prompt version current at import (recorded in the
+llm_cache_meta table) and no model. While that prompt is still current, get_entry falls back to those rows for any model,
+so upgrading doesn't re-send the corpus to the LLM; Form13GParser then stores the answer under its full key. Once the
+prompt changes they miss like any other stale row (`cache_manager.py invalidate --stale_prompt` drops them).
+'''
+
+LEGACY_JSON = "llm/llm_cache.json"
+
+
+def prompt_version(prompt_file="llm/prompt.txt") -> str:
+    """Short hash of the system prompt, stored with each entry so a prompt change can invalidate old outputs"""
+    try:
+        with open(prompt_file, "rb") as f:
+            return hashlib.sha1(f.read().strip()).hexdigest()[:12]
+    except OSError:
+        return ""
+
 
 class LLMCache:
-    def __init__(self, cache_file="llm/llm_cache.json"):
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_file="llm/llm_cache.db", legacy_json=LEGACY_JSON):
         self.cache_file = cache_file
-        if os.path.exists(cache_file):
-            with open(cache_file, "r") as f:
-                self.cache = json.load(f)
-        else:
-            self.cache = {}
-    
-    def get(self, accession) -> dict:
+        self.local = threading.local() # sqlite connections can't be shared across threads
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_outputs (
+                accession TEXT NOT NULL,
+                prompt_version TEXT NOT NULL DEFAULT '',
+                model TEXT NOT NULL DEFAULT '',
+                content_hash TEXT,
+                primary_doc TEXT,
+                data TEXT NOT NULL,
+                cache_time REAL NOT NULL,
+                PRIMARY KEY (accession, prompt_version, model)
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_outputs_content ON llm_outputs (content_hash, prompt_version, model)")
+        conn.execute("CREATE TABLE IF NOT EXISTS llm_cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = conn.execute("SELECT value FROM llm_cache_meta WHERE key = 'legacy_prompt_version'").fetchone()
+        self.legacy_prompt_version = row[0] if row else None # prompt the imported json rows were stamped with
+        empty = conn.execute("SELECT 1 FROM llm_outputs LIMIT 1").fetchone() is None
+        if empty and legacy_json and os.path.exists(legacy_json):
+            print(f"Imported {self.import_json(legacy_json, prompt_version=prompt_version())} entries from {legacy_json}")
+
+    @classmethod
+    def open(cls, cache_file="llm/llm_cache.db") -> "LLMCache":
+        """One instance per file and process (each thread still gets its own connection)"""
+        key = os.path.abspath(cache_file)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(cache_file)
+            return cls._shared[key]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.cache_file, timeout=30, isolation_level=None) # autocommit, each statement is its own txn
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL: durable across process crashes, fsync only at checkpoints
+            self.local.conn = conn
+        return conn
+
+    @property
+    def manager(self) -> CacheManager:
+        return CacheManager.shared("llm", self, stats_file=os.path.splitext(self.cache_file)[0] + ".stats.json")
+
+    def get_entry(self, accession, prompt_version="", model="", legacy=True) -> Optional[dict]:
+        """{"data", "primary_doc", "content_hash"} for this accession under this prompt + model, or None. No filing I/O needed.
+        legacy: if there's no row for this prompt + model, an imported json row will do while its prompt is still current"""
+        query = "SELECT rowid, data, primary_doc, content_hash FROM llm_outputs WHERE accession = ? AND prompt_version = ? AND model = ?"
+        row = self._conn().execute(query, (accession, prompt_version or "", model or "")).fetchone()
+        if row is None and legacy and model and prompt_version and prompt_version == self.legacy_prompt_version:
+            row = self._conn().execute(query, (accession, prompt_version, "")).fetchone()
+        if row is None:
+            self.manager.miss(accession)
+            return None
+        self.manager.hit(str(row[0]))
+        return {"data": json.loads(row[1]), "primary_doc": row[2], "content_hash": row[3]}
+
+    def get(self, accession, prompt_version="", model="") -> dict:
         """Return cached data (llm output as json) for an accession number."""
-        return self.cache.get(accession)
+        entry = self.get_entry(accession, prompt_version, model)
+        return entry["data"] if entry else None
+
+    def get_by_content(self, content_hash, prompt_version="", model="") -> Optional[dict]:
+        """LLM output for the same input text under this prompt + model, from any accession"""
+        row = self._conn().execute("""
+            SELECT rowid, data FROM llm_outputs WHERE content_hash = ? AND prompt_version = ? AND model = ?
+            LIMIT 1""", (content_hash, prompt_version or "", model or "")).fetchone()
+        if row is None:
+            return None
+        self.manager.hit(str(row[0]))
+        return json.loads(row[1])
+
+    def set(self, accession, data, model="", prompt_version="", content_hash=None, primary_doc=None) -> None:
+        cur = self._conn().execute("INSERT OR REPLACE INTO llm_outputs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (accession, prompt_version or "", model or "", content_hash, primary_doc,
+                                    json.dumps(data), time.time()))
+        self.manager.touch(str(cur.lastrowid))
+
+    def import_json(self, json_file, prompt_version="", model="") -> int:
+        """Bulk load an llm_cache.json ({accession: data}) in one transaction. Existing rows win.
+        prompt_version/model: stamp the entries (the file doesn't record them), age = file age.
+        Stamped with a prompt but no model, they serve every model while that prompt is current (get_entry)"""
+        with open(json_file, "r") as f:
+            raw = json.load(f)
+        mtime = os.path.getmtime(json_file)
+        rows = [(acc, prompt_version, model, json.dumps(data), mtime) for acc, data in raw.items()]
+        conn = self._conn()
+        with conn: # one txn
+            conn.execute("BEGIN")
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO llm_outputs (accession, prompt_version, model, data, cache_time)
+                VALUES (?, ?, ?, ?, ?)""", rows)
+            imported = conn.total_changes - before
+            if prompt_version and not model:
+                conn.execute("INSERT OR REPLACE INTO llm_cache_meta VALUES ('legacy_prompt_version', ?)", (prompt_version,))
+                self.legacy_prompt_version = prompt_version
+            return imported
+
+    # for cache_manager
+    def entries(self):
+        """keys are rowids: one accession can have rows for several prompt/model versions"""
+        cur = self._conn().execute("SELECT rowid, length(data), cache_time, model, prompt_version, accession FROM llm_outputs")
+        for rowid, size, cache_time, model, prompt, acc in cur:
+            yield CacheEntry(str(rowid), size, cache_time, {"model": model or None, "prompt_version": prompt or None, "accession": acc})
+
+    def delete(self, keys) -> int:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            before = conn.total_changes
+            conn.executemany("DELETE FROM llm_outputs WHERE rowid = ?", [(int(k),) for k in keys])
+            return conn.total_changes - before
 
-    def set(self, accession, data) -> None:
-        self.cache[accession] = data
-        with open(self.cache_file, "w") as f:
-            json.dump(self.cache, f)
\ No newline at end of file
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="LLM cache maintenance (run from backend/: python -m llm.llm_cache ...)")
+    parse.add_argument("command", choices=["import"])
+    parse.add_argument("--json", type=str, default=LEGACY_JSON, help="llm_cache.json to import")
+    parse.add_argument("--db", type=str, default="llm/llm_cache.db")
+    parse.add_argument("--prompt_version", type=str, default="current", help="Stamp the entries with this prompt version ('current' = llm/prompt.txt now)")
+    parse.add_argument("--model", type=str, default="", help="Stamp the entries with this model name (default: none, served to any model)")
+    args = parse.parse_args()
+    stamp = prompt_version() if args.prompt_version == "current" else args.prompt_version
+    cache = LLMCache(args.db, legacy_json=None)
+    print(f"Imported {cache.import_json(args.json, prompt_version=stamp, model=args.model)} entries from {args.json} into {args.db}")
@@ -1,56 +1,266 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
 import time
-from openai import AzureOpenAI
 import logging
-import traceback
-# from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+import openai
+from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
 from llm.base_llm_client import BaseLLMClient
-from llm.hf_llm_client import HfLLMClient
 from data_models import FormGEntry
-# from jsonschema import ValidationError
 from pydantic import ValidationError
 
+'''
+OpenAI / Azure OpenAI client. Structured Outputs (json_schema response_format from the pydantic model) on
+chat completions, the endpoint the Batch API and OpenAI-compatible servers (llm/stub_llm_server.py) also speak.
+- extract_and_validate: one filing, synchronous
+- extract_and_validate_batch: all filings concurrently on an async client, at most max_concurrency in flight.
+  A 429 pauses every request (retry-after from the response, else exponential backoff) instead of each one hammering
+  the endpoint on its own; the SDK's own retries are off so the pause is shared.
+- batch_job=True: extract_and_validate_batch goes through the Batch API instead (50% cheaper, results within 24h):
+  writes a JSONL job under llm/batches/, uploads it, polls, maps results back by custom_id (the accession).
+  Submitted jobs are recorded in llm/batches/batches.json, so an interrupted run resumes polling the same job.
+  Rows with bad output are retried (max_tries) through the async path.
+'''
+
+DEFAULT_AZURE_ENDPOINT = "https://gpt4-endoscribe.openai.azure.com/"
+DEFAULT_API_VERSION = "2025-03-01-preview"
+BATCH_DIR = "llm/batches"
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL = ("completed", "failed", "expired", "cancelled")
+MAX_BACKOFFS = 8 # 429/5xx/connection retries per filing (separate from max_tries, which is for bad output)
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def response_format(entry_model) -> dict:
+    schema = entry_model.model_json_schema()
+    schema["additionalProperties"] = False # required by strict mode
+    return {"type": "json_schema", "json_schema": {"name": entry_model.__name__, "schema": schema, "strict": True}}
+
+
 class OpenAILLMClient(BaseLLMClient):
-    def __init__(self, api_key, model_name, debug=False, debug_log_path="llm_debug.log"):
+    concurrent = True # sdk clients are thread safe
+
+    def __init__(self, api_key, model_name, debug=False, debug_log_path="llm_debug.log", base_url=None,
+                 azure_endpoint=DEFAULT_AZURE_ENDPOINT, api_version=DEFAULT_API_VERSION, max_concurrency=16,
+                 timeout=120, batch_job=False, poll_seconds=60, batch_dir=BATCH_DIR):
+        """base_url: plain OpenAI-compatible endpoint (api.openai.com, a local stub); otherwise Azure.
+        model_name is the deployment name on Azure"""
+        self.api_key = api_key
         self.model_name = model_name
-        self.client = AzureOpenAI(
-            azure_endpoint="https://gpt4-endoscribe.openai.azure.com/",
-            api_version="2025-03-01-preview",
-            api_key=api_key # api key from config file
-        )
+        self.base_url = base_url
+        self.azure_endpoint = azure_endpoint
+        self.api_version = api_version
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.batch_size = max_concurrency # Form13GParser.parse_all batches when > 1
+        self.batch_job = batch_job
+        self.poll_seconds = poll_seconds
+        self.batch_dir = batch_dir
+        self.paused_until = 0.0 # shared 429 backoff (time.monotonic)
+        self.client = self._make_client()
         self.debug = debug
         self.debug_log_path = debug_log_path
         if self.debug:
             logging.basicConfig(filename=self.debug_log_path, level=logging.DEBUG)
 
-    #! for now, using same as hf_llm_client
-    def build_messages(self, filing_text, system_prompt_file="llm/prompt.txt"):
-        return HfLLMClient.build_messages(self, filing_text, system_prompt_file)
-    
-    
-    def extract_and_validate(self, file_text, entry_model, max_tries=1) -> dict:
-        """Extracts data from the given file text using the LLM. Uses Strcutred Output to validate it against the provided Pydantic model."""
-        messages = self.build_messages(file_text)
-        attempt = 0
-        last_exception = None # store the last exception if all retries fail
-        while attempt <= max_tries:
-            attempt += 1
-        # using structured outputs to ensure json #todo this is from openai api, make sure correct
+    def _make_client(self, use_async=False):
+        if self.base_url:
+            cls = AsyncOpenAI if use_async else OpenAI
+            return cls(base_url=self.base_url, api_key=self.api_key, max_retries=0, timeout=self.timeout)
+        cls = AsyncAzureOpenAI if use_async else AzureOpenAI
+        return cls(azure_endpoint=self.azure_endpoint, api_version=self.api_version, api_key=self.api_key, # api key from config file
+                   max_retries=0, timeout=self.timeout)
+
+    # build_messages: same system prompt + filing as the other clients (BaseLLMClient)
+
+    def _body(self, file_text, entry_model) -> dict:
+        return {"model": self.model_name, "messages": self.build_messages(file_text), "response_format": response_format(entry_model)}
+
+    def _parse(self, completion: dict, entry_model) -> dict:
+        """completion as a dict (sdk object .model_dump() or a batch output line's body)"""
+        choice = completion["choices"][0]
+        if choice["message"].get("refusal"):
+            raise ValueError(f"refused: {choice['message']['refusal']}")
+        content = (choice["message"].get("content") or "").rpartition("</think>")[2] # reasoning models served elsewhere
+        return self._validate_response(content.strip(), entry_model)
+
+    def _backoff(self, error: Exception, n: int) -> float:
+        """Seconds to pause everyone: the server's retry-after if it sent one, else 2^n + jitter"""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            try:
+                return float(headers[header]) * scale
+            except (KeyError, TypeError, ValueError):
+                continue
+        return min(60, 2 ** n + random.random())
+
+    def _pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        print(f"OpenAI backoff: pausing requests {seconds:.1f}s")
+
+    def extract_and_validate(self, file_text, entry_model=FormGEntry, max_tries=1) -> dict:
+        """Extracts data from the given file text using the LLM. Uses Structured Outputs to validate it against the provided Pydantic model."""
+        tries = backoffs = 0
+        while True:
+            time.sleep(max(0.0, self.paused_until - time.monotonic()))
+            try:
+                completion = self.client.chat.completions.create(**self._body(file_text, entry_model))
+            except RETRYABLE as e:
+                backoffs += 1
+                if backoffs > MAX_BACKOFFS:
+                    raise
+                self._pause(self._backoff(e, backoffs))
+                continue
+            try:
+                return self._parse(completion.model_dump(), entry_model)
+            except (json.JSONDecodeError, ValidationError, ValueError) as e:
+                logging.error(f"Error during LLM extraction: {e}")
+                tries += 1
+                if tries > max_tries:
+                    raise
+                print(f"Retrying extraction due to validation error ({tries}/{max_tries})...")
+
+    async def _aextract(self, aclient, semaphore: asyncio.Semaphore, file_text, entry_model, max_tries) -> dict:
+        tries = backoffs = 0
+        while True:
+            while time.monotonic() < self.paused_until: # wait out a shared pause without holding a slot
+                await asyncio.sleep(self.paused_until - time.monotonic())
+            async with semaphore:
+                try:
+                    completion = await aclient.chat.completions.create(**self._body(file_text, entry_model))
+                except RETRYABLE as e:
+                    backoffs += 1
+                    if backoffs > MAX_BACKOFFS:
+                        raise
+                    self._pause(self._backoff(e, backoffs))
+                    continue
             try:
-                response = self.client.responses.parse(
-                    model = self.model_name,
-                    input = messages,
-                    text_format = FormGEntry
-                )
-                llm_response = response.output_parsed.dict()
-                return llm_response
-
-            except (ValidationError, ValueError) as e:
+                return self._parse(completion.model_dump(), entry_model)
+            except (json.JSONDecodeError, ValidationError, ValueError) as e:
                 logging.error(f"Error during LLM extraction: {e}")
-                traceback.print_exc() # print traceback
-                if attempt <= max_tries:
-                    print("Retrying extraction due to validation error...")
-                    time.sleep(1)  # brief pause before retrying
-                    return self.extract_and_validate(file_text, entry_model, max_tries=1)
-                else:
-                    last_exception = e
-                    raise e
\ No newline at end of file
+                tries += 1
+                if tries > max_tries:
+                    raise
+                print(f"Retrying extraction due to validation error ({tries}/{max_tries})...")
+
+    async def _abatch(self, file_texts: List[str], entry_model, max_tries) -> List[Union[dict, Exception]]:
+        aclient = self._make_client(use_async=True) # bound to this event loop
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            return await asyncio.gather(*(self._aextract(aclient, semaphore, t, entry_model, max_tries) for t in file_texts),
+                                        return_exceptions=True)
+        finally:
+            await aclient.close()
+
+    def extract_and_validate_batch(self, file_texts: List[str], entry_model=FormGEntry, max_tries=1) -> List[Union[dict, Exception]]:
+        if not file_texts:
+            return []
+        if self.batch_job:
+            results = self.run_batch_job({str(i): t for i, t in enumerate(file_texts)}, entry_model, max_tries=max_tries)
+            return [results[str(i)] for i in range(len(file_texts))]
+        return asyncio.run(self._abatch(file_texts, entry_model, max_tries))
+
+    ### Batch API ###
+    def _batch_state(self) -> Dict:
+        path = os.path.join(self.batch_dir, "batches.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _save_batch_state(self, state: Dict):
+        os.makedirs(self.batch_dir, exist_ok=True)
+        path = os.path.join(self.batch_dir, "batches.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def write_batch_jsonl(self, items: Dict[str, str], entry_model, path: str) -> str:
+        """One request line per filing, custom_id = accession"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for custom_id, file_text in items.items():
+                f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT,
+                                    "body": self._body(file_text, entry_model)}) + "\n")
+        return path
+
+    def submit_batch_job(self, items: Dict[str, str], entry_model=FormGEntry) -> str:
+        """Batch id for these filings: a job already submitted for the same texts + model is reused (resume)"""
+        digest = hashlib.sha1(self.model_name.encode("utf-8"))
+        for custom_id in sorted(items):
+            digest.update(custom_id.encode("utf-8") + hashlib.sha1(items[custom_id].encode("utf-8")).digest())
+        key = digest.hexdigest()[:16]
+        state = self._batch_state()
+        job = state.get(key)
+        if job is not None and job.get("status") not in BATCH_TERMINAL[1:]:
+            print(f"Resuming batch {job['batch_id']} ({len(items)} filings)")
+            return job["batch_id"]
+
+        path = self.write_batch_jsonl(items, entry_model, os.path.join(self.batch_dir, f"{key}.jsonl"))
+        with open(path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+        state[key] = {"batch_id": batch.id, "jsonl": path, "n": len(items), "submitted": time.time(), "status": batch.status}
+        self._save_batch_state(state)
+        print(f"Submitted batch {batch.id}: {len(items)} filings ({path})")
+        return batch.id
+
+    def wait_batch_job(self, batch_id: str, poll_seconds: Optional[float] = None):
+        poll_seconds = self.poll_seconds if poll_seconds is None else poll_seconds
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            print(f"Batch {batch_id}: {batch.status}" + (f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""))
+            if batch.status in BATCH_TERMINAL:
+                return batch
+            time.sleep(poll_seconds)
+
+    def collect_batch_job(self, batch, entry_model=FormGEntry) -> Dict[str, Union[dict, Exception]]:
+        """custom_id -> validated dict, or the exception for that request"""
+        results: Dict[str, Union[dict, Exception]] = {}
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines += self.client.files.content(file_id).text.splitlines()
+        for line in lines:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            try:
+                if row.get("error") or response.get("status_code") != 200:
+                    raise ValueError(f"batch request failed: {row.get('error') or response.get('body')}")
+                results[row["custom_id"]] = self._parse(response["body"], entry_model)
+            except (json.JSONDecodeError, ValidationError, ValueError, KeyError) as e:
+                results[row["custom_id"]] = e
+        return results
+
+    def run_batch_job(self, items: Dict[str, str], entry_model=FormGEntry, poll_seconds: Optional[float] = None,
+                      max_tries=1) -> Dict[str, Union[dict, Exception]]:
+        """{accession: text} -> {accession: validated dict or exception}, through the Batch API.
+        The job is the first try: rows that came back bad or errored are re-sent up to max_tries more times through
+        the async path (extract_and_validate_batch without batch_job), not resubmitted as another 24h job"""
+        if not items:
+            return {}
+        batch_id = self.submit_batch_job(items, entry_model)
+        batch = self.wait_batch_job(batch_id, poll_seconds)
+        state = self._batch_state()
+        for job in state.values():
+            if job["batch_id"] == batch_id:
+                job["status"] = batch.status
+        self._save_batch_state(state)
+        if batch.status != "completed":
+            error = RuntimeError(f"batch {batch_id} {batch.status}")
+            return {custom_id: error for custom_id in items}
+        results = self.collect_batch_job(batch, entry_model)
+        missing = RuntimeError(f"missing from batch {batch_id} output")
+        results = {custom_id: results.get(custom_id, missing) for custom_id in items}
+        retry = [custom_id for custom_id, r in results.items() if isinstance(r, Exception)]
+        if retry and max_tries > 0:
+            print(f"Batch {batch_id}: retrying {len(retry)} failed rows")
+            retried = asyncio.run(self._abatch([items[custom_id] for custom_id in retry], entry_model, max_tries - 1))
+            results.update(zip(retry, retried))
+        return results
@@ -0,0 +1,229 @@
+import argparse
+import itertools
+import json
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from parsers.g13_rules import extract_cover_page
+
+'''
+Tiny OpenAI-compatible server for tests and benchmarks of VllmLLMClient, no model or GPU needed (stdlib only).
+- POST /v1/chat/completions, /v1/completions: answers after --latency seconds with a FormGEntry json built by the
+  cover page rules from the prompt (placeholders for fields they miss), wrapped in <think></think> like Qwen3
+- GET /v1/models, /health
+- at most --max_running requests are served at once, like a server with a fixed batch; the rest get 429 with a
+  retry-after-ms header (that's what exercises the client's backpressure)
+- Batch API for OpenAILLMClient(batch_job=True): POST /v1/files (multipart upload), GET /v1/files/{id}/content,
+  POST /v1/batches (runs the JSONL requests in a background thread), GET /v1/batches/{id}
+python -m llm.stub_llm_server --port 8000 --latency 0.5 --max_running 16
+'''
+
+PLACEHOLDER = {"name_filer": "Unknown Filer", "report_date": "2024/12/31", "issuer": "Unknown Issuer", "cusip": "000000000",
+               "shares_owned": 0, "percent_of_class": 0.0, "voting_sole": 0, "voting_shared": 0,
+               "shares_dispo_sole": 0, "shares_dispo_shared": 0}
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, model: str = "stub", latency: float = 0.05, max_running: int = 64,
+                 thinking: bool = True, retry_after_ms: int = 50):
+        """port=0: pick a free port (self.base_url). thinking=False: bare json, like a non-reasoning api model"""
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.model = model
+        self.latency = latency
+        self.max_running = max_running
+        self.thinking = thinking
+        self.retry_after_ms = retry_after_ms
+        self.running = 0
+        self.stats = {"requests": 0, "rejected": 0, "max_running_seen": 0, "batches": 0}
+        self.files = {} # id -> (filename, purpose, bytes)
+        self.batches = {} # id -> batch object
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "StubLLMServer":
+        """Serve in a background thread (tests, benchmarks)"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def answer(self, prompt: str) -> str:
+        fields, _, _ = extract_cover_page(prompt)
+        return ("<think>\nstub\n</think>\n\n" if self.thinking else "") + json.dumps({**PLACEHOLDER, **fields})
+
+    def completion(self, body: dict, chat: bool = True) -> dict:
+        if chat:
+            choice = {"index": 0, "message": {"role": "assistant", "content": self.answer(body["messages"][-1]["content"])},
+                      "finish_reason": "stop"}
+        else:
+            choice = {"index": 0, "text": self.answer(body["prompt"]), "finish_reason": "stop"}
+        return {"id": f"cmpl-{next(self.ids)}", "object": "chat.completion" if chat else "text_completion",
+                "created": int(time.time()), "model": self.model, "choices": [choice]}
+
+    def add_file(self, filename: str, purpose: str, data: bytes) -> dict:
+        file_id = f"file-{next(self.ids)}"
+        with self.lock:
+            self.files[file_id] = (filename, purpose, data)
+        return self.file_object(file_id)
+
+    def file_object(self, file_id: str) -> dict:
+        filename, purpose, data = self.files[file_id]
+        return {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()), "filename": filename,
+                "purpose": purpose, "status": "processed"}
+
+    def run_batch(self, batch_id: str):
+        """Every request line of the input file, in order; one output line each (errors go to the error file)"""
+        batch = self.batches[batch_id]
+        batch["status"] = "in_progress"
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]][2].decode("utf-8").splitlines() if line.strip()]
+        batch["request_counts"]["total"] = len(lines)
+        out, errors = [], []
+        for line in lines:
+            time.sleep(self.latency)
+            row = {"id": f"batch_req_{next(self.ids)}", "custom_id": line["custom_id"], "error": None}
+            if line["body"].get("model") != self.model:
+                row["response"] = {"status_code": 404, "request_id": "", "body": {"error": {"message": "model does not exist"}}}
+                errors.append(row)
+                batch["request_counts"]["failed"] += 1
+            else:
+                row["response"] = {"status_code": 200, "request_id": "", "body": self.completion(line["body"])}
+                out.append(row)
+                batch["request_counts"]["completed"] += 1
+        for key, rows in (("output_file_id", out), ("error_file_id", errors)):
+            if rows:
+                batch[key] = self.add_file(f"{batch_id}_{key}.jsonl", "batch_output",
+                                           "".join(json.dumps(r) + "\n" for r in rows).encode("utf-8"))["id"]
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubLLMServer
+
+    def log_message(self, format, *args):
+        pass # quiet
+
+    def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+        raw = json.dumps(body).encode("utf-8")
+        self._send_raw(status, raw, "application/json", headers)
+
+    def _send_raw(self, status: int, raw: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        srv = self.server
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/") # ['', 'v1', 'files', id, 'content']
+        if path in ("/health", "/ping"):
+            self._send(200, {})
+        elif path == "/v1/models":
+            self._send(200, {"object": "list", "data": [{"id": srv.model, "object": "model"}]})
+        elif len(parts) == 5 and parts[2] == "files" and parts[4] == "content" and parts[3] in srv.files:
+            self._send_raw(200, srv.files[parts[3]][2], "application/octet-stream")
+        elif len(parts) == 4 and parts[2] == "files" and parts[3] in srv.files:
+            self._send(200, srv.file_object(parts[3]))
+        elif len(parts) == 4 and parts[2] == "batches" and parts[3] in srv.batches:
+            self._send(200, srv.batches[parts[3]])
+        else:
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+
+    def _upload(self, raw: bytes):
+        """multipart/form-data with a file part and a purpose field"""
+        message = BytesParser().parsebytes(b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + raw)
+        filename, purpose, data = "upload.jsonl", "batch", b""
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                filename = part.get_filename() or filename
+                data = part.get_payload(decode=True)
+            elif name == "purpose":
+                purpose = part.get_payload(decode=True).decode("utf-8")
+        self._send(200, self.server.add_file(filename, purpose, data))
+
+    def _create_batch(self, body: dict):
+        srv = self.server
+        if body.get("input_file_id") not in srv.files:
+            self._send(404, {"error": {"message": f"no file {body.get('input_file_id')}"}})
+            return
+        batch_id = f"batch_{next(srv.ids)}"
+        srv.batches[batch_id] = {"id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                                 "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+                                 "status": "validating", "created_at": int(time.time()), "output_file_id": None,
+                                 "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        with srv.lock:
+            srv.stats["batches"] += 1
+        threading.Thread(target=srv.run_batch, args=(batch_id,), daemon=True).start()
+        self._send(200, srv.batches[batch_id])
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/files":
+            self._upload(raw)
+            return
+        body = json.loads(raw or b"{}")
+        if path == "/v1/batches":
+            self._create_batch(body)
+            return
+        if path not in ("/v1/chat/completions", "/v1/completions"):
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+            return
+        srv = self.server
+        with srv.lock:
+            srv.stats["requests"] += 1
+        if body.get("model") != srv.model:
+            self._send(404, {"error": {"message": f"model {body.get('model')} does not exist"}})
+            return
+
+        with srv.lock:
+            if srv.running >= srv.max_running:
+                srv.stats["rejected"] += 1
+                full = True
+            else:
+                full = False
+                srv.running += 1
+                srv.stats["max_running_seen"] = max(srv.stats["max_running_seen"], srv.running)
+        if full:
+            self._send(429, {"error": {"message": "too many requests", "type": "rate_limit_exceeded"}},
+                       headers={"retry-after-ms": str(srv.retry_after_ms)})
+            return
+        try:
+            time.sleep(srv.latency) # one "forward pass" for the whole batch: latency doesn't grow with running requests
+            self._send(200, srv.completion(body, chat=path == "/v1/chat/completions"))
+        finally:
+            with srv.lock:
+                srv.running -= 1
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server (run from backend/: python -m llm.stub_llm_server)")
+    parse.add_argument("--port", type=int, default=8000)
+    parse.add_argument("--model", type=str, default="stub")
+    parse.add_argument("--latency", type=float, default=0.5, help="Seconds per request")
+    parse.add_argument("--max_running", type=int, default=64, help="Requests served at once, more get 429")
+    parse.add_argument("--no_thinking", action="store_true", help="Answer with bare json (no <think> block)")
+    args = parse.parse_args()
+    server = StubLLMServer(args.port, args.model, args.latency, args.max_running, thinking=not args.no_thinking)
+    print(f"Stub LLM server on {server.base_url} (model {args.model})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+import requests
+from requests.adapters import HTTPAdapter
+from pydantic import ValidationError
+import json
+from edgar_client import RateLimiter
+from llm.base_llm_client import BaseLLMClient
+
+'''
+Client for an OpenAI-compatible server (vLLM: vllm serve Qwen/Qwen3-14B --port 8000, or the stub in llm/stub_llm_server.py).
+The model stays in the server, which batches whatever requests are in flight (continuous batching), so this client's job
+is to keep enough 13G requests in flight:
+- extract_and_validate_batch sends a whole parse_all window concurrently, max_in_flight at a time
+- one pooled requests.Session (keep-alive, pool size = max_in_flight)
+- backpressure: a RateLimiter slot per request caps in-flight requests across every thread using the client;
+  429/503 (server queue full) pause all callers and halve the rate, like the SEC limiter does
+- timeouts: (connect, read) per request; a read timeout counts as a failed attempt
+'''
+
+DEFAULT_BASE_URL = "http://localhost:8000/v1"
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class VllmLLMClient(BaseLLMClient):
+    concurrent = True # thread safe, no need to serialize calls (scheduler._SerializedLLM)
+
+    def __init__(self, model_name, base_url=DEFAULT_BASE_URL, api_key=None, max_in_flight=32,
+                 timeout: Tuple[float, float] = (5, 600), max_attempts=4, debug=False, debug_log_path="llm_debug.log"):
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max_in_flight
+        self.batch_size = max_in_flight # Form13GParser.parse_all sends batch_size * 4 filings per extract_and_validate_batch
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.max_new_tokens = 32768
+        self.enable_thinking = True
+        self.temperature = 0.7
+        self.debug = debug
+        self.debug_log_path = debug_log_path
+        self.limiter = RateLimiter(max_rate=1000, min_rate=1, max_in_flight=max_in_flight) # no rate cap, just in-flight + backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_key:
+            self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def _post(self, path: str, body: dict) -> dict:
+        url = f"{self.base_url}{path}"
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self.limiter.slot():
+                    r = self.session.post(url, json=body, timeout=self.timeout)
+            except requests.RequestException as e: # connection refused/reset, timeout
+                if attempt == self.max_attempts:
+                    raise e
+                print(f"LLM server request failed ({e}), retrying")
+                self.limiter.slow_down(attempt)
+                continue
+
+            if r.status_code == 200:
+                self.limiter.recover()
+                return r.json()
+            if r.status_code in RETRY_STATUS: # queue full / overloaded
+                if attempt == self.max_attempts:
+                    r.raise_for_status()
+                self.limiter.slow_down(attempt)
+                continue
+            r.raise_for_status() # 400 (prompt too long, bad model name...): no retry
+        raise RuntimeError(f"Exceeded max attempts posting to {url}")
+
+    def extract_data_llm(self, file_text) -> str:
+        body = {
+            "model": self.model_name,
+            "messages": self.build_messages(file_text),
+            "temperature": self.temperature,
+            "max_tokens": self.max_new_tokens,
+            "chat_template_kwargs": {"enable_thinking": self.enable_thinking}, # vLLM extension, ignored elsewhere
+        }
+        message = self._post("/chat/completions", body)["choices"][0]["message"]
+        content = message.get("content") or ""
+        # thinking is either in content before </think>, or split out by the server's reasoning parser
+        thinking_content, _, llm_response = content.rpartition("</think>")
+        thinking_content = (thinking_content.replace("<think>", "") or message.get("reasoning_content") or "").strip("\n")
+        llm_response = llm_response.strip("\n")
+        if self.debug:
+            try:
+                with open(self.debug_log_path, "a", encoding="utf-8") as fh:
+                    fh.write(f"=== {self.base_url} {self.model_name} ===\n")
+                    fh.write("THINKING_CONTENT:\n" + thinking_content + "\n\n")
+                    fh.write("LLM_RAW_RESPONSE:\n" + llm_response + "\n\n---\n\n")
+            except Exception:
+                pass
+        return llm_response
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1) -> dict:
+        last_exception = None
+        for attempt in range(1, max_tries + 2):
+            try:
+                return self._validate_response(self.extract_data_llm(file_text), entry_model)
+            except (json.JSONDecodeError, ValidationError, ValueError) as e:
+                print(f"LLM extraction/validation error (attempt {attempt}/{max_tries+1}): {e}")
+                last_exception = e
+        raise last_exception
+
+    def extract_and_validate_batch(self, file_texts: List[str], entry_model, max_tries=1) -> List[Union[dict, Exception]]:
+        """All texts concurrently (at most max_in_flight requests at once), results in input order"""
+        def one(file_text):
+            try:
+                return self.extract_and_validate(file_text, entry_model, max_tries=max_tries)
+            except Exception as e:
+                return e
+        if not file_texts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(file_texts))) as pool:
+            return list(pool.map(one, file_texts))
+
+    def health(self, timeout: Optional[float] = 5) -> bool:
+        """Server up and serving model_name?"""
+        try:
+            r = self.session.get(f"{self.base_url}/models", timeout=timeout)
+            return r.status_code == 200 and any(m.get("id") == self.model_name for m in r.json().get("data", []))
+        except requests.RequestException:
+            return False
+
+    def close(self):
+        self.session.close()
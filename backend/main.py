@@ -1,54 +1,50 @@
-from itertools import chain
 import os
-from typing import List
-from edgar_client import EdgarClient
-from parsers.f13_parser import Form13FParser
-from parsers.g13_parser import Form13GParser
-from llm.base_llm_client import BaseLLMClient
+from http_cache import HttpCache
+from scheduler import CrawlScheduler, read_cik_file
 from llm.helpers import get_llm_client
-from db.savers import save_13f_to_db, save_13g_to_db, save_to_csv
 import argparse
 import json
 
 if __name__ == "__main__":
     """
     Example run: cd backend; CUDA_VISIBLE_DEVICES=0 python main.py --form_type all --dest both 
+    Many funds: python main.py --cik_file ciks.txt --form_type 13f --sync --max_funds 8
+    Keep the 13G model loaded between runs: python main.py --form_type 13g --llm_daemon
     """
 
     parse = argparse.ArgumentParser(description="EDGAR 13F and 13G Data Extractor")
-    parse.add_argument("--cik", type=str, default="CIK0000763212", help="Full CIK with leading zeros, e.g. CIK0000763212")
+    parse.add_argument("--cik", type=str, nargs="+", default=["CIK0000763212"], help="Full CIK(s) with leading zeros, e.g. CIK0000763212")
+    parse.add_argument("--cik_file", type=str, help="File with one CIK per line, crawled instead of --cik")
     parse.add_argument("--form_type", type=str, choices=["13f", "13g", "all"], required=True, help="Form type to extract: 13f, 13g, all")
     parse.add_argument("--limit", type=int, required=False, help="Max number of filings to process per form type, defaults to None")
     parse.add_argument("--dest", type=str, choices=["csv", "db", "both"], default="csv", help="Destination for parsed data: csv (default), db, or both")
     parse.add_argument("--config_file", type=str, default="config_hf.json", help="Name of config json file in config folder, for 13G LLM processing")
     parse.add_argument("--debug", action="store_true", help="Enable debug logging for LLM client")
+    parse.add_argument("--llm_daemon", action="store_true", help="Use (or start) the long-lived LLM daemon instead of loading the model in this process, same as \"daemon\": true in the config")
+    parse.add_argument("--sync", action="store_true", help="Follow full filing history (filings.files shards) and only process filings newer than the last synced run")
+    parse.add_argument("--http_cache_mb", type=int, default=2048, help="Max size of the on-disk EDGAR response cache (cache/http) in MB, 0 to disable")
+    parse.add_argument("--max_funds", type=int, default=4, help="Funds crawled concurrently")
+    parse.add_argument("--max_filings", type=int, default=8, help="Max in-flight SEC requests across all funds")
+    parse.add_argument("--workers", type=int, default=1, help="Processes for 13F xml parsing (per fund), 1 = parse inline")
     # todo clean up what's stored in debug log
     args = parse.parse_args()
     
     user_agent = "My Name myname@gmail.com"
-    config = json.load(open(os.path.join("config", args.config_file)))
-    client = EdgarClient(args.cik, user_agent=user_agent)
-    submissions = client.get_submissions_feed()
-    
-    recent = submissions['filings']['recent']
-    accessions_13f = [a for a, f in zip(recent['accessionNumber'], recent['form']) if f == "13F-HR"]
-    accessions_13g = [a for a, f in zip(recent['accessionNumber'], recent['form']) if f.startswith("SC 13G")]
+    ciks = read_cik_file(args.cik_file) if args.cik_file else args.cik
+    http_cache = HttpCache(max_bytes=args.http_cache_mb * 1024**2) if args.http_cache_mb > 0 else None
+
+    def llm_factory():
+        config = json.load(open(os.path.join("config", args.config_file)))
+        if args.llm_daemon:
+            config["daemon"] = True
+        return get_llm_client(config, debug=args.debug)
+
+    scheduler = CrawlScheduler(ciks, user_agent, form_type=args.form_type, dest=args.dest, limit=args.limit,
+                               sync=args.sync, max_funds=args.max_funds, max_filings=args.max_filings,
+                               http_cache=http_cache, llm_factory=llm_factory, parse_workers=args.workers)
+    status = scheduler.run()
+    failed = [cik for cik, s in status.items() if s["state"] == "failed"]
+    print(f"Crawled {len(status)} funds, {len(failed)} failed{': ' + ', '.join(failed) if failed else ''}")
 
-    if args.form_type == "13f" or args.form_type == "all":
-        print("Processing 13F filings...")
-        f13_parser = Form13FParser(client)
-        f13_data: List[dict] = f13_parser.parse_all(accessions_13f, limit=args.limit)
-        if args.dest in ("csv", "both"):
-            save_to_csv(f13_data, "data/extracted_13f.csv")
-        if args.dest in ("db", "both"):
-            save_13f_to_db(f13_data)
-        
-    if args.form_type == "13g" or args.form_type == "all":
-        print("Processing 13G filings...")
-        llm_client = get_llm_client(config, debug=args.debug)
-        g13_parser = Form13GParser(client, llm_client)
-        g13_data: List[dict] = g13_parser.parse_all(accessions_13g, limit=args.limit)
-        if args.dest in ("csv", "both"):
-            save_to_csv(g13_data, "data/extracted_13g.csv")
-        if args.dest in ("db", "both"):
-            save_13g_to_db(g13_data)
+    if http_cache is not None:
+        print(http_cache.summary())
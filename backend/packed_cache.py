@@ -0,0 +1,272 @@
+import argparse
+import json
+import mmap
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple, Optional
+from cache_manager import CacheEntry
+
+'''
+Packed on-disk store for parser caches (used by the f13 parse cache), instead of one json file per accession.
+
+cache_dir/
+  seg-<stamp>-<pid>.dat  records back to back: zlib(json(rows)), no framing -- offsets live in the index
+  seg-<stamp>-<pid>.idx  one json line per record: [key, version, offset, length, cache_time] (version null = deleted)
+Every process appends to its own segment pair, so concurrent writers never interleave. On open all .idx files are read
+into memory (newest record per key wins); version checks only look at that index, and bodies are read through mmap.
+Superseded/outdated records stay in their segment until compact() rewrites the live ones: `python packed_cache.py compact`,
+or automatically from CacheManager.flush once dead bytes pass COMPACT_MIN_DEAD_BYTES / COMPACT_DEAD_RATIO.
+'''
+
+
+COMPACT_MIN_DEAD_BYTES = 64 * 1024**2
+COMPACT_DEAD_RATIO = 0.3
+
+
+def _other_live_writer(segment: str) -> bool:
+    """seg-<stamp>-<pid>.dat of another process that is still running (it may still append to it)"""
+    try:
+        pid = int(segment.rsplit("-", 1)[1].split(".")[0])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IndexEntry(NamedTuple):
+    version: int
+    segment: str
+    offset: int
+    length: int
+    cache_time: float
+
+
+class PackedCache:
+    _shared: Dict[str, "PackedCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index: Dict[str, IndexEntry] = {}
+        self.maps: Dict[str, mmap.mmap] = {}
+        self.writer = None # (segment name, data fh, idx fh), opened on first put
+        for idx_path in sorted(self.dir.glob("seg-*.idx")):
+            self._load_index(idx_path)
+
+    @classmethod
+    def open(cls, cache_dir: str) -> "PackedCache":
+        """One instance per directory and process, shared by every parser/thread"""
+        key = str(Path(cache_dir).resolve())
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(cache_dir)
+            return cls._shared[key]
+
+    def _load_index(self, idx_path: Path) -> None:
+        segment = idx_path.with_suffix(".dat").name
+        with idx_path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    key, version, offset, length, cache_time = json.loads(line)
+                except ValueError:
+                    continue # torn last line from a killed writer
+                old = self.index.get(key)
+                if version is None: # tombstone from delete()
+                    if old is not None and cache_time >= old.cache_time:
+                        del self.index[key]
+                elif old is None or cache_time >= old.cache_time:
+                    self.index[key] = IndexEntry(version, segment, offset, length, cache_time)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def version(self, key: str) -> Optional[int]:
+        """Stored version for key, without touching the body"""
+        entry = self.index.get(key)
+        return entry.version if entry else None
+
+    def get(self, key: str, min_version: int = 0):
+        """Decoded value, or None if missing or older than min_version"""
+        entry = self.index.get(key)
+        if entry is None or entry.version < min_version:
+            return None
+        with self.lock:
+            mm = self._map(entry.segment, entry.offset + entry.length)
+            if mm is None:
+                return None
+            blob = mm[entry.offset:entry.offset + entry.length]
+        return json.loads(zlib.decompress(blob))
+
+    def _map(self, segment: str, needed: int) -> Optional[mmap.mmap]:
+        """mmap of a segment covering at least `needed` bytes (our own segment grows, so remap when it has)"""
+        mm = self.maps.get(segment)
+        if mm is not None and len(mm) >= needed:
+            return mm
+        if mm is not None:
+            mm.close()
+        if self.writer is not None and self.writer[0] == segment:
+            self.writer[1].flush()
+        try:
+            with self.dir.joinpath(segment).open("rb") as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError): # missing or empty segment
+            self.maps.pop(segment, None)
+            return None
+        self.maps[segment] = mm
+        return mm if len(mm) >= needed else None
+
+    def _new_segment_name(self) -> str:
+        stamp = int(time.time() * 1000)
+        while self.dir.joinpath(f"seg-{stamp}-{os.getpid()}.dat").exists(): # e.g. compact() right after a put
+            stamp += 1
+        return f"seg-{stamp}-{os.getpid()}.dat"
+
+    def _writer(self):
+        """(segment name, data fh, idx fh) of this process' segment, opened on first write. Call with the lock held"""
+        if self.writer is None:
+            name = self._new_segment_name()
+            self.writer = (name, self.dir.joinpath(name).open("ab"), self.dir.joinpath(name).with_suffix(".idx").open("a", encoding="utf-8"))
+        return self.writer
+
+    def put(self, key: str, value, version: int) -> None:
+        blob = zlib.compress(json.dumps(value).encode("utf-8"), 6)
+        cache_time = time.time()
+        with self.lock:
+            segment, data_fh, idx_fh = self._writer()
+            offset = data_fh.tell()
+            data_fh.write(blob)
+            data_fh.flush() # body before index line, so a reader never sees an index entry without its bytes
+            idx_fh.write(json.dumps([key, version, offset, len(blob), cache_time]) + "\n")
+            idx_fh.flush()
+            self.index[key] = IndexEntry(version, segment, offset, len(blob), cache_time)
+
+    def delete(self, keys) -> int:
+        """Drop keys by appending tombstones; the bytes are reclaimed by compact()"""
+        n = 0
+        with self.lock:
+            for key in keys:
+                if self.index.pop(key, None) is None:
+                    continue
+                self._writer()[2].write(json.dumps([key, None, 0, 0, time.time()]) + "\n")
+                n += 1
+            if self.writer is not None:
+                self.writer[2].flush()
+        return n
+
+    def entries(self) -> Iterator[CacheEntry]:
+        """For cache_manager: size, age and version of every live record"""
+        for key, e in list(self.index.items()):
+            yield CacheEntry(key, e.length, e.cache_time, {"parser_version": e.version})
+
+    def _close_files(self) -> None:
+        """Call with the lock held"""
+        for mm in self.maps.values():
+            mm.close()
+        self.maps.clear()
+        if self.writer is not None:
+            self.writer[1].close()
+            self.writer[2].close()
+            self.writer = None
+
+    def close(self) -> None:
+        with self.lock:
+            self._close_files()
+
+    def stats(self) -> dict:
+        segments = list(self.dir.glob("seg-*.dat"))
+        live = sum(e.length for e in self.index.values())
+        on_disk = sum(p.stat().st_size for p in segments)
+        return {"entries": len(self.index), "segments": len(segments), "live_bytes": live, "disk_bytes": on_disk,
+                "dead_bytes": on_disk - live}
+
+    def compact_if_needed(self, min_dead_bytes: int = COMPACT_MIN_DEAD_BYTES, dead_ratio: float = COMPACT_DEAD_RATIO) -> dict:
+        """compact() once deleted/superseded records take more than min_dead_bytes and dead_ratio of the disk.
+        Called by CacheManager.flush, so evictions actually free disk space. {} = nothing done"""
+        stats = self.stats()
+        if stats["dead_bytes"] < min_dead_bytes or stats["dead_bytes"] < dead_ratio * stats["disk_bytes"]:
+            return {}
+        return self.compact()
+
+    def compact(self, min_version: int = 0) -> dict:
+        """Rewrite live records (version >= min_version) into one new segment and delete the old segments.
+        Segments still being appended to by another live process are left alone (their records stay where they are),
+        so this is safe to run during a crawl; other processes just miss on records they indexed before the rewrite."""
+        with self.lock:
+            self._close_files()
+            old_segments = {p.name for p in self.dir.glob("seg-*.dat") if not _other_live_writer(p.name)}
+            name = self._new_segment_name()
+            tmp_dat = self.dir.joinpath(name + ".tmp")
+            tmp_idx = self.dir.joinpath(name).with_suffix(".idx.tmp")
+            new_index: Dict[str, IndexEntry] = {}
+            dropped = 0
+            with tmp_dat.open("wb") as data_fh, tmp_idx.open("w", encoding="utf-8") as idx_fh:
+                for key, entry in sorted(self.index.items(), key=lambda kv: (kv[1].segment, kv[1].offset)): # sequential reads
+                    if entry.segment not in old_segments:
+                        new_index[key] = entry # another process' open segment
+                        continue
+                    mm = self._map(entry.segment, entry.offset + entry.length)
+                    if entry.version < min_version or mm is None:
+                        dropped += 1
+                        continue
+                    offset = data_fh.tell()
+                    data_fh.write(mm[entry.offset:entry.offset + entry.length])
+                    idx_fh.write(json.dumps([key, entry.version, offset, entry.length, entry.cache_time]) + "\n")
+                    new_index[key] = IndexEntry(entry.version, name, offset, entry.length, entry.cache_time)
+            self._close_files()
+            # data first, then the index that points into it; old segments go last
+            tmp_dat.replace(self.dir.joinpath(name))
+            tmp_idx.replace(self.dir.joinpath(name).with_suffix(".idx"))
+            for seg in old_segments:
+                self.dir.joinpath(seg).unlink(missing_ok=True)
+                self.dir.joinpath(seg).with_suffix(".idx").unlink(missing_ok=True)
+            self.index = new_index
+        print(f"Compacted {self.dir}: kept {len(new_index)}, dropped {dropped}, removed {len(old_segments)} segments")
+        return {"kept": len(new_index), "dropped": dropped, "segments_removed": len(old_segments)}
+
+    def import_json_dir(self, json_dir: str, remove: bool = False) -> int:
+        """Pull legacy one-file-per-key caches ({"cache_time", "parser_version", "rows"}) into the pack"""
+        n = 0
+        for path in Path(json_dir).glob("*.json"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self.put(path.stem, data["rows"], data.get("parser_version") or 0)
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            n += 1
+            if remove:
+                path.unlink(missing_ok=True)
+        return n
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="Inspect / compact a packed parse cache")
+    parse.add_argument("command", choices=["stats", "compact", "import"])
+    parse.add_argument("--dir", type=str, default="cache/f13/packed", help="Packed cache directory")
+    parse.add_argument("--min_version", type=int, default=0, help="compact: drop entries below this parser version")
+    parse.add_argument("--json_dir", type=str, default="cache/f13", help="import: folder of legacy per-accession json files")
+    parse.add_argument("--remove", action="store_true", help="import: delete the json files once packed")
+    args = parse.parse_args()
+
+    cache = PackedCache(args.dir)
+    if args.command == "import":
+        print(f"Imported {cache.import_json_dir(args.json_dir, remove=args.remove)} json files")
+    elif args.command == "compact":
+        print(cache.compact(min_version=args.min_version))
+    print(cache.stats())
+    cache.close()
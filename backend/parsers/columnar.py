@@ -0,0 +1,161 @@
+import csv
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+'''
+Columnar container for 13F holdings, an alternative to a list of per-row dicts.
+- per-filing constants (accession_number, report_date, cik, primary_doc_url) are stored once per filing,
+  rows just point at their filing through filing_idx
+- numbers are int64 numpy arrays (INT_NA = missing)
+- strings are dictionary encoded: int32 codes into a list of unique values
+'''
+
+INT_NA = np.iinfo(np.int64).min
+
+FILING_COLS = ["accession_number", "report_date", "cik", "primary_doc_url"]
+INT_COLS = ["value_dollar", "shares_owned", "voting_sole", "voting_shared", "voting_none"]
+STR_COLS = ["issuer", "class", "cusip", "figi", "share_type", "discretion"]
+# same column order as the row dicts / staging_13f table
+COLUMNS = ["accession_number", "report_date", "cik", "issuer", "class", "cusip", "figi", "value_dollar",
+           "shares_owned", "share_type", "discretion", "voting_sole", "voting_shared", "voting_none", "primary_doc_url"]
+
+
+def _to_int(v) -> int:
+    if v is None or v == "":
+        return INT_NA
+    return int(v)
+
+
+class HoldingsBatch:
+    def __init__(self, filings: List[Tuple[str, str, str, str]], filing_idx: np.ndarray,
+                 ints: Dict[str, np.ndarray], codes: Dict[str, np.ndarray], categories: Dict[str, List[Optional[str]]]):
+        self.filings = filings # one (accession_number, report_date, cik, primary_doc_url) per filing
+        self.filing_idx = filing_idx # row -> index into filings
+        self.ints = ints
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.filing_idx)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "HoldingsBatch":
+        builder = HoldingsBatchBuilder()
+        builder.add_rows(rows)
+        return builder.build()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory of the arrays + dictionaries"""
+        n = self.filing_idx.nbytes + sum(a.nbytes for a in self.ints.values()) + sum(a.nbytes for a in self.codes.values())
+        n += sum(len(s or "") for cats in self.categories.values() for s in cats)
+        n += sum(len(v) for f in self.filings for v in f)
+        return n
+
+    def column(self, name: str) -> np.ndarray:
+        """Decoded column: int64 array for numbers, object array for strings"""
+        if name in self.ints:
+            return self.ints[name]
+        if name in self.codes:
+            return np.asarray(self.categories[name], dtype=object)[self.codes[name]]
+        i = FILING_COLS.index(name)
+        return np.asarray([f[i] for f in self.filings], dtype=object)[self.filing_idx]
+
+    def accessions(self) -> List[str]:
+        return [f[0] for f in self.filings]
+
+    def iter_tuples(self, skip_accessions: Optional[set] = None) -> Iterator[tuple]:
+        """Rows as tuples in COLUMNS order (None for missing), decoded lazily one row at a time"""
+        ints = {k: v.tolist() for k, v in self.ints.items()}
+        codes = {k: v.tolist() for k, v in self.codes.items()}
+        for r, fi in enumerate(self.filing_idx.tolist()):
+            acc, report_date, cik, url = self.filings[fi]
+            if skip_accessions and acc in skip_accessions:
+                continue
+            def s(col):
+                return self.categories[col][codes[col][r]]
+            def i(col):
+                v = ints[col][r]
+                return None if v == INT_NA else v
+            yield (acc, report_date, cik, s("issuer"), s("class"), s("cusip"), s("figi"), i("value_dollar"),
+                   i("shares_owned"), s("share_type"), s("discretion"), i("voting_sole"), i("voting_shared"),
+                   i("voting_none"), url)
+
+    def to_rows(self) -> List[Dict]:
+        """Back to the list-of-dicts form (for the json cache / old callers)"""
+        return [dict(zip(COLUMNS, t)) for t in self.iter_tuples()]
+
+    def write_csv(self, fh, header: bool = True, skip_accessions: Optional[set] = None) -> int:
+        """Write straight from the columns to any object with .write (file, StringIO, psycopg COPY). Returns # rows"""
+        writer = csv.writer(fh, lineterminator="\n")
+        if header:
+            writer.writerow(COLUMNS)
+        n = 0
+        for t in self.iter_tuples(skip_accessions):
+            writer.writerow(t)
+            n += 1
+        return n
+
+    @classmethod
+    def concat(cls, batches: List["HoldingsBatch"]) -> "HoldingsBatch":
+        builder = HoldingsBatchBuilder()
+        for b in batches:
+            builder.add_batch(b)
+        return builder.build()
+
+
+class HoldingsBatchBuilder:
+    """Accumulates rows into growable typed buffers; build() turns them into numpy arrays without copying dicts around"""
+    def __init__(self):
+        self.filings: List[Tuple[str, str, str, str]] = []
+        self.filing_pos: Dict[Tuple[str, str, str, str], int] = {}
+        self.filing_idx = array("i")
+        self.ints = {c: array("q") for c in INT_COLS}
+        self.codes = {c: array("i") for c in STR_COLS}
+        self.categories: Dict[str, List[Optional[str]]] = {c: [] for c in STR_COLS}
+        self.cat_pos: Dict[str, Dict[Optional[str], int]] = {c: {} for c in STR_COLS}
+
+    def _code(self, col: str, value: Optional[str]) -> int:
+        pos = self.cat_pos[col]
+        code = pos.get(value)
+        if code is None:
+            code = pos[value] = len(self.categories[col])
+            self.categories[col].append(value)
+        return code
+
+    def _filing(self, key: Tuple[str, str, str, str]) -> int:
+        fi = self.filing_pos.get(key)
+        if fi is None:
+            fi = self.filing_pos[key] = len(self.filings)
+            self.filings.append(key)
+        return fi
+
+    def add_row(self, row: Dict) -> None:
+        self.filing_idx.append(self._filing(tuple(row[c] for c in FILING_COLS)))
+        for c in INT_COLS:
+            self.ints[c].append(_to_int(row.get(c)))
+        for c in STR_COLS:
+            self.codes[c].append(self._code(c, row.get(c)))
+
+    def add_rows(self, rows: Iterable[Dict]) -> None:
+        for row in rows:
+            self.add_row(row)
+
+    def add_batch(self, batch: HoldingsBatch) -> None:
+        remap = np.asarray([self._filing(f) for f in batch.filings], dtype=np.int32)
+        self.filing_idx.extend(remap[batch.filing_idx].tolist() if len(remap) else [])
+        for c in INT_COLS:
+            self.ints[c].extend(batch.ints[c].tolist())
+        for c in STR_COLS:
+            remap = np.asarray([self._code(c, v) for v in batch.categories[c]], dtype=np.int32)
+            self.codes[c].extend(remap[batch.codes[c]].tolist() if len(remap) else [])
+
+    def build(self) -> HoldingsBatch:
+        return HoldingsBatch(
+            filings=list(self.filings),
+            filing_idx=np.frombuffer(self.filing_idx, dtype=np.int32).copy(),
+            ints={c: np.frombuffer(a, dtype=np.int64).copy() for c, a in self.ints.items()},
+            codes={c: np.frombuffer(a, dtype=np.int32).copy() for c, a in self.codes.items()},
+            categories={c: list(v) for c, v in self.categories.items()},
+        )
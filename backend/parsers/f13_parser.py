@@ -1,110 +1,280 @@
-from itertools import chain
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
 import json
+import multiprocessing
 from pathlib import Path
-import time
 import traceback
 import xml.etree.ElementTree as ET
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from .base_parser import BaseParser
+from .columnar import HoldingsBatch, HoldingsBatchBuilder
+from .f13_text_parser import iter_text_table_rows, legacy_table_file, parse_text_table
 from edgar_client import EdgarClient
+from packed_cache import PackedCache
+from cache_manager import CacheManager
+
+def infotable_row(info: ET.Element, ns: Dict[str, str], acc_stripped: str, report_date: str, cik: str, doc_url: str) -> Dict:
+    """One <infoTable> element -> one holding row dict. ns: {"ns1": uri} for namespaced tables, {} otherwise"""
+    p = "ns1:" if ns else ""
+    def text(path, default=None):
+        return info.findtext(path.replace("ns1:", p), default=default, namespaces=ns) #* findtext: Find text for first matching element by tag name or path
+    return {
+        "accession_number": acc_stripped,
+        "report_date": report_date,
+        "cik": cik,
+        "issuer": text("ns1:nameOfIssuer"),
+        "class": text("ns1:titleOfClass"),
+        "cusip": text("ns1:cusip"),
+        "figi": text("ns1:figi"),
+        "value_dollar": int(text("ns1:value", default=-1)),
+        "shares_owned": int(text("ns1:shrsOrPrnAmt/ns1:sshPrnamt", default=-1)), # shares or principal amount
+        "share_type": text("ns1:shrsOrPrnAmt/ns1:sshPrnamtType"),
+        "discretion": text("ns1:investmentDiscretion"),
+        "voting_sole": text("ns1:votingAuthority/ns1:Sole"),
+        "voting_shared": text("ns1:votingAuthority/ns1:Shared"),
+        "voting_none": text("ns1:votingAuthority/ns1:None"),
+        "primary_doc_url": doc_url,
+    }
+
+
+def parse_infotable_xml(xml_content: bytes, acc_stripped: str, report_date: str, cik: str, doc_url: str) -> List[Dict]:
+    """Whole-document parse: builds the full tree, then a list of rows"""
+    root = ET.fromstring(xml_content)
+    ns = {}
+    if root.tag.startswith('{'):
+        ns_uri = root.tag.split("}")[0].strip("{")
+        ns = {"ns1": ns_uri}
+    infotables = root.findall(".//ns1:infoTable" if ns else ".//infoTable", ns)
+    return [infotable_row(info, ns, acc_stripped, report_date, cik, doc_url) for info in infotables]
+
+
+def iter_infotable_rows(chunks: Iterable[bytes], acc_stripped: str, report_date: str, cik: str, doc_url: str) -> Iterator[Dict]:
+    """Streaming parse: feed the document in chunks and emit each <infoTable> row as soon as its end tag is seen.
+    Finished elements are cleared and detached from the root, so memory stays flat no matter how many holdings."""
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    ns: Dict[str, str] = {}
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                    if elem.tag.startswith('{'):
+                        ns = {"ns1": elem.tag.split("}")[0].strip("{")}
+                continue
+            if elem.tag.rsplit("}", 1)[-1] != "infoTable":
+                continue
+            yield infotable_row(elem, ns, acc_stripped, report_date, cik, doc_url)
+            elem.clear()
+            try:
+                root.remove(elem) # infoTables are children of the root; earlier ones are already gone, so this is cheap
+            except ValueError:
+                pass
+    parser.close()
+
+
+def _mp_context():
+    """Parse pool start method. Never fork: parse_all runs in CrawlScheduler's fund threads while other threads hold
+    locks (RateLimiter, HttpCache, sqlite/requests pools), and a forked child can inherit one held forever.
+    forkserver forks from a clean single-threaded server process (spawn where it isn't available)"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
 
 class Form13FParser(BaseParser):
     PARSER_VER = 1 # bump if change parser logic
+    CACHE_DIR = "cache/f13/packed" # see packed_cache.py; compact with: python packed_cache.py compact --min_version N
+    LEGACY_CACHE_DIR = "cache/f13" # old one-json-per-accession cache, migrated on read
 
-    def __init__(self, client: "EdgarClient"):
+    def __init__(self, client: "EdgarClient", stream: bool = True):
+        """stream: parse infotables incrementally as they download (flat memory) instead of loading the whole xml"""
         self.client = client #* EdgarClient instance
+        self.stream = stream
+        self.failed: List[str] = [] # accessions parse_all couldn't process (errors, not "no infotable"), for the sync mark
 
-    def parse_primary_doc(self, acc_stripped) -> List[Dict]:
+    def iter_rows(self, acc_stripped) -> Iterator[Dict]:
         """
-        For Form 13F XML file for one accession number. Parse <infoTable> entries, one per holding.
+        For Form 13F XML file for one accession number. Yield <infoTable> entries, one per holding.
+        Pre-2013 filings without an infotable xml are read from their plain-text table instead (f13_text_parser).
         """
         # For 13F forms: find infotable xml file name
-        index_json = self.client.get_index_json(acc_stripped)
-        report_date = self.client.get_primary_doc_name_date(acc_stripped)[1]
-        info_file = next((i["name"] for i in index_json["directory"]["item"] if "infotable" in i["name"]), None)
+        manifest = self.client.get_manifest(acc_stripped)
+        report_date = manifest.report_date
+        info_file, stream_fn, parse_fn = self._table_source(manifest)
         if not info_file:
-            # TODO process txt files like https://www.sec.gov/Archives/edgar/data/763212/000104746912006030/a2209625z13f-hr.txt
             print(f"Info table xml/txt file not found for {acc_stripped}")
-            return []
-        # else: # true fail
-        #     print(f"Info table xml/txt file not found for {acc_stripped}")
-        #     traceback.print_exc()
-        #     return []
+            return
         # Get infotable XML file and parse
-        xml_content = self.client.fetch_file(acc_stripped, info_file)
-        root = ET.fromstring(xml_content)
-        ns = {}
-        if root.tag.startswith('{'):
-            ns_uri = root.tag.split("}")[0].strip("{")
-            ns = {"ns1": ns_uri}
-        infotables = root.findall(".//ns1:infoTable", ns)
-
-        rows = []
-        for info in infotables:
-            rows.append({
-                "accession_number": acc_stripped,
-                "report_date": report_date,
-                "cik": self.client.cik,
-                "issuer": info.findtext("ns1:nameOfIssuer", namespaces=ns), #* findtext: Find text for first matching element by tag name or path
-                "class": info.findtext("ns1:titleOfClass", namespaces=ns),
-                "cusip": info.findtext("ns1:cusip", namespaces=ns),
-                "figi": info.findtext("ns1:figi", namespaces=ns),
-                "value_dollar": int(info.findtext("ns1:value", default=-1, namespaces=ns)),
-                "shares_owned": int(info.findtext("ns1:shrsOrPrnAmt/ns1:sshPrnamt", default=-1, namespaces=ns)), # shares or principal amount
-                "share_type": info.findtext("ns1:shrsOrPrnAmt/ns1:sshPrnamtType", namespaces=ns),
-                "discretion": info.findtext("ns1:investmentDiscretion", namespaces=ns),
-                "voting_sole": info.findtext("ns1:votingAuthority/ns1:Sole", namespaces=ns),
-                "voting_shared": info.findtext("ns1:votingAuthority/ns1:Shared", namespaces=ns),
-                "voting_none": info.findtext("ns1:votingAuthority/ns1:None", namespaces=ns),
-                "primary_doc_url": f"{self.client.filing_baseurl}/{acc_stripped.replace('-', '')}/{info_file}",
-            })
-        return rows
-    
-    def parse_all(self, acc_numbers: List[str], limit: Optional[int] = None, use_cache=True) -> List[Dict]:
+        if self.stream:
+            chunks = self.client.iter_file_chunks(acc_stripped, info_file)
+            yield from stream_fn(chunks, acc_stripped, report_date, self.client.cik, manifest.url(info_file))
+        else:
+            content = self.client.fetch_file(acc_stripped, info_file)
+            yield from parse_fn(content, acc_stripped, report_date, self.client.cik, manifest.url(info_file))
+
+    @staticmethod
+    def _table_source(manifest):
+        """-> (file name, streaming parse fn, whole-doc parse fn). file name is None if there's no table to parse"""
+        if manifest.infotable_file:
+            return manifest.infotable_file, iter_infotable_rows, parse_infotable_xml
+        return legacy_table_file(manifest), iter_text_table_rows, parse_text_table
+
+    def _fetch_infotable(self, acc_stripped) -> Optional[Tuple]:
+        """Download the whole table -> (parse fn, parse fn args), all picklable for the process pool. None if no table"""
+        manifest = self.client.get_manifest(acc_stripped)
+        info_file, _, parse_fn = self._table_source(manifest)
+        if not info_file:
+            print(f"Info table xml/txt file not found for {acc_stripped}")
+            return None
+        content = self.client.fetch_file(acc_stripped, info_file)
+        return parse_fn, (content, acc_stripped, manifest.report_date, self.client.cik, manifest.url(info_file))
+
+    def parse_primary_doc(self, acc_stripped) -> List[Dict]:
+        """
+        For Form 13F XML file for one accession number. Parse <infoTable> entries, one per holding.
+        """
+        return list(self.iter_rows(acc_stripped))
+
+    def parse_all(self, acc_numbers: List[str], limit: Optional[int] = None, use_cache=True,
+                  columnar: bool = False, workers: int = 1) -> Union[List[Dict], HoldingsBatch]:
         """
         Parse multiple accession numbers and return a flat list of dict rows. Checks cache for already-processed accessions.
         - acc_numbers: list of accession number strings
         - limit: optional max number of accessions to process
+        - columnar: return a HoldingsBatch (typed arrays, dictionary-encoded strings) instead of dicts.
+          Each filing's rows are folded into the batch as soon as it's parsed, so the dicts never pile up.
+        - workers: >1 fetches in threads and parses XML in a process pool of this size (see _iter_parsed_parallel)
 
         Returns:
-        - List[Dict]: flattened list where each dict is one infoTable row.
+        - List[Dict]: flattened list where each dict is one infoTable row. (or HoldingsBatch)
         """
         
         to_process = acc_numbers[:limit] if limit is not None else acc_numbers
         print(f"Processing {len(to_process)} accession numbers")
         to_process = [a.replace('-', '') for a in to_process] # strip dashes
+        self.failed = []
         per_file_rows: List[List[dict]] = [] # list of lists of dicts. each sublist=rows of holding dicts for one accession number
+        builder = HoldingsBatchBuilder() if columnar else None
+        if workers > 1:
+            parsed = self._iter_parsed_parallel(to_process, use_cache, workers)
+        else:
+            parsed = self._iter_parsed(to_process, use_cache)
+        for acc, file_rows in parsed:
+            if file_rows and builder is not None:
+                builder.add_rows(file_rows)
+            elif file_rows:
+                per_file_rows.append(file_rows)
+        if use_cache:
+            try:
+                self.cache_manager.flush() # evict over size/age limits, save hit stats
+            except Exception as e: # housekeeping only, never fails the run
+                print(f"Cache flush failed: {e}")
+        if builder is not None:
+            return builder.build()
+        # Flatten into single list-of-dicts, each dict=one holding row
+        return list(chain.from_iterable(per_file_rows))
+
+    def _iter_parsed(self, to_process: List[str], use_cache: bool) -> Iterator[Tuple[str, List[Dict]]]:
         for acc in to_process:
             try:
-                if use_cache: # Check cache for already-processed accessions
-                    cached = self._load_cache(acc)
-                    if cached is not None:
-                        print(f"Loaded {len(cached)} cached rows for {acc}")
-                        per_file_rows.append(cached)
-                        continue
-                # Not found in cache
-                file_rows = self.parse_primary_doc(acc)
-                if file_rows:
-                    per_file_rows.append(file_rows)
-                    self._save_to_cache(acc, file_rows)
+                yield acc, self.parse_one(acc, use_cache=use_cache)
             except Exception as e:
                 print(f"Error parsing {acc}: {e}")
                 traceback.print_exc()
-        # Flatten into single list-of-dicts, each dict=one holding row
-        return list(chain.from_iterable(per_file_rows))
+                self.failed.append(acc)
+
+    def _iter_parsed_parallel(self, to_process: List[str], use_cache: bool, workers: int) -> Iterator[Tuple[str, List[Dict]]]:
+        """Fetch (I/O) in threads, parse XML (CPU) in a process pool.
+        At most 2*workers accessions are in flight, and results come back in accession order, same as _iter_parsed.
+        One bad accession is printed and skipped, it doesn't stop the others."""
+        window = 2 * workers
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as cpu_pool, ThreadPoolExecutor(max_workers=window) as io_pool:
+            def job(acc) -> Tuple[List[Dict], bool]:
+                """-> (rows, from_cache). runs in an io thread, blocks on its own parse in the process pool"""
+                if use_cache:
+                    cached = self._load_cache(acc)
+                    if cached is not None:
+                        return cached, True
+                fetched = self._fetch_infotable(acc)
+                if fetched is None:
+                    return [], False
+                parse_fn, parse_args = fetched
+                return cpu_pool.submit(parse_fn, *parse_args).result(), False
+
+            in_flight = deque()
+            todo = iter(to_process)
+            for acc in islice(todo, window):
+                in_flight.append((acc, io_pool.submit(job, acc)))
+            while in_flight:
+                acc, fut = in_flight.popleft() # oldest first -> deterministic order
+                nxt = next(todo, None)
+                if nxt is not None:
+                    in_flight.append((nxt, io_pool.submit(job, nxt)))
+                try:
+                    file_rows, from_cache = fut.result()
+                except Exception as e:
+                    print(f"Error parsing {acc}: {e}")
+                    traceback.print_exc()
+                    self.failed.append(acc)
+                    continue
+                if from_cache:
+                    print(f"Loaded {len(file_rows)} cached rows for {acc}")
+                elif file_rows:
+                    self._save_to_cache(acc, file_rows)
+                yield acc, file_rows
+
+    def parse_one(self, acc: str, use_cache=True) -> List[Dict]:
+        """Cache check + parse + cache write for one (stripped) accession number. Raises on errors, unlike parse_all"""
+        if use_cache: # Check cache for already-processed accessions
+            cached = self._load_cache(acc)
+            if cached is not None:
+                print(f"Loaded {len(cached)} cached rows for {acc}")
+                return cached
+        # Not found in cache
+        file_rows = self.parse_primary_doc(acc)
+        if file_rows:
+            self._save_to_cache(acc, file_rows)
+        return file_rows
     
 
     
+    @property
+    def cache(self) -> PackedCache:
+        return PackedCache.open(self.CACHE_DIR)
+
+    @property
+    def cache_manager(self) -> CacheManager:
+        """size/age limits + hit stats for the cache, see cache_manager.py"""
+        return CacheManager.shared("f13", self.cache, stats_file=str(Path(self.CACHE_DIR).joinpath("stats.json")))
+
     def _load_cache(self, acc):
-        path = Path("cache/f13").joinpath(f"{acc}.json")
+        rows = self._load_cache_entry(acc)
+        if rows is None:
+            self.cache_manager.miss(acc)
+        else:
+            self.cache_manager.hit(acc)
+        return rows
+
+    def _load_cache_entry(self, acc):
+        # version check reads only the in-memory index, the rows are decoded only on a hit
+        rows = self.cache.get(acc, min_version=self.PARSER_VER)
+        if rows is not None or acc in self.cache:
+            return rows
+        # not packed yet: pick up an old per-accession json file and move it into the pack
+        path = Path(self.LEGACY_CACHE_DIR).joinpath(f"{acc}.json")
         if not path.exists():
             return None
         try:
             data = json.load(path.open("r", encoding="utf-8"))
+            self.cache.put(acc, data.get("rows"), data.get("parser_version") or 0)
+            path.unlink(missing_ok=True)
             # metadata checks
             if data.get("parser_version") < self.PARSER_VER:
                 return None
-            # later: time invalidate
+            # age limits: CacheManager.max_age_days, applied in flush()
             return data.get("rows")
                 
         except Exception as e:
@@ -113,12 +283,8 @@ class Form13FParser(BaseParser):
             return None
     
     def _save_to_cache(self, acc, rows: List[Dict]):
-        path = Path("cache/f13").joinpath(f"{acc}.json")
-        tmp = path.with_suffix(".json.tmp")
-        # Write data + metadata to a temp file to keep update atomic
-        payload = {"cache_time": time.time(), "parser_version": self.PARSER_VER, "rows": rows}
         try:
-            tmp.write_text(json.dumps(payload), encoding="utf-8") #* dumps produces a string, dump writes to a file
-            tmp.replace(path) # overwrite the target path
-        except Exception:
-            tmp.unlink(missing_ok=True)
+            self.cache.put(acc, rows, self.PARSER_VER)
+            self.cache_manager.touch(acc)
+        except Exception as e:
+            print(f"Error writing cache for {acc}: {e}")
@@ -0,0 +1,162 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+'''
+Parser for pre-2013 plain-text 13F-HR information tables, e.g.
+https://www.sec.gov/Archives/edgar/data/763212/000104746912006030/a2209625z13f-hr.txt
+
+Filers laid the table out however they liked: fixed width under a ----- separator line, <S> <C> column markers,
+pipes, tabs, or just runs of spaces. Instead of trusting one layout, each line is anchored on its CUSIP:
+- left of the CUSIP: issuer + title of class
+- right of it: value, shares/prn amount, SH/PRN, [PUT/CALL], investment discretion, [other managers], voting sole/shared/none
+Column spans from a separator line (if there is one) are used to split issuer/class and to place voting numbers when
+some are blank; without one, runs of 2+ spaces do.
+Rows come out in the same schema as the XML path (infotable_row). value_dollar is as reported,
+which for these filings is x$1000, same as the pre-2023 XML.
+'''
+
+CUSIP_RE = re.compile(r"(?:(?<=\s)|(?<=\|)|^)([0-9A-Z]{6})[ -]?([0-9A-Z]{2})[ -]?([0-9])(?=[\s|]|$)")
+NUM_RE = re.compile(r"^\$?\(?[0-9][0-9,]*(?:\.[0-9]+)?\)?$")
+SEPARATOR_RE = re.compile(r"^[\s\-=_|]+$")
+SPLIT_RE = re.compile(r"\s{2,}")
+SH_PRN = {"SH", "PRN", "SHS", "SHRS"}
+PUT_CALL = {"PUT", "CALL"}
+DISCRETION = {"SOLE", "SHARED", "DEFINED", "DFND", "OTHER", "OTR", "SHARED-DEFINED", "SHARED-OTHER", "SH-DEF",
+              "SH-OTHER", "SHR", "DEF", "DEFINED/OTHER"}
+
+
+def _num(tok: str) -> int:
+    return int(float(tok.strip("$()").replace(",", "")))
+
+
+def _is_num(tok: str) -> bool:
+    return bool(NUM_RE.match(tok))
+
+
+def separator_spans(line: str) -> Optional[List[Tuple[int, int]]]:
+    """'----  -----  ---' -> [(start, end)] char spans of each dash group, or None if it isn't a separator line"""
+    if "-" not in line and "=" not in line or not SEPARATOR_RE.match(line):
+        return None
+    spans = [m.span() for m in re.finditer(r"[-=_]+", line)]
+    return spans if len(spans) >= 4 else None
+
+
+def text_table_row(line: str, acc_stripped: str, report_date: str, cik: str, doc_url: str,
+                   spans: Optional[List[Tuple[int, int]]] = None) -> Optional[Dict]:
+    """One table line -> one holding row dict (same keys as infotable_row), or None if the line isn't a holding"""
+    # value and amount must be the first two tokens after the cusip, anything else is a name/prose that happens to match
+    m = CUSIP_RE.search(line)
+    while m is not None:
+        right = line[m.end():].replace("|", " ").split()
+        if len(right) >= 3 and _is_num(right[0]) and _is_num(right[1]):
+            break
+        m = CUSIP_RE.search(line, m.start() + 1)
+    if m is None:
+        return None
+    rest = right[2:]
+    share_type = None
+    if rest and rest[0].upper() in SH_PRN:
+        share_type = "PRN" if rest[0].upper() == "PRN" else "SH"
+        rest = rest[1:]
+    if rest and rest[0].upper() in PUT_CALL:
+        rest = rest[1:]
+    discretion = None
+    if rest and rest[0].upper() in DISCRETION:
+        discretion = rest[0].upper()
+        rest = rest[1:]
+    if share_type is None and discretion is None:
+        return None
+
+    # trailing numbers are voting authority; other managers ("1,2", "01") sit in front of them
+    voting: List[Optional[str]] = [None, None, None]
+    nums = []
+    for tok in reversed(rest):
+        if not _is_num(tok) or len(nums) == 3:
+            break
+        nums.append(tok)
+    nums.reverse()
+    if len(nums) == 3 or not spans or len(spans) < 3:
+        for i, tok in enumerate(nums[-3:]):
+            voting[i] = str(_num(tok))
+    else:
+        # some blank voting columns: put each number under the separator span it overlaps
+        vote_spans = spans[-3:]
+        pos = len(line)
+        for tok in reversed(nums):
+            pos = line.rfind(tok, 0, pos)
+            for i, (s, e) in enumerate(vote_spans):
+                if pos < e and pos + len(tok) > s:
+                    voting[i] = str(_num(tok))
+
+    left = line[:m.start()].replace("|", "  ").replace("\t", "  ").rstrip()
+    issuer, title = left.strip(), None
+    if spans and len(spans) > 2 and spans[1][0] < m.start():
+        cut = spans[1][0]
+        issuer, title = left[:cut].strip(), left[cut:].strip() or None
+    else:
+        parts = SPLIT_RE.split(left.strip())
+        if len(parts) > 1:
+            issuer, title = "  ".join(parts[:-1]).strip(), parts[-1]
+
+    return {
+        "accession_number": acc_stripped,
+        "report_date": report_date,
+        "cik": cik,
+        "issuer": issuer or None,
+        "class": title,
+        "cusip": "".join(m.groups()),
+        "figi": None,
+        "value_dollar": _num(right[0]),
+        "shares_owned": _num(right[1]),
+        "share_type": share_type,
+        "discretion": discretion,
+        "voting_sole": voting[0],
+        "voting_shared": voting[1],
+        "voting_none": voting[2],
+        "primary_doc_url": doc_url,
+    }
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Byte chunks -> text lines, without joining the whole document"""
+    tail = b""
+    for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode("latin-1").rstrip("\r")
+    if tail:
+        yield tail.decode("latin-1").rstrip("\r")
+
+
+def iter_text_table_rows(chunks: Iterable[bytes], acc_stripped: str, report_date: str, cik: str, doc_url: str) -> Iterator[Dict]:
+    """Streaming parse of a plain-text filing: yields holding rows line by line. Same args/schema as iter_infotable_rows"""
+    spans = None
+    for line in iter_lines(chunks):
+        if spans is not None and "\t" in line:
+            line = line.expandtabs(8) # tabs used as padding in a fixed-width table; otherwise they're delimiters
+        new_spans = separator_spans(line)
+        if new_spans is not None:
+            spans = new_spans
+            continue
+        if line.lstrip().upper().startswith("<TABLE>"):
+            spans = None # new table, new layout
+            continue
+        row = text_table_row(line, acc_stripped, report_date, cik, doc_url, spans)
+        if row is not None:
+            yield row
+
+
+def parse_text_table(content: bytes, acc_stripped: str, report_date: str, cik: str, doc_url: str) -> List[Dict]:
+    """Whole-document version of iter_text_table_rows (picklable, for the process pool)"""
+    return list(iter_text_table_rows([content], acc_stripped, report_date, cik, doc_url))
+
+
+def legacy_table_file(manifest) -> Optional[str]:
+    """The .txt document holding the table: the 13F-HR document itself if listed, else the full submission .txt"""
+    txts = manifest.find(".txt")
+    full_submission = f"{manifest.acc[:10]}-{manifest.acc[10:12]}-{manifest.acc[12:]}.txt"
+    own = [t for t in txts if t != full_submission]
+    if own:
+        return own[0]
+    return txts[0] if txts else None
@@ -1,26 +1,74 @@
 
-import json
+import hashlib
 import re
 import traceback
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from bs4 import BeautifulSoup
 import logging
 from data_models import FormGEntry
 from .base_parser import BaseParser
 from llm.base_llm_client import BaseLLMClient
-from llm.llm_cache import LLMCache
+from llm.llm_cache import LLMCache, prompt_version
 from edgar_client import EdgarClient
+from .g13_prefilter import MAX_INPUT_TOKENS, budget_13g_text
+from .g13_rules import RULES_MODEL, RULES_VERSION, extract_13g
+
+BATCH_WINDOW = 4 # batched llm: prepare batch_size * BATCH_WINDOW accessions per llm call, so length bucketing has rows to sort
+
+
+class PendingLLM(NamedTuple):
+    """A filing that got past the caches and the rules: its budgeted text still needs the LLM"""
+    accession: str
+    primary_doc: str
+    llm_text: str
+    content_hash: str
 
 
 class Form13GParser(BaseParser):
-    def __init__(self, client: EdgarClient, llm_client: BaseLLMClient):
+    def __init__(self, client: EdgarClient, llm_client: BaseLLMClient, cache: Optional[LLMCache] = None, use_rules: bool = True):
+        """use_rules: try the deterministic cover page extractor (g13_rules) first, LLM only when it isn't confident"""
         self.client = client
         self.llm = llm_client
+        self.cache = cache or LLMCache.open()
+        self.use_rules = use_rules
+        # cache key = accession + prompt version + model, so prompt/model changes don't return stale answers
+        self.model_name = getattr(llm_client, "model_name", "")
+        self.prompt_version = prompt_version()
+        self.stats = {"cache": 0, "rules": 0, "llm": 0, "tokens_raw": 0, "tokens_kept": 0} # where each filing's data came from
+        self.failed: List[str] = [] # accessions that errored (fetch, LLM, ...), kept above the sync mark for a retry
+        # llm input budget: "max_input_tokens" in the llm config, counted with the model's own tokenizer when it has one
+        self.max_input_tokens = getattr(llm_client, "max_input_tokens", None) or MAX_INPUT_TOKENS
+        self.tokenizer = getattr(llm_client, "tokenizer", None)
         self.logger = logging.getLogger(__name__)
 
     def parse_primary_doc(self, acc_stripped: str) -> dict:
+        prepared = self._prepare(acc_stripped)
+        if not isinstance(prepared, PendingLLM):
+            return prepared
+        self.stats["llm"] += 1
+        try:
+            # LLM extraction and validation using the pydantic model
+            file_data: dict = self.llm.extract_and_validate(prepared.llm_text, entry_model=FormGEntry, max_tries=1)
+        except Exception as e:
+            print(f"LLM extraction/validation failed for accession {acc_stripped}: {e}")
+            traceback.print_exc() 
+            self.failed.append(acc_stripped)
+            return {}
+        return self._finish(prepared, file_data)
+
+    def _prepare(self, acc_stripped: str):
+        """Everything up to the LLM call: a finished filing dict (cache/rules, {} if none) or a PendingLLM"""
+        # Cache first: an already extracted filing needs no index.json, download or html parse
+        cached = self.cache.get_entry(acc_stripped, self.prompt_version, self.model_name)
+        if cached is None and self.use_rules:
+            cached = self.cache.get_entry(acc_stripped, RULES_VERSION, RULES_MODEL)
+        if cached is not None and cached["primary_doc"]:
+            print("Cache found")
+            self.stats["cache"] += 1
+            return self._filing(acc_stripped, cached["primary_doc"], cached["data"])
+
         # Find name of primary filing document
-        primary_doc_name = self.client.get_primary_doc_name_date(acc_stripped)[0]
+        primary_doc_name = self.client.get_manifest(acc_stripped).primary_doc
         if not primary_doc_name:
             return {}
 
@@ -29,21 +77,52 @@ class Form13GParser(BaseParser):
         soup = BeautifulSoup(html_content, "lxml")
         text = soup.get_text(" ", strip=True)
 
-        # See if doc content is cached
-        cache = LLMCache() #?? where to place
-        file_data = cache.get(acc_stripped) #? faster to check cache in parse_all??
-        if not file_data:
-            try:
-                # LLM extraction and validation using the pydantic model
-                file_data: dict = self.llm.extract_and_validate(text, entry_model=FormGEntry, max_tries=1)
-                cache.set(acc_stripped, file_data) # cache llm output only
-            except Exception as e:
-                print(f"LLM extraction/validation failed for accession {acc_stripped}: {e}")
-                traceback.print_exc() 
-                return {}
-        else:
-            print("Cache found")
+        # Standard cover page: fill FormGEntry with regexes, no LLM call
+        if self.use_rules and cached is None:
+            file_data = extract_13g(text)
+            if file_data is not None:
+                self.stats["rules"] += 1
+                self.cache.set(acc_stripped, file_data, model=RULES_MODEL, prompt_version=RULES_VERSION,
+                               content_hash=hashlib.sha1(text.encode("utf-8")).hexdigest(), primary_doc=primary_doc_name)
+                return self._filing(acc_stripped, primary_doc_name, file_data)
+
+        # Only the cover page + Items 1, 2, 4, 5, 6 go to the LLM, cut to the token budget
+        llm_text, report = self.llm_input(html_content, soup)
+        self.stats["tokens_raw"] += report["raw_tokens"]
+        self.stats["tokens_kept"] += report["kept_tokens"]
+        print(f"LLM input {report['kept_tokens']} tokens (of {report['raw_tokens']}, -{report['reduction']:.0%})")
 
+        # Same text already extracted under another accession (or an entry from before primary_doc was stored)?
+        content_hash = hashlib.sha1(llm_text.encode("utf-8")).hexdigest()
+        pending = PendingLLM(acc_stripped, primary_doc_name, llm_text, content_hash)
+        file_data = cached["data"] if cached is not None else self.cache.get_by_content(content_hash, self.prompt_version, self.model_name)
+        if file_data:
+            print("Cache found (same content)")
+            return self._finish(pending, file_data)
+        return pending
+
+    def _llm_batch(self, pending: List[PendingLLM], batch_job: bool) -> list:
+        """One dict or exception per pending filing. A failure of the whole call (CUDA OOM, daemon gone, batch job
+        error) fails only this window's filings, not the cache/rules results already collected"""
+        try:
+            if batch_job:
+                by_acc = self.llm.run_batch_job({p.accession: p.llm_text for p in pending}, entry_model=FormGEntry, max_tries=1)
+                missing = RuntimeError("no result from batch job")
+                return [by_acc.get(p.accession, missing) for p in pending]
+            outputs = self.llm.extract_and_validate_batch([p.llm_text for p in pending], entry_model=FormGEntry, max_tries=1)
+        except Exception as e:
+            traceback.print_exc()
+            return [e] * len(pending)
+        if len(outputs) != len(pending):
+            return [RuntimeError(f"LLM returned {len(outputs)} results for {len(pending)} filings")] * len(pending)
+        return outputs
+
+    def _finish(self, pending: "PendingLLM", file_data: dict) -> dict:
+        self.cache.set(pending.accession, file_data, model=self.model_name, prompt_version=self.prompt_version,
+                       content_hash=pending.content_hash, primary_doc=pending.primary_doc) # cache llm output only
+        return self._filing(pending.accession, pending.primary_doc, file_data)
+
+    def _filing(self, acc_stripped: str, primary_doc_name: str, file_data: dict) -> dict:
         # Add accession_number, return as a filing-level dict
         filing = {
             "accession_number": acc_stripped, 
@@ -57,67 +136,120 @@ class Form13GParser(BaseParser):
         to_process = [a.replace('-', '') for a in to_process]
         total = len(to_process)
         print(f"Processing {total} Form 13G filings...")
+        self.failed = []
 
+        batch_size = max(1, getattr(self.llm, "batch_size", 1))
         data = [] # list of dicts, one per accession
-        for idx, acc in enumerate(to_process, start=1):
-            print(f"[{idx}/{total}] Processing accession {acc}...")
-            try:
-                entry = self.parse_primary_doc(acc)
-                if entry:
-                    data.append(entry)
-                    print(f"Success — collected {len(data)} filings.")
-                else:
-                    print(f"No data extracted for {acc}.")
-            except Exception as e:
-                print(f"Error processing {acc}: {e}")
+        if batch_size == 1:
+            for idx, acc in enumerate(to_process, start=1):
+                print(f"[{idx}/{total}] Processing accession {acc}...")
+                try:
+                    entry = self.parse_primary_doc(acc)
+                    if entry:
+                        data.append(entry)
+                        print(f"Success — collected {len(data)} filings.")
+                    else:
+                        print(f"No data extracted for {acc}.")
+                except Exception as e:
+                    print(f"Error processing {acc}: {e}")
+                    self.failed.append(acc)
+        else:
+            # Fetch + rules + cache for a window of accessions, then one batched llm call for the ones left over
+            batch_job = getattr(self.llm, "batch_job", False) # Batch API: one job for everything, results by accession
+            window = total if batch_job else batch_size * BATCH_WINDOW
+            for start in range(0, total, window):
+                results = {}
+                pending = []
+                for idx, acc in enumerate(to_process[start:start + window], start=start + 1):
+                    print(f"[{idx}/{total}] Processing accession {acc}...")
+                    try:
+                        prepared = self._prepare(acc)
+                    except Exception as e:
+                        print(f"Error processing {acc}: {e}")
+                        self.failed.append(acc)
+                        continue
+                    if isinstance(prepared, PendingLLM):
+                        pending.append(prepared)
+                    else:
+                        results[acc] = prepared
+                if pending:
+                    print(f"LLM batch: {len(pending)} filings, batch size {batch_size}")
+                    self.stats["llm"] += len(pending)
+                    outputs = self._llm_batch(pending, batch_job)
+                    for p, out in zip(pending, outputs):
+                        if isinstance(out, Exception):
+                            print(f"LLM extraction/validation failed for accession {p.accession}: {out}")
+                            self.failed.append(p.accession)
+                            continue
+                        try:
+                            results[p.accession] = self._finish(p, out)
+                        except Exception as e:
+                            print(f"Error processing {p.accession}: {e}")
+                            self.failed.append(p.accession)
+                for acc in to_process[start:start + window]: # accession order
+                    if results.get(acc):
+                        data.append(results[acc])
+                    else:
+                        print(f"No data extracted for {acc}.")
+                print(f"Collected {len(data)} filings.")
 
+        print(f"13G sources: {self.stats['cache']} cached, {self.stats['rules']} rules, {self.stats['llm']} llm calls")
+        if self.stats["tokens_raw"]:
+            print(f"LLM input tokens: {self.stats['tokens_kept']} kept of {self.stats['tokens_raw']} "
+                  f"(-{1 - self.stats['tokens_kept'] / self.stats['tokens_raw']:.0%})")
+        try:
+            self.cache.manager.flush() # evict over size/age limits, save hit stats
+        except Exception as e: # housekeeping only, never fails the run
+            print(f"Cache flush failed: {e}")
         return data
     
     
     def prefilter_13g_sections(self, filing_text):
         """
         Prefilter 13G/13G-A text to extract section from html or txt.
-
-        TODO: super simple for now - keeps all text between Form 13G and signature. the tables made the text much longer......
+        Keeps all text between Form 13G and signature, one line per paragraph; html tables become one line per row
+        ("cell | cell") so the cover page rows stay together. select_13g_sections / budget_13g_text narrow it further.
         """
 
         if "<html" in filing_text.lower():
-            soup = BeautifulSoup(filing_text, "html.parser") #? lxml
-            main_text = soup.get_text(" ", strip=True)
-            #! Tables giving me issues bc it appends table text onto existing text... if just getting the original text isn't an issue then skip tables.
-            # tables = ["\n" + table.get_text(" ", strip=True) for table in soup.find_all("table")]
-            body_text = main_text
+            soup = BeautifulSoup(filing_text, "lxml")
+            body_text = self._html_lines(soup)
         else:
             body_text = filing_text
-        
+        return self._cut_block(body_text)
+
+    @staticmethod
+    def _html_lines(soup) -> str:
+        """Text with table structure kept: one line per <tr>, cells joined by ' | '. Mutates soup"""
+        for table in soup.find_all("table"):
+            rows = []
+            for tr in table.find_all("tr"):
+                cells = [c.get_text(" ", strip=True) for c in tr.find_all(["td", "th"])]
+                cells = [c for c in cells if c]
+                if cells:
+                    rows.append(" | ".join(cells))
+            table.replace_with("\n" + "\n".join(rows) + "\n")
+        lines = (re.sub(r"\s+", " ", line).strip() for line in soup.get_text("\n").splitlines())
+        return "\n".join(line for line in lines if line)
+
+    @staticmethod
+    def _cut_block(body_text: str) -> str:
         # Regex
         schedule_match = re.search(r'(Schedule\s+13G[^\n]*)', body_text, re.IGNORECASE)
-        signature_match = re.search(r'(Signature|Certification)', body_text, re.IGNORECASE)
+        signature_match = re.compile(r'(Signature|Certification)', re.IGNORECASE).search(
+            body_text, schedule_match.end() if schedule_match else 0)
         if schedule_match and signature_match:
             block = body_text[schedule_match.start():signature_match.end()]
         else:
             block = body_text # fallback
 
         return block
-        
-
-        #todo something wrong with below or how I'm unit testing it. also worried it'll cut out info -- keeping more text is safer for now
-        # # Find Item sections
-        # item_pattern = re.compile(r'(Item\s+[0-9A-Za-z\.]+[\s\S]*?)(?=(Item\s+[0-9A-Za-z\.]+|Exhibit|Signature|Certification|$))', re.IGNORECASE)
-        # items = item_pattern.findall(block) # find all item sections in the block
-        # kept_sections.extend([item[0] for item in items])
-                
-        # # Get all Exhibit blocks
-        # exhibit_pattern = re.compile(r'(Exhibit[\s\S]*?)(?=(Item\s+[0-9A-Za-z\.]+|Signature|Certification|$))', re.IGNORECASE)
-        # exhibits = exhibit_pattern.findall(block)
-        # kept_sections += exhibits
-
-        # # Keyword-driven lines for older files - slow??
-        # relevant_lines = []
-        # keywords = ["beneficial ownership", "voting power", "dispositive power", "percent of class", "cusip", "issuer", "reporting person"]
-        # for line in block.splitlines():
-        #     print(line)
-        #     if any(kw in line.lower() for kw in keywords):
-        #         relevant_lines.append(line)
-
-        
\ No newline at end of file
+
+    def llm_input(self, content: bytes, soup=None) -> Tuple[str, Dict]:
+        """Text actually sent to the LLM: prefiltered block -> kept sections -> token budget. Returns (text, token report)"""
+        text = content.decode("utf-8", errors="replace") if isinstance(content, bytes) else content
+        if "<html" in text[:5000].lower():
+            raw = self._html_lines(soup if soup is not None else BeautifulSoup(text, "lxml"))
+        else:
+            raw = text
+        return budget_13g_text(self._cut_block(raw), self.max_input_tokens, self.tokenizer, raw_text=raw)
@@ -0,0 +1,74 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+'''
+Section selection + token budget for the 13G text that goes to the LLM.
+Everything the prompt asks for is on the cover page rows or in Items 1, 2, 4, 5, 6
+(issuer, filer, ownership, 5%-or-less, other persons' rights); Items 3, 7-10, exhibits and signatures are dropped.
+Input is the output of Form13GParser.prefilter_13g_sections: one line per paragraph / table row ("cell | cell").
+'''
+
+MAX_INPUT_TOKENS = 4096 # default budget, override with "max_input_tokens" in the llm config
+KEEP_ITEMS = {"1", "2", "4", "5", "6"}
+ITEM_HEADING_RE = re.compile(r"^[ \t|]*Item[ \t]+(\d{1,2})(?:[ \t]*\([ \t]*[a-z][ \t]*\))?[ \t]*[.:|]", re.IGNORECASE | re.MULTILINE)
+CHARS_PER_TOKEN = 4 # rough estimate when there's no tokenizer (api models)
+
+
+def select_13g_sections(block: str) -> str:
+    """Cover page (everything before the first Item heading) + the kept Items. Unchanged if no Item headings are found"""
+    headings = list(ITEM_HEADING_RE.finditer(block))
+    if not headings:
+        return block
+    parts = [block[:headings[0].start()]]
+    for h, nxt in zip(headings, headings[1:] + [None]):
+        if h.group(1) in KEEP_ITEMS:
+            parts.append(block[h.start():nxt.start() if nxt else len(block)])
+    return "".join(parts).strip()
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_budget(text: str, max_tokens: int, tokenizer=None) -> str:
+    """Cut the tail so text fits in max_tokens of the model's tokenizer (char estimate without one)"""
+    if tokenizer is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    if len(ids) <= max_tokens:
+        return text
+    return tokenizer.decode(ids[:max_tokens], skip_special_tokens=True)
+
+
+def budget_13g_text(block: str, max_tokens: int = MAX_INPUT_TOKENS, tokenizer=None,
+                    raw_text: Optional[str] = None) -> Tuple[str, Dict]:
+    """select sections + truncate -> (llm input, report). report: raw/kept token counts and the reduction.
+    raw_text: the unfiltered document text, for the report (defaults to block)"""
+    kept = truncate_to_budget(select_13g_sections(block), max_tokens, tokenizer)
+    raw_tokens = count_tokens(raw_text if raw_text is not None else block, tokenizer)
+    kept_tokens = count_tokens(kept, tokenizer)
+    report = {"raw_tokens": raw_tokens, "kept_tokens": kept_tokens,
+              "reduction": round(1 - kept_tokens / raw_tokens, 3) if raw_tokens else 0.0}
+    return kept, report
+
+
+def value_recall(text: str, expected: Dict) -> Tuple[float, List[str]]:
+    """Share of an extraction's values that still appear in the filtered text (numbers with or without commas).
+    A cheap accuracy proxy: the LLM can't return what was filtered out."""
+    flat = re.sub(r"\s+", " ", text).lower()
+    missing = []
+    for field, value in expected.items():
+        if value in (None, "", 0, 0.0):
+            continue # zeros are usually "-0-"/"None" in the text
+        if isinstance(value, (int, float)):
+            candidates = {str(value), f"{value:,}"} if isinstance(value, int) else {f"{value:g}", str(value)}
+        elif field == "report_date":
+            continue # reformatted by the llm (yyyy/mm/dd)
+        else:
+            candidates = {str(value).lower()}
+        if not any(c.lower() in flat for c in candidates):
+            missing.append(field)
+    checked = [f for f, v in expected.items() if v not in (None, "", 0, 0.0) and f != "report_date"]
+    return (1 - len(missing) / len(checked)) if checked else 1.0, missing
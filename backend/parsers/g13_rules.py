@@ -0,0 +1,147 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from data_models import FormGEntry, consistency_problems
+
+'''
+Deterministic extractor for the standard Schedule 13G cover page, so most filings never reach the LLM.
+
+The cover page is a numbered table (rows 1-12) that every filer copies from the SEC form:
+  CUSIP No. 02376R102 ... 1 NAMES OF REPORTING PERSONS PRIMECAP Management Company 2 CHECK THE APPROPRIATE BOX ...
+  5 SOLE VOTING POWER 55,507,321 6 SHARED VOTING POWER 0 7 SOLE DISPOSITIVE POWER 57,339,666 8 SHARED DISPOSITIVE POWER 0
+  9 AGGREGATE AMOUNT BENEFICIALLY OWNED BY EACH REPORTING PERSON 57,339,666 ... 11 PERCENT OF CLASS REPRESENTED BY AMOUNT IN ROW (9) 8.77%
+Rows are matched in order from one cursor, so with several reporting persons every number comes from the first cover page.
+Works on the flattened text (soup.get_text(" ")) the parser already has.
+'''
+
+RULES_VERSION = "rules-1" # bump if extraction logic changes (part of the cache key, in place of the prompt version)
+RULES_MODEL = "rules" # cache model name for rule-extracted entries
+MIN_CONFIDENCE = 0.9 # below this -> LLM
+
+F = re.IGNORECASE | re.DOTALL
+NUM = r"(-0-|None|Nil|[0-9][0-9,]*(?:\.[0-9]+)?)"
+CUSIP_RE = re.compile(r"CUSIP\s*(?:No\.?|Number|#)?\s*[:.]?\s*([0-9A-Z]{6})\s?([0-9A-Z]{2})\s?([0-9])\b", re.IGNORECASE)
+NAME_RE = re.compile(r"NAMES?\s+OF\s+REPORTING\s+PERSONS?\.?\s*(?:(?:S\.S\.\s+OR\s+)?I\.?R\.?S\.?\s+IDENTIFICATION\s+NOS?\.?\s+OF\s+"
+                     r"ABOVE\s+PERSONS?\s*(?:\(ENTITIES\s+ONLY\))?\s*)?[:.]?\s*(.{2,150}?)\s+(?:\(?2\)?\.?\s+)?CHECK\s+THE\s+APPROPRIATE", F)
+# (field, label) in cover page order
+ROWS = [
+    ("voting_sole", r"SOLE\s+VOTING\s+POWER"),
+    ("voting_shared", r"SHARED\s+VOTING\s+POWER"),
+    ("shares_dispo_sole", r"SOLE\s+DISPOSITIVE\s+POWER"),
+    ("shares_dispo_shared", r"SHARED\s+DISPOSITIVE\s+POWER"),
+    ("shares_owned", r"AGGREGATE\s+AMOUNT\s+BENEFICIALLY\s+OWNED\s+BY\s+EACH\s+REPORTING\s+PERSON"),
+    ("percent_of_class", r"PERCENT\s+OF\s+CLASS\s+REPRESENTED\s+BY\s+AMOUNT\s+IN\s+ROW\s*\(?\s*(?:9|11)\s*\)?"),
+]
+ROW_RES = [(field, re.compile(label, F)) for field, label in ROWS]
+# value right after a label; a bare row number followed by the next label means the row was left blank
+VALUE_RE = re.compile(r"\s*[:.]?\s*(?:\(see[^)]{0,40}\)\s*)?" + NUM + r"(?!\.?\s+(?:SOLE|SHARED|AGGREGATE|CHECK|PERCENT|TYPE)\b)", F)
+ISSUER_RES = [
+    re.compile(r"Item\s+1\s*\(?a\)?\.?\s*Name\s+of\s+Issuer\s*[:.]?\s*(.{2,120}?)\s+(?:Item\s+1\s*\(?b\)?|\(b\)|Address\s+of\s+Issuer)", F),
+    re.compile(r"(?:\)|13G(?:/A)?)\s*([A-Z0-9][^()]{1,100}?)\s*\(Name\s+of\s+Issuer\)", F),
+]
+DATE_RES = [
+    re.compile(r"([A-Za-z]{3,9}\.?\s+[0-9]{1,2},?\s+[0-9]{4}|[0-9]{1,2}/[0-9]{1,2}/[0-9]{4}|[0-9]{4}-[0-9]{2}-[0-9]{2})\s*"
+               r"\(?\s*Date\s+of\s+Event\s+Which\s+Requires\s+Filing", F),
+    re.compile(r"Date\s+of\s+Event\s+Which\s+Requires\s+Filing\s+of\s+this\s+Statement\)?\s*[:.]?\s*"
+               r"([A-Za-z]{3,9}\.?\s+[0-9]{1,2},?\s+[0-9]{4}|[0-9]{1,2}/[0-9]{1,2}/[0-9]{4}|[0-9]{4}-[0-9]{2}-[0-9]{2})", F),
+]
+DATE_FORMATS = ["%B %d %Y", "%b %d %Y", "%m/%d/%Y", "%Y-%m-%d"]
+
+
+def cusip_check_digit(cusip8: str) -> int:
+    """Modulus 10 double-add-double check digit of the first 8 CUSIP characters"""
+    total = 0
+    for i, ch in enumerate(cusip8.upper()):
+        if ch.isdigit():
+            v = int(ch)
+        elif ch.isalpha():
+            v = ord(ch) - ord("A") + 10
+        else:
+            v = {"*": 36, "@": 37, "#": 38}.get(ch, 0)
+        if i % 2 == 1:
+            v *= 2
+        total += v // 10 + v % 10
+    return (10 - total % 10) % 10
+
+
+def valid_cusip(cusip: str) -> bool:
+    return len(cusip) == 9 and cusip[8].isdigit() and cusip_check_digit(cusip[:8]) == int(cusip[8])
+
+
+def _to_number(tok: str, as_float: bool = False):
+    if tok.lower() in ("-0-", "none", "nil"):
+        return 0.0 if as_float else 0
+    v = float(tok.replace(",", ""))
+    return v if as_float else int(v)
+
+
+def _parse_date(s: str) -> Optional[str]:
+    s = re.sub(r"\s+", " ", s.replace(",", " ").replace(".", "")).strip()
+    s = re.sub(r"^Sept\b", "Sep", s, flags=re.IGNORECASE)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y/%m/%d") # FormGEntry format
+        except ValueError:
+            continue
+    return None
+
+
+def extract_cover_page(text: str) -> Tuple[Dict, float, List[str]]:
+    """-> (fields found, confidence 0-1, problems). Confidence = share of FormGEntry fields found,
+    halved if the numbers don't add up or the CUSIP check digit is wrong"""
+    out: Dict = {}
+    problems: List[str] = []
+
+    m = CUSIP_RE.search(text)
+    if m:
+        out["cusip"] = "".join(m.groups()).upper()
+        if not valid_cusip(out["cusip"]):
+            problems.append("cusip check digit")
+
+    pos = 0
+    m = NAME_RE.search(text)
+    if m:
+        out["name_filer"] = re.sub(r"\s+", " ", m.group(1)).strip(" :;")
+        pos = m.end()
+    for field, regex in ROW_RES:
+        label = regex.search(text, pos)
+        if label is None:
+            continue
+        pos = label.end()
+        m = VALUE_RE.match(text, pos)
+        if m is None:
+            continue
+        try:
+            out[field] = _to_number(m.group(1), as_float=field == "percent_of_class")
+        except ValueError:
+            continue
+        pos = m.end()
+
+    for regex in ISSUER_RES:
+        m = regex.search(text)
+        if m:
+            out["issuer"] = re.sub(r"\s+", " ", m.group(1)).strip(" :;")
+            break
+    for regex in DATE_RES:
+        m = regex.search(text)
+        if m and _parse_date(m.group(1)):
+            out["report_date"] = _parse_date(m.group(1))
+            break
+
+    required = list(FormGEntry.model_fields)
+    confidence = sum(f in out for f in required) / len(required)
+    problems += consistency_problems(out)
+    if problems:
+        confidence /= 2
+    return out, confidence, problems
+
+
+def extract_13g(text: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[Dict]:
+    """Validated FormGEntry dict from the rules, or None if the LLM is needed"""
+    fields, confidence, problems = extract_cover_page(text)
+    if confidence < min_confidence or problems:
+        return None
+    try:
+        return FormGEntry(**fields).model_dump()
+    except ValueError: # pydantic ValidationError is a ValueError
+        return None
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from edgar_client import EdgarClient, RateLimiter
+from http_cache import HttpCache
+from sync import SubmissionsSync
+from parsers.f13_parser import Form13FParser
+from parsers.g13_parser import Form13GParser
+
+
+def read_cik_file(path: str) -> List[str]:
+    """One CIK per line (with or without the CIK prefix / leading zeros), # comments allowed"""
+    ciks = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.split("#")[0].strip()
+        if line:
+            ciks.append(f"CIK{int(line.upper().replace('CIK', '')):010d}")
+    return ciks
+
+
+class CrawlScheduler:
+    """Crawl many funds at once.
+
+    - max_funds funds are processed concurrently; a slow or failing fund only holds its own worker thread
+    - max_filings caps in-flight SEC requests across all funds; every fund shares one session (connection pool),
+      one RateLimiter and one HttpCache, so the whole crawl stays under SEC's rate cap
+    - per-fund progress/failures are tracked in self.status and written to status_file as the crawl goes
+    """
+    def __init__(self, ciks: List[str], user_agent: str, form_type: str = "13f", dest: str = "csv",
+                 limit: Optional[int] = None, sync: bool = False, max_funds: int = 4, max_filings: int = 8,
+                 http_cache: Optional[HttpCache] = None, llm_factory: Optional[Callable] = None,
+                 status_file: str = "data/crawl_status.json", parse_workers: int = 1):
+        self.ciks = list(dict.fromkeys(ciks))
+        self.user_agent = user_agent
+        self.form_type = form_type
+        self.dest = dest
+        self.limit = limit
+        self.sync = sync
+        self.max_funds = max_funds
+        self.http_cache = http_cache
+        self.llm_factory = llm_factory # builds the 13G llm client, only called if a fund actually has 13G work
+        self.status_path = Path(status_file)
+        self.parse_workers = parse_workers # >1: 13F xml parsing in a process pool per fund
+
+        self.limiter = RateLimiter(max_in_flight=max_filings)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_filings, pool_maxsize=max_filings)
+        self.session.mount("https://", adapter)
+
+        self.status: Dict[str, dict] = {cik: {"state": "pending"} for cik in self.ciks}
+        self.lock = threading.Lock() # status + status file
+        self.save_lock = threading.Lock() # csv files / staging tables are shared, one writer at a time
+        self.llm_lock = threading.Lock() # guards lazy model load
+        self._llm = None
+
+    def _llm_client(self):
+        with self.llm_lock:
+            if self._llm is None:
+                llm = self.llm_factory()
+                # in-process models take one extraction at a time; server clients handle concurrent calls themselves
+                self._llm = llm if getattr(llm, "concurrent", False) else _SerializedLLM(llm)
+        return self._llm
+
+    def _update(self, cik: str, **fields):
+        with self.lock:
+            self.status[cik].update(fields)
+
+    def _save(self, data: List[dict], form_type: str):
+        from db.savers import save_13f_to_db, save_13g_to_db, save_to_csv
+        with self.save_lock:
+            if self.dest in ("csv", "both"):
+                save_to_csv(data, f"data/extracted_{form_type}.csv")
+            if self.dest in ("db", "both"):
+                (save_13f_to_db if form_type == "13f" else save_13g_to_db)(data)
+
+    def crawl_fund(self, cik: str) -> dict:
+        """Everything for one fund: submissions feed -> accessions -> parse -> save (-> advance sync mark)"""
+        start = time.time()
+        self._update(cik, state="running", started=start)
+        client = EdgarClient(cik, user_agent=self.user_agent, limiter=self.limiter, session=self.session, http_cache=self.http_cache)
+        submissions = client.get_submissions_feed()
+        form_types = ["13f", "13g"] if self.form_type == "all" else [self.form_type]
+
+        syncer = SubmissionsSync(client) if self.sync else None
+        for form_type in form_types:
+            if syncer is not None:
+                # incremental: only filings past the stored high-water mark, oldest first
+                filings = syncer.new_filings(submissions, form_type)[:self.limit]
+                accessions = [f["accession"] for f in filings]
+            else:
+                recent = submissions['filings']['recent']
+                if form_type == "13f":
+                    accessions = [a for a, f in zip(recent['accessionNumber'], recent['form']) if f == "13F-HR"]
+                else:
+                    accessions = [a for a, f in zip(recent['accessionNumber'], recent['form']) if f.startswith("SC 13G")]
+            if not accessions:
+                self._update(cik, **{f"n_{form_type}": 0})
+                continue
+
+            print(f"{cik}: processing {form_type.upper()} filings...")
+            if form_type == "13f":
+                parser = Form13FParser(client)
+                data = parser.parse_all(accessions, limit=self.limit, columnar=True, workers=self.parse_workers)
+            else:
+                parser = Form13GParser(client, self._llm_client())
+                data = parser.parse_all(accessions, limit=self.limit)
+            self._save(data, form_type)
+            if syncer is not None:
+                syncer.mark_done(form_type, filings, failed=parser.failed) # failed filings stay above the mark, retried next run
+            self._update(cik, **{f"n_{form_type}": len(data)})
+
+        self._update(cik, state="done", seconds=round(time.time() - start, 1))
+        return self.status[cik]
+
+    def _write_status(self):
+        with self.lock:
+            snapshot = json.dumps(self.status, indent=2)
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.status_path.with_suffix(".json.tmp")
+        tmp.write_text(snapshot, encoding="utf-8")
+        tmp.replace(self.status_path)
+
+    def run(self) -> Dict[str, dict]:
+        total = len(self.ciks)
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_funds) as pool:
+            futures = {pool.submit(self.crawl_fund, cik): cik for cik in self.ciks}
+            for fut in as_completed(futures):
+                cik = futures[fut]
+                try:
+                    fut.result()
+                    done += 1
+                except Exception as e:
+                    # fund-level failure: record it and keep crawling the rest
+                    failed += 1
+                    self._update(cik, state="failed", error=f"{type(e).__name__}: {e}")
+                    print(f"{cik}: FAILED {e}")
+                    traceback.print_exc()
+                print(f"[{done + failed}/{total}] funds finished ({failed} failed)")
+                self._write_status()
+        return self.status
+
+
+class _SerializedLLM:
+    """Funds run in threads but there's one in-process model: let one extraction through at a time"""
+    def __init__(self, llm):
+        self.llm = llm
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def extract_and_validate(self, *args, **kwargs):
+        with self.lock:
+            return self.llm.extract_and_validate(*args, **kwargs)
+
+    def extract_and_validate_batch(self, *args, **kwargs):
+        with self.lock:
+            return self.llm.extract_and_validate_batch(*args, **kwargs)
@@ -0,0 +1,104 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from edgar_client import EdgarClient
+
+FORM_MATCHERS = {
+    "13f": lambda form: form == "13F-HR",
+    "13g": lambda form: form.startswith("SC 13G"),
+}
+
+_STATE_LOCK = threading.Lock() # state file is shared by every fund in a process
+
+
+class SubmissionsSync:
+    """Incremental sync of a fund's filing list.
+
+    The submissions feed only has ~1000 filings in filings.recent; older ones are paged into filings.files shards
+    (https://data.sec.gov/submissions/CIK##########-submissions-001.json). We follow those shards for full history, and
+    persist a high-water mark per (cik, form type) in state_file so later runs only queue newer accessions:
+        {cik: {"13f": {"accession": ..., "filing_date": "yyyy-mm-dd", "seen_on_date": [accs filed that day]}}}
+    When nothing is new, a run costs the (revalidated) submissions feed request and nothing else.
+    """
+    SHARD_BASEURL = "https://data.sec.gov/submissions"
+
+    def __init__(self, client: EdgarClient, state_file: str = "cache/sync_state.json"):
+        self.client = client
+        self.state_path = Path(state_file)
+        self.state: Dict[str, Dict[str, dict]] = {}
+        if self.state_path.exists():
+            try:
+                self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            except Exception as e:
+                print(f"Error loading sync state {self.state_path}, starting fresh: {e}")
+
+    def high_water_mark(self, form_type: str) -> Optional[dict]:
+        return self.state.get(self.client.cik, {}).get(form_type)
+
+    @staticmethod
+    def _rows(block: Dict) -> Iterator[dict]:
+        """Columnar feed block (recent or a shard) -> row dicts, newest first like the feed"""
+        for acc, form, date in zip(block["accessionNumber"], block["form"], block["filingDate"]):
+            yield {"accession": acc, "form": form, "filing_date": date}
+
+    def iter_filings(self, submissions: Dict, since: Optional[str] = None) -> Iterator[dict]:
+        """All filings newest first: filings.recent, then each older shard.
+        since: filing date; shards that end before it are never fetched"""
+        yield from self._rows(submissions["filings"]["recent"])
+        for shard in submissions["filings"].get("files", []):
+            if since and shard.get("filingTo", "9999") < since:
+                continue
+            yield from self._rows(self.client.fetch_json_with_retry(f"{self.SHARD_BASEURL}/{shard['name']}"))
+
+    def new_filings(self, submissions: Dict, form_type: str) -> List[dict]:
+        """Filings of form_type ("13f"/"13g") newer than the high-water mark, OLDEST first, so a --limit'ed run
+        catches up in order and mark_done never skips past unprocessed filings"""
+        matches = FORM_MATCHERS[form_type]
+        hwm = self.high_water_mark(form_type)
+        new = []
+        for f in self.iter_filings(submissions, since=hwm["filing_date"] if hwm else None):
+            if hwm and f["filing_date"] < hwm["filing_date"]:
+                break # feed is newest first, everything after this is already ingested
+            if hwm and f["filing_date"] == hwm["filing_date"] and f["accession"] in hwm["seen_on_date"]:
+                continue
+            if matches(f["form"]):
+                new.append(f)
+        print(f"{self.client.cik} {form_type}: {len(new)} new filings since {hwm['filing_date'] if hwm else 'start'}")
+        return new[::-1]
+
+    def mark_done(self, form_type: str, filings: List[dict], failed: Iterable[str] = ()) -> None:
+        """Advance the high-water mark past processed filings (oldest first, as new_filings returns them) and persist it.
+        failed: accessions the parser couldn't process; the mark stops just before the oldest one so the next run retries
+        it (and re-queues the filings after it, which are cheap cache hits)"""
+        failed = {a.replace("-", "") for a in failed}
+        hwm = self.high_water_mark(form_type) or {"accession": None, "filing_date": "", "seen_on_date": []}
+        for f in filings:
+            if f["accession"].replace("-", "") in failed:
+                print(f"{self.client.cik} {form_type}: {f['accession']} failed, high-water mark stays at {hwm['filing_date'] or 'start'}")
+                break
+            if f["filing_date"] > hwm["filing_date"]:
+                hwm = {"accession": f["accession"], "filing_date": f["filing_date"], "seen_on_date": [f["accession"]]}
+            elif f["filing_date"] == hwm["filing_date"] and f["accession"] not in hwm["seen_on_date"]:
+                hwm["seen_on_date"].append(f["accession"])
+                hwm["accession"] = f["accession"]
+        if hwm["accession"] is None:
+            return
+        self.state.setdefault(self.client.cik, {})[form_type] = hwm
+        self._save()
+
+    def _save(self):
+        """Merge this fund's marks into the state file. Several funds can sync at once (scheduler), so re-read under a lock
+        and only overwrite our own cik"""
+        with _STATE_LOCK:
+            state = {}
+            if self.state_path.exists():
+                try:
+                    state = json.loads(self.state_path.read_text(encoding="utf-8"))
+                except Exception:
+                    pass
+            state[self.client.cik] = self.state.get(self.client.cik, {})
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(f".json.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+            tmp.replace(self.state_path)
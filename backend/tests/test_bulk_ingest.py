@@ -0,0 +1,92 @@
+import json
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from bulk_ingest import WorkItem, filter_forms, group_by_cik, iter_full_index, iter_submissions_zip, run_work_items
+
+'''python -m tests.test_bulk_ingest'''
+
+FORM_IDX = """Description:           Master Index of EDGAR Dissemination Feed by Form Type
+Last Data Received:    December 31, 2024
+Comments:              webmaster@sec.gov
+Anonymous FTP:         ftp://ftp.sec.gov/edgar/
+
+
+
+
+Form Type   Company Name                                                  CIK         Date Filed  File Name
+---------------------------------------------------------------------------------------------------------------------------------------------
+13F-HR      PRIMECAP MANAGEMENT CO/CA                                     763212      2024-11-12  edgar/data/763212/0001085146-24-005560.txt
+13F-HR/A    SOME OTHER MANAGER LLC                                        1000001     2024-11-13  edgar/data/1000001/0001000001-24-000001.txt
+SC 13G/A    PRIMECAP MANAGEMENT CO/CA                                     763212      2024-11-12  edgar/data/763212/0001085146-24-005552.txt
+"""
+
+MASTER_IDX = """Description:           Master Index of EDGAR Dissemination Feed
+Last Data Received:    December 31, 2024
+
+CIK|Company Name|Form Type|Date Filed|Filename
+--------------------------------------------------------------------------------
+763212|PRIMECAP MANAGEMENT CO/CA|13F-HR|2024-11-12|edgar/data/763212/0001085146-24-005560.txt
+1000002|A VERY LONG COMPANY NAME THAT OVERFLOWS ITS COLUMN IN FORM IDX INC|SC 13G|2024-10-01|edgar/data/1000002/0001000002-24-000007.txt
+"""
+
+
+class TestBulkIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_form_idx(self):
+        path = self.dir.joinpath("form.idx")
+        path.write_text(FORM_IDX)
+        items = list(iter_full_index(str(path)))
+        self.assertEqual(items[0], WorkItem("CIK0000763212", "13F-HR", "0001085146-24-005560", "2024-11-12"))
+        self.assertEqual(items[2].form, "SC 13G/A")
+        self.assertEqual([w.accession for w in filter_forms(items, "13f")], ["0001085146-24-005560"])
+
+    def test_master_idx(self):
+        path = self.dir.joinpath("master.idx")
+        path.write_text(MASTER_IDX)
+        items = list(iter_full_index(str(path)))
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items[1], WorkItem("CIK0001000002", "SC 13G", "0001000002-24-000007", "2024-10-01"))
+
+    def test_submissions_zip(self):
+        path = self.dir.joinpath("submissions.zip")
+        feed = {"cik": "763212", "filings": {"recent": {
+            "accessionNumber": ["0001085146-24-005560", "0001085146-24-005552"],
+            "form": ["13F-HR", "SC 13G/A"],
+            "filingDate": ["2024-11-12", "2024-11-12"]}}}
+        shard = {"accessionNumber": ["0001085146-12-000001"], "form": ["13F-HR"], "filingDate": ["2012-02-14"]}
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("CIK0000763212.json", json.dumps(feed))
+            zf.writestr("CIK0000763212-submissions-001.json", json.dumps(shard))
+            zf.writestr("CIK0001000001.json", json.dumps({"filings": {"recent": {"accessionNumber": [], "form": [], "filingDate": []}}}))
+        items = list(iter_submissions_zip(str(path), ciks=["CIK0000763212"]))
+        self.assertEqual(len(items), 3)
+        self.assertEqual(list(filter_forms(items, "13g"))[0].accession, "0001085146-24-005552")
+
+    def test_group_by_cik_spills_to_disk(self):
+        items = [WorkItem(f"CIK{(i * 7) % 5:010d}", "13F-HR", f"acc-{i}", "" if i % 2 else "2024-11-12") for i in range(23)]
+        grouped = list(group_by_cik(iter(items), chunk_size=4)) # 6 sorted runs merged back
+        self.assertEqual([cik for cik, _ in grouped], sorted({w.cik for w in items}))
+        for cik, group in grouped:
+            self.assertEqual(group, [w for w in items if w.cik == cik]) # input order kept, items round-trip intact
+
+    @patch.dict("sys.modules", {"db.savers": MagicMock()}) # no postgres here
+    @patch("parsers.f13_parser.Form13FParser.parse_all", return_value=[{"cusip": "02376R102"}])
+    def test_run_work_items_groups_by_fund(self, parse_all):
+        items = [WorkItem("CIK0000763212", "13F-HR", "a-1"), WorkItem("CIK0000000001", "13F-HR", "b-1"),
+                 WorkItem("CIK0000763212", "13F-HR", "a-2"), WorkItem("CIK0000763212", "13F-HR", "a-1")]
+        counts = run_work_items(items, "13f", user_agent="test agent", dest="csv")
+        self.assertEqual(counts, {"CIK0000000001": 1, "CIK0000763212": 1})
+        self.assertEqual(parse_all.call_args_list[1].args[0], ["a-1", "a-2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
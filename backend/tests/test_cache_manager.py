@@ -0,0 +1,128 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from cache_manager import CacheManager
+from llm.llm_cache import LLMCache, prompt_version
+from packed_cache import PackedCache
+
+'''python -m tests.test_cache_manager'''
+
+ROWS = [{"cusip": "02376R102", "value_dollar": 644295}]
+
+
+class TestCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = PackedCache(str(self.root.joinpath("packed")))
+        for acc in ("a", "b", "c"):
+            cache.put(acc, ROWS, version=1)
+        size = next(cache.entries()).size
+        manager = CacheManager("f13", cache, str(self.root.joinpath("stats.json")), max_bytes=2 * size)
+        manager.hit("a") # a is now newer than b
+        self.assertEqual(manager.flush(), {"expired": 0, "evicted": 1})
+        self.assertEqual(sorted(e.key for e in cache.entries()), ["a", "c"])
+        # survives a reopen: deletes are tombstones in the index
+        cache.close()
+        self.assertEqual(len(PackedCache(str(self.root.joinpath("packed")))), 2)
+
+    def test_age_limit_and_report(self):
+        cache = PackedCache(str(self.root.joinpath("packed")))
+        cache.put("old", ROWS, version=1)
+        cache.put("new", ROWS, version=1)
+        entry = cache.index["old"]
+        cache.index["old"] = entry._replace(cache_time=time.time() - 40 * 86400)
+        manager = CacheManager("f13", cache, str(self.root.joinpath("stats.json")), max_age_days=30)
+        manager.hit("new")
+        manager.miss("x")
+        report = manager.report()
+        self.assertEqual(report["age"]["30-90d"], 1)
+        self.assertEqual(report["hit_rate"], 0.5)
+        self.assertEqual(manager.flush(), {"expired": 1, "evicted": 0})
+        self.assertEqual([e.key for e in cache.entries()], ["new"])
+        # stats from another process' save are merged, not overwritten
+        other = CacheManager("f13", cache, str(self.root.joinpath("stats.json")))
+        other.hit("new")
+        other.save()
+        saved = json.loads(self.root.joinpath("stats.json").read_text())
+        self.assertEqual((saved["hits"], saved["misses"]), (2, 1))
+        cache.close()
+
+    def test_concurrent_saves_keep_every_count(self):
+        cache = PackedCache(str(self.root.joinpath("packed")))
+        cache.put("a", ROWS, version=1)
+        stats = str(self.root.joinpath("stats.json"))
+        managers = [CacheManager("f13", cache, stats) for _ in range(4)] # like 4 fund threads / processes
+        errors = []
+        def run(manager):
+            for _ in range(50):
+                manager.hit("a")
+                try:
+                    manager.save()
+                except Exception as e:
+                    errors.append(e)
+        threads = [threading.Thread(target=run, args=(m,)) for m in managers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(json.loads(self.root.joinpath("stats.json").read_text())["hits"], 200)
+        self.assertEqual(list(self.root.glob("*.tmp")), [])
+        cache.close()
+
+    def test_flush_compacts_evicted_bytes(self):
+        cache = PackedCache(str(self.root.joinpath("packed")))
+        for acc in ("a", "b", "c", "d"):
+            cache.put(acc, ROWS, version=1)
+        size = next(cache.entries()).size
+        manager = CacheManager("f13", cache, str(self.root.joinpath("stats.json")), max_bytes=size)
+        cache.compact_if_needed = lambda: PackedCache.compact_if_needed(cache, min_dead_bytes=1) # tiny test cache
+        result = manager.flush()
+        self.assertEqual((result["evicted"], result["compacted"]["kept"]), (3, 1))
+        self.assertEqual(cache.stats()["dead_bytes"], 0)
+        self.assertEqual(manager.flush(), {"expired": 0, "evicted": 0}) # nothing left to reclaim
+        cache.close()
+        self.assertEqual(len(PackedCache(str(self.root.joinpath("packed")))), 1)
+
+    def test_llm_cache_imports_v1_and_invalidates_by_tag(self):
+        legacy = self.root.joinpath("llm_cache.json")
+        legacy.write_text(json.dumps({"acc1": {"cusip": "02376R102"}})) # old flat format
+        db = str(self.root.joinpath("llm_cache.db"))
+        cache = LLMCache(db, legacy_json=str(legacy)) # empty db: imports the json
+        self.assertEqual(cache.get("acc1", prompt_version()), {"cusip": "02376R102"}) # stamped with the prompt at import
+        cache.set("acc2", {"cusip": "65290E101"}, model="qwen", prompt_version="abc")
+        cache.set("acc3", {"cusip": "65290E101"}, model="gpt", prompt_version="abc")
+
+        n = cache.manager.invalidate(lambda e: e.tags.get("model") == "qwen")
+        self.assertEqual(n, 1)
+        n = cache.manager.invalidate(lambda e: e.tags.get("model") is None) # imported v1 entries
+        self.assertEqual(n, 1)
+        reopened = LLMCache(db, legacy_json=str(legacy)) # not empty: no second import
+        self.assertEqual([e.tags["accession"] for e in reopened.entries()], ["acc3"])
+
+    def test_llm_cache_concurrent_writers(self):
+        db = str(self.root.joinpath("llm_cache.db"))
+        caches = [LLMCache(db, legacy_json=None) for _ in range(2)] # like two ingest processes on one file
+        def write(cache, start):
+            for i in range(start, start + 50):
+                cache.set(f"acc{i}", {"i": i})
+        threads = [threading.Thread(target=write, args=(c, k * 50)) for k, c in enumerate(caches)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(list(caches[0].entries())), 100)
+        self.assertEqual(caches[1].get("acc7"), {"i": 7})
+
+
+if __name__ == "__main__":
+    unittest.main()
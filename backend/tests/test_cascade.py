@@ -0,0 +1,70 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from data_models import FormGEntry
+from llm.base_llm_client import BaseLLMClient
+from llm.cascade_llm_client import CascadeLLMClient, escalation_reasons
+
+'''python -m tests.test_cascade'''
+
+GOOD = {"name_filer": "PRIMECAP Management Company", "report_date": "2024/09/30", "issuer": "American Airlines Group Inc.",
+        "cusip": "02376R102", "shares_owned": 57339666, "percent_of_class": 8.77, "voting_sole": 55507321,
+        "voting_shared": 0, "shares_dispo_sole": 57339666, "shares_dispo_shared": 0}
+
+
+class Tier(BaseLLMClient):
+    """answers from a dict keyed by filing text; a missing key = unparseable output"""
+    def __init__(self, name, answers):
+        self.model_name = name
+        self.answers = answers
+        self.seen = []
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1):
+        self.seen.append(file_text)
+        if file_text not in self.answers:
+            raise ValueError("no json")
+        return entry_model(**self.answers[file_text]).model_dump()
+
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log = Path(tmp.name).joinpath("cascade.jsonl")
+        self.small = Tier("qwen3-1.7b", {
+            "easy": GOOD,
+            "typo": {**GOOD, "cusip": "02376R103"}, # wrong check digit
+            "over": {**GOOD, "voting_sole": GOOD["shares_owned"] + 1},
+        })
+        self.large = Tier("qwen3-14b", {"typo": GOOD, "over": GOOD, "hard": GOOD})
+        self.llm = CascadeLLMClient(self.small, self.large, log_file=str(self.log))
+
+    def test_checks(self):
+        self.assertEqual(escalation_reasons(GOOD), [])
+        self.assertEqual(escalation_reasons({**GOOD, "cusip": "02376R103"}), ["cusip check digit"])
+        self.assertEqual(escalation_reasons({**GOOD, "percent_of_class": 877.0}), ["percent_of_class out of range"])
+        self.assertEqual(escalation_reasons({**GOOD, "issuer": " "}), ["issuer empty"])
+        self.assertEqual(escalation_reasons({**GOOD, "cusip": "02376R103"}, checks=("consistency",)), [])
+
+    def test_only_failures_escalate(self):
+        results = self.llm.extract_and_validate_batch(["easy", "typo", "over", "hard", "junk"], entry_model=FormGEntry)
+        self.assertEqual(results[:4], [GOOD] * 4)
+        self.assertIsInstance(results[4], Exception) # both tiers failed
+        self.assertEqual(self.large.seen, ["typo", "over", "hard", "junk"])
+        stats = self.llm.report()
+        self.assertEqual((stats["small_ok"], stats["escalated"], stats["large_ok"], stats["failed"]), (1, 4, 3, 1))
+        self.assertEqual(stats["reasons"], {"cusip check digit": 1, "voting_sole + voting_shared > shares_owned": 1, "invalid": 2})
+        lines = [json.loads(line) for line in self.log.read_text().splitlines()]
+        self.assertEqual([line["tier"] for line in lines], ["small", "large", "large", "large", "large"])
+
+    def test_single_call_and_cache_key(self):
+        self.assertEqual(self.llm.extract_and_validate("easy", entry_model=FormGEntry), GOOD)
+        self.assertEqual(self.large.seen, [])
+        self.assertEqual(self.llm.model_name, "cascade:qwen3-1.7b>qwen3-14b")
+        with self.assertRaises(ValueError):
+            self.llm.extract_and_validate("junk", entry_model=FormGEntry)
+
+
+if __name__ == "__main__":
+    unittest.main()
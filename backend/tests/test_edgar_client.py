@@ -0,0 +1,138 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+from edgar_client import EdgarClient, RateLimiter
+from http_cache import HttpCache
+
+'''python -m tests.test_edgar_client'''
+
+
+def _response(status, content=b"", headers=None):
+    r = MagicMock()
+    r.status_code = status
+    r.content = content
+    r.headers = headers or {}
+    return r
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_caps_rate(self):
+        limiter = RateLimiter(max_rate=20)
+        limiter.tokens = 0 # start empty so burst doesn't hide the rate
+        start = time.monotonic()
+        for _ in range(10):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+
+    def test_slow_down_is_global(self):
+        limiter = RateLimiter(max_rate=8)
+        limiter.slow_down(attempt=0) # pause ~1s
+        self.assertEqual(limiter.rate, 4)
+        self.assertGreater(limiter.paused_until, time.monotonic())
+        limiter.recover()
+        self.assertAlmostEqual(limiter.rate, 4.1)
+
+
+class TestEdgarClientFetch(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.session.headers = {}
+        self.client = EdgarClient("CIK0000763212", "test agent", limiter=RateLimiter(max_rate=1000), session=self.session)
+
+    def test_retry_signals_limiter(self):
+        self.client.limiter = MagicMock()
+        self.session.get.side_effect = [_response(429), _response(200, content=b'{"ok": 1}')]
+        self.assertEqual(self.client.fetch_json_with_retry("https://example.com/x.json"), {"ok": 1})
+        self.client.limiter.slow_down.assert_called_once_with(1)
+
+    def test_fetch_many_yields_all_and_isolates_errors(self):
+        def get(url):
+            if url.endswith("bad.xml"):
+                return _response(404)
+            return _response(200, content=url.encode())
+        self.session.get.side_effect = lambda url, **kwargs: get(url)
+        reqs = [(f"acc{i}", "infotable.xml") for i in range(20)] + [("acc_bad", "bad.xml")]
+        results = {(acc, name): out for acc, name, out in self.client.fetch_many(reqs, max_workers=4)}
+        self.assertEqual(len(results), 21)
+        self.assertTrue(results[("acc3", "infotable.xml")].endswith(b"/acc3/infotable.xml"))
+        self.assertIsInstance(results[("acc_bad", "bad.xml")], Exception)
+
+
+class TestFilingManifest(unittest.TestCase):
+    INDEX = {"directory": {"item": [
+        {"name": "0001085146-24-005552-index.html", "size": "", "last-modified": "2024-11-12 10:00:00"},
+        {"name": "primary_doc.xml", "size": "2000", "last-modified": "2024-11-12 10:00:00"},
+        {"name": "infotable.xml", "size": "90000", "last-modified": "2024-11-12 10:00:00"},
+        {"name": "nxt_111124.htm", "size": "30000", "last-modified": "2024-11-11 16:05:12"},
+    ]}}
+
+    def test_index_fetched_once(self):
+        session = MagicMock()
+        session.headers = {}
+        session.get.return_value = _response(200, content=json.dumps(self.INDEX).encode())
+        client = EdgarClient("CIK0000763212", "test agent", limiter=RateLimiter(max_rate=1000), session=session)
+        manifest = client.get_manifest("000108514624005552")
+        self.assertEqual(client.get_primary_doc_name_date("000108514624005552"), ("nxt_111124.htm", "2024-11-11"))
+        self.assertEqual(manifest.infotable_file, "infotable.xml")
+        self.assertEqual(manifest.sizes["infotable.xml"], 90000)
+        self.assertEqual(manifest.url("infotable.xml"), "https://www.sec.gov/Archives/edgar/data/763212/000108514624005552/infotable.xml")
+        self.assertEqual(session.get.call_count, 1)
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.session = MagicMock()
+        self.session.headers = {}
+        self.cache = HttpCache(self.tmp.name)
+        self.client = EdgarClient("CIK0000763212", "test agent", limiter=RateLimiter(max_rate=1000),
+                                  session=self.session, http_cache=self.cache)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_archived_files_never_refetched(self):
+        self.session.get.return_value = _response(200, content=b"<xml/>")
+        self.assertEqual(self.client.fetch_file("000108514624005552", "infotable.xml"), b"<xml/>")
+        # new cache object over the same dir, like a second run
+        self.client.http_cache = HttpCache(self.tmp.name)
+        self.assertEqual(self.client.fetch_file("000108514624005552", "infotable.xml"), b"<xml/>")
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertEqual(self.client.http_cache.stats["hits"], 1)
+
+    def test_submissions_revalidated_with_etag(self):
+        self.session.get.return_value = _response(200, content=b'{"cik": 1}', headers={"ETag": '"abc"'})
+        self.client.get_submissions_feed()
+        self.session.get.return_value = _response(304)
+        self.assertEqual(self.client.get_submissions_feed(), {"cik": 1})
+        self.assertEqual(self.session.get.call_args.kwargs["headers"], {"If-None-Match": '"abc"'})
+        self.assertEqual(self.cache.stats["revalidated"], 1)
+
+    def test_size_bound_evicts_lru(self):
+        cache = HttpCache(self.tmp.name, max_bytes=10)
+        cache.put("https://a", b"123456", {})
+        cache.put("https://b", b"123456", {})
+        self.assertIsNone(cache.lookup("https://a"))
+        self.assertIsNotNone(cache.lookup("https://b"))
+        self.assertLessEqual(cache.total_bytes, 10)
+
+    def test_interleaved_writers_keep_whole_bodies(self):
+        # two processes (same thread id) downloading the same url into one cache dir
+        url = "https://www.sec.gov/Archives/edgar/data/763212/000108514624005552/infotable.xml"
+        writers = [HttpCache(self.tmp.name).put_stream(url, [chunk] * 3, {}) for chunk in (b"aaaa", b"bb")]
+        for _ in range(3):
+            for w in writers:
+                next(w)
+        for w in writers:
+            self.assertEqual(list(w), [])
+        body, meta = HttpCache(self.tmp.name).lookup(url)
+        self.assertIn(body, (b"a" * 12, b"b" * 6)) # one download or the other, never a mix
+        self.assertEqual(meta["size"], len(body))
+        self.assertEqual(list(Path(self.tmp.name).glob("*.tmp")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
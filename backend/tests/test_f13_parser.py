@@ -0,0 +1,192 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+import io
+from parsers.f13_parser import Form13FParser, iter_infotable_rows, parse_infotable_xml
+from parsers.columnar import HoldingsBatch, COLUMNS
+from parsers.f13_text_parser import iter_text_table_rows, parse_text_table, legacy_table_file
+from analytics import percent_of_portfolio, top_holdings
+
+'''python -m tests.test_f13_parser'''
+
+INFOTABLE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<informationTable xmlns="http://www.sec.gov/edgar/document/thirteenf/informationtable">
+  <infoTable>
+    <nameOfIssuer>AMERICAN AIRLINES GROUP INC</nameOfIssuer><titleOfClass>COM</titleOfClass><cusip>02376R102</cusip>
+    <value>644295</value><shrsOrPrnAmt><sshPrnamt>57339666</sshPrnamt><sshPrnamtType>SH</sshPrnamtType></shrsOrPrnAmt>
+    <investmentDiscretion>SOLE</investmentDiscretion>
+    <votingAuthority><Sole>55507321</Sole><Shared>0</Shared><None>1832345</None></votingAuthority>
+  </infoTable>
+  <infoTable>
+    <nameOfIssuer>NEXTRACKER INC</nameOfIssuer><titleOfClass>CL A</titleOfClass><cusip>65290E101</cusip>
+    <value>294025</value><shrsOrPrnAmt><sshPrnamt>7844407</sshPrnamt><sshPrnamtType>SH</sshPrnamtType></shrsOrPrnAmt>
+    <investmentDiscretion>SOLE</investmentDiscretion>
+    <votingAuthority><Sole>7475943</Sole><Shared>0</Shared><None>368464</None></votingAuthority>
+  </infoTable>
+</informationTable>
+"""
+META = ("000108514624005560", "2024-11-12", "CIK0000763212", "https://www.sec.gov/Archives/edgar/data/763212/000108514624005560/infotable.xml")
+
+
+class TestForm13FParser(unittest.TestCase):
+    def test_stream_matches_tree(self):
+        tree_rows = parse_infotable_xml(INFOTABLE, *META)
+        # tiny chunks so elements are split across feeds
+        chunks = (INFOTABLE[i:i + 37] for i in range(0, len(INFOTABLE), 37))
+        stream_rows = list(iter_infotable_rows(chunks, *META))
+        self.assertEqual(len(tree_rows), 2)
+        self.assertEqual(stream_rows, tree_rows)
+        self.assertEqual(stream_rows[0]["shares_owned"], 57339666)
+        self.assertEqual(stream_rows[1]["class"], "CL A")
+
+    def test_no_namespace(self):
+        xml = INFOTABLE.replace(b' xmlns="http://www.sec.gov/edgar/document/thirteenf/informationtable"', b"")
+        self.assertEqual(parse_infotable_xml(xml, *META)[0]["cusip"], "02376R102")
+        self.assertEqual(list(iter_infotable_rows([xml], *META))[1]["cusip"], "65290E101")
+
+    def test_parser_streams_from_client(self):
+        client = MagicMock()
+        client.cik = "CIK0000763212"
+        client.get_manifest.return_value.infotable_file = "infotable.xml"
+        client.get_manifest.return_value.report_date = "2024-11-12"
+        client.iter_file_chunks.return_value = iter([INFOTABLE])
+        rows = Form13FParser(client).parse_primary_doc("000108514624005560")
+        self.assertEqual(len(rows), 2)
+        client.fetch_file.assert_not_called()
+
+
+    def test_parallel_parse_all_keeps_order_and_isolates_errors(self):
+        client = MagicMock()
+        client.cik = "CIK0000763212"
+        client.get_manifest.return_value.infotable_file = "infotable.xml"
+        client.get_manifest.return_value.report_date = "2024-11-12"
+        client.get_manifest.return_value.url.return_value = META[3] # args go to the process pool, must pickle
+        def fetch_file(acc, filename):
+            if acc == "acc3":
+                return b"<not xml"
+            return INFOTABLE
+        client.fetch_file.side_effect = fetch_file
+        accs = [f"acc{i}" for i in range(8)]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        packed, legacy = str(Path(tmp.name).joinpath("packed")), tmp.name
+        with patch.object(Form13FParser, "CACHE_DIR", packed), patch.object(Form13FParser, "LEGACY_CACHE_DIR", legacy):
+            parser = Form13FParser(client)
+            rows = parser.parse_all(accs, use_cache=False, workers=2)
+            parser.cache.close()
+        self.assertEqual(len(rows), 2 * 7)
+        self.assertEqual([r["accession_number"] for r in rows[::2]], [a for a in accs if a != "acc3"])
+
+
+LEGACY_TXT = b"""<DOCUMENT>
+<TYPE>13F-HR
+FORM 13F INFORMATION TABLE
+Form 13F File Number: 28-01234     Phone: 626-304-9222
+
+<TABLE>
+<CAPTION>
+                                                      VALUE     SHARES/   SH/ PUT/ INVSTMT  OTHER        VOTING AUTHORITY
+NAME OF ISSUER               TITLE OF CLASS  CUSIP    (x$1000)  PRN AMT   PRN CALL DSCRETN  MANAGERS   SOLE     SHARED   NONE
+---------------------------- -------------- --------- --------- --------- --- ---- -------- -------- -------- -------- --------
+<S>                          <C>            <C>       <C>       <C>       <C> <C>  <C>      <C>      <C>      <C>      <C>
+ABBOTT LABS                  COM            002824100    23,775   370,200 SH       SOLE               367,900           2,300
+AMGEN INC                    COM            031162100   615,213 9,023,365 SH       SOLE               8,746,265  12,000  265,100
+BANK OF NEW YORK MELLON CORP COM            064058100     1,103    49,951 SH  CALL DEFINED  1,2          49,951
+</TABLE>
+</DOCUMENT>
+"""
+PIPE_TXT = b"""NAME OF ISSUER|TITLE OF CLASS|CUSIP|VALUE|SHARES|SH/PRN|PUT/CALL|DISCRETION|MANAGERS|SOLE|SHARED|NONE
+ADOBE SYS INC|COM|00724F 10 1|8,196|238,900|SH||SOLE||238,900|0|0
+"""
+LEGACY_META = ("000104746912006030", "2012-08-14", "CIK0000763212",
+               "https://www.sec.gov/Archives/edgar/data/763212/000104746912006030/a2209625z13f-hr.txt")
+
+
+class TestLegacyTextTable(unittest.TestCase):
+    def test_fixed_width(self):
+        rows = parse_text_table(LEGACY_TXT, *LEGACY_META)
+        self.assertEqual([r["cusip"] for r in rows], ["002824100", "031162100", "064058100"])
+        self.assertEqual(set(rows[0]), set(COLUMNS)) # same schema as the xml rows
+        self.assertEqual(rows[0]["issuer"], "ABBOTT LABS")
+        self.assertEqual(rows[0]["class"], "COM")
+        self.assertEqual(rows[0]["value_dollar"], 23775)
+        self.assertEqual(rows[0]["shares_owned"], 370200)
+        # blank shared column: numbers land under the right headers
+        self.assertEqual((rows[0]["voting_sole"], rows[0]["voting_shared"], rows[0]["voting_none"]), ("367900", None, "2300"))
+        self.assertEqual((rows[1]["voting_sole"], rows[1]["voting_shared"], rows[1]["voting_none"]), ("8746265", "12000", "265100"))
+        self.assertEqual(rows[2]["issuer"], "BANK OF NEW YORK MELLON CORP")
+        self.assertEqual(rows[2]["discretion"], "DEFINED")
+        self.assertEqual(rows[2]["voting_sole"], "49951")
+
+    def test_stream_matches_whole_doc(self):
+        chunks = (LEGACY_TXT[i:i + 29] for i in range(0, len(LEGACY_TXT), 29))
+        self.assertEqual(list(iter_text_table_rows(chunks, *LEGACY_META)), parse_text_table(LEGACY_TXT, *LEGACY_META))
+
+    def test_pipe_delimited(self):
+        rows = parse_text_table(PIPE_TXT, *LEGACY_META)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]["issuer"], rows[0]["class"], rows[0]["cusip"]), ("ADOBE SYS INC", "COM", "00724F101"))
+        self.assertEqual((rows[0]["value_dollar"], rows[0]["voting_sole"], rows[0]["voting_none"]), (8196, "238900", "0"))
+
+    def test_parser_falls_back_to_text(self):
+        client = MagicMock()
+        client.cik = "CIK0000763212"
+        manifest = client.get_manifest.return_value
+        manifest.infotable_file = None
+        manifest.acc = "000104746912006030"
+        manifest.report_date = "2012-08-14"
+        manifest.find.return_value = ["0001047469-12-006030.txt", "a2209625z13f-hr.txt"]
+        manifest.url.side_effect = lambda f: f"https://www.sec.gov/Archives/edgar/data/763212/000104746912006030/{f}"
+        self.assertEqual(legacy_table_file(manifest), "a2209625z13f-hr.txt")
+        client.iter_file_chunks.return_value = iter([LEGACY_TXT])
+        rows = Form13FParser(client).parse_primary_doc("000104746912006030")
+        self.assertEqual(len(rows), 3)
+        client.iter_file_chunks.assert_called_with("000104746912006030", "a2209625z13f-hr.txt")
+        self.assertTrue(rows[0]["primary_doc_url"].endswith("a2209625z13f-hr.txt"))
+
+
+class TestHoldingsBatch(unittest.TestCase):
+    def setUp(self):
+        self.rows = parse_infotable_xml(INFOTABLE, *META)
+        other = ("000108514625000001",) + META[1:]
+        self.rows += parse_infotable_xml(INFOTABLE, *other)[:1]
+        self.batch = HoldingsBatch.from_rows(self.rows)
+
+    def test_roundtrip(self):
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual(len(self.batch.filings), 2) # constants stored once per filing
+        self.assertEqual(len(self.batch.categories["issuer"]), 2) # dictionary encoded
+        back = self.batch.to_rows()
+        self.assertEqual(list(back[0]), COLUMNS)
+        self.assertEqual(back[1]["issuer"], "NEXTRACKER INC")
+        self.assertEqual(back[0]["voting_none"], 1832345)
+        self.assertEqual(back[2]["accession_number"], "000108514625000001")
+
+    def test_concat_and_csv(self):
+        batch = HoldingsBatch.concat([self.batch, HoldingsBatch.from_rows(self.rows[:1])])
+        self.assertEqual(len(batch), 4)
+        out = io.StringIO()
+        n = batch.write_csv(out, skip_accessions={"000108514625000001"})
+        self.assertEqual(n, 3)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], ",".join(COLUMNS))
+        self.assertIn(",02376R102,,644295,57339666,SH,SOLE,55507321,0,1832345,", lines[1])
+
+    def test_analytics(self):
+        pct = percent_of_portfolio(self.batch)
+        self.assertAlmostEqual(pct[0] + pct[1], 100.0)
+        self.assertAlmostEqual(pct[2], 100.0)
+        top = top_holdings(self.batch, META[0], n=1)
+        self.assertEqual(top[0]["cusip"], "02376R102")
+
+    def test_top_holdings_missing_value(self):
+        rows = [dict(r) for r in self.rows[:2]]
+        rows[0]["value_dollar"] = None
+        top = top_holdings(HoldingsBatch.from_rows(rows), META[0])
+        self.assertEqual([t["cusip"] for t in top], [rows[1]["cusip"], "02376R102"]) # missing value last, not largest
+        self.assertEqual((top[1]["value_dollar"], top[1]["percent_of_portfolio"]), (None, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,35 @@
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock
+from llm.llm_cache import LLMCache
 from parsers.g13_parser import Form13GParser
+from parsers.g13_rules import extract_cover_page, extract_13g, valid_cusip
+from parsers.g13_prefilter import budget_13g_text, select_13g_sections, value_recall
 
 '''python -m tests.test_g13_parser'''
+
+
+def mock_llm(model_name: str = "qwen") -> MagicMock:
+    """LLM client mock with real values for the attributes Form13GParser reads"""
+    llm = MagicMock()
+    llm.model_name = model_name
+    llm.max_input_tokens = None # parser default budget
+    llm.tokenizer = None # char estimate
+    llm.batch_size = 1
+    llm.batch_job = False
+    return llm
+
+
 class TestForm13GParser(unittest.TestCase):
     def setUp(self):
         # Mock EdgarClient and LLMClient
         self.mock_client = MagicMock()
-        self.mock_llm = MagicMock()
-        self.parser = Form13GParser(self.mock_client, self.mock_llm)
+        self.mock_llm = mock_llm()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = LLMCache(str(Path(tmp.name).joinpath("llm_cache.db")), legacy_json=None) # not the checkout's llm/llm_cache.db
+        self.parser = Form13GParser(self.mock_client, self.mock_llm, cache=cache)
 
     def test_prefilter_html(self):
         html = """
@@ -55,5 +76,202 @@ class TestForm13GParser(unittest.TestCase):
             self.assertIn("sole dispositive power", filtered)
             self.assertIn("aggregate amount", filtered)
 
+class TestCacheFirst(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = LLMCache(str(Path(self.tmp.name).joinpath("llm_cache.db")), legacy_json=None)
+        self.extracted = {"issuer": "Test Corp", "cusip": "123456789", "shares_owned": 10000}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _parser(self, model_name="qwen", html=b"<html><body>Schedule 13G Test Corp</body></html>"):
+        client = MagicMock()
+        client.cik = "CIK0000763212"
+        client.get_manifest.return_value.primary_doc = "doc.htm"
+        client.fetch_file.return_value = html
+        llm = mock_llm(model_name)
+        llm.extract_and_validate.return_value = self.extracted
+        return Form13GParser(client, llm, cache=self.cache)
+
+    def test_rerun_does_no_io(self):
+        first = self._parser()
+        self.assertEqual(first.parse_primary_doc("acc1")["issuer"], "Test Corp")
+        first.llm.extract_and_validate.assert_called_once()
+
+        again = self._parser()
+        filing = again.parse_primary_doc("acc1")
+        self.assertEqual((filing["primary_doc"], filing["cusip"]), ("doc.htm", "123456789"))
+        again.client.get_manifest.assert_not_called()
+        again.client.fetch_file.assert_not_called()
+        again.llm.extract_and_validate.assert_not_called()
+
+    def test_same_content_other_accession_reuses_output(self):
+        self._parser().parse_primary_doc("acc1")
+        other = self._parser()
+        self.assertEqual(other.parse_primary_doc("acc2")["accession_number"], "acc2")
+        other.client.fetch_file.assert_called_once() # needs the text to hash it...
+        other.llm.extract_and_validate.assert_not_called() # ...but not the llm
+
+    def _import_legacy(self):
+        legacy = Path(self.tmp.name).joinpath("llm_cache.json")
+        legacy.write_text('{"acc1": {"issuer": "Old Corp", "cusip": "123456789", "shares_owned": 5}}') # v1: no prompt/model
+        self.cache = LLMCache(str(Path(self.tmp.name).joinpath("imported.db")), legacy_json=str(legacy)) # auto import
+
+    def test_legacy_import_is_not_resent(self):
+        self._import_legacy()
+        parser = self._parser()
+        self.assertEqual(parser.parse_primary_doc("acc1")["issuer"], "Old Corp")
+        parser.llm.extract_and_validate.assert_not_called()
+        # now stored under the current prompt + model, with its primary doc: the next run does no I/O
+        entry = self.cache.get_entry("acc1", parser.prompt_version, "qwen", legacy=False)
+        self.assertEqual((entry["data"]["issuer"], entry["primary_doc"]), ("Old Corp", "doc.htm"))
+
+    def test_legacy_import_misses_after_prompt_change(self):
+        self._import_legacy()
+        parser = self._parser()
+        parser.prompt_version = "edited" # prompt.txt changed since the import
+        self.assertEqual(parser.parse_primary_doc("acc1")["issuer"], "Test Corp")
+        parser.llm.extract_and_validate.assert_called_once()
+
+    def test_model_or_prompt_change_misses(self):
+        self._parser().parse_primary_doc("acc1")
+        new_model = self._parser(model_name="gpt-4o")
+        new_model.parse_primary_doc("acc1")
+        new_model.llm.extract_and_validate.assert_called_once()
+
+        new_prompt = self._parser()
+        new_prompt.prompt_version = "edited"
+        new_prompt.parse_primary_doc("acc1")
+        new_prompt.llm.extract_and_validate.assert_called_once()
+        # the original prompt/model row is untouched
+        self.assertIsNotNone(self.cache.get("acc1", self._parser().prompt_version, "qwen"))
+
+    def test_parse_all_batches_llm_calls(self):
+        self._parser().parse_primary_doc("acc2") # cached, stays out of the batch
+        docs = {f"acc{i}": f"<html><body>Schedule 13G Corp {i}</body></html>".encode() for i in range(1, 6)}
+        parser = self._parser()
+        parser.client.fetch_file.side_effect = lambda acc, doc: docs[acc]
+        parser.llm.batch_size = 2
+        parser.llm.extract_and_validate_batch.side_effect = lambda texts, **kw: [
+            ValueError("bad json") if "Corp 4" in t else {**self.extracted, "issuer": t.split()[-1]} for t in texts]
+
+        data = parser.parse_all(["acc-1", "acc-2", "acc-3", "acc-4", "acc-5"])
+        self.assertEqual([d["accession_number"] for d in data], ["acc1", "acc2", "acc3", "acc5"]) # input order, failed one dropped
+        self.assertEqual(data[0]["issuer"], "1")
+        parser.llm.extract_and_validate.assert_not_called()
+        texts = parser.llm.extract_and_validate_batch.call_args.args[0]
+        self.assertEqual(len(texts), 4) # one call for the whole window
+        self.assertEqual(parser.stats["llm"], 4)
+        self.assertIsNone(self.cache.get("acc4", parser.prompt_version, "qwen"))
+        self.assertEqual(parser.failed, ["acc4"])
+
+    def test_parse_all_batch_error_fails_only_its_window(self):
+        self._parser().parse_primary_doc("acc1") # cached: must survive the failed llm call
+        docs = {f"acc{i}": f"<html><body>Schedule 13G Corp {i}</body></html>".encode() for i in range(1, 4)}
+        parser = self._parser()
+        parser.client.fetch_file.side_effect = lambda acc, doc: docs[acc]
+        parser.llm.batch_size = 2
+        parser.llm.extract_and_validate_batch.side_effect = RuntimeError("CUDA out of memory")
+
+        data = parser.parse_all(["acc-1", "acc-2", "acc-3"])
+        self.assertEqual([d["accession_number"] for d in data], ["acc1"])
+        self.assertEqual(parser.failed, ["acc2", "acc3"])
+
+
+COVER = """SCHEDULE 13G Under the Securities Exchange Act of 1934 (Amendment No. 12)* American Airlines Group Inc. (Name of Issuer)
+Common Stock (Title of Class of Securities) 02376R102 (CUSIP Number) September 30, 2024 (Date of Event Which Requires Filing
+of this Statement) CUSIP No. 02376R102 1 NAMES OF REPORTING PERSONS I.R.S. IDENTIFICATION NOS. OF ABOVE PERSONS (ENTITIES ONLY)
+PRIMECAP Management Company 2 CHECK THE APPROPRIATE BOX IF A MEMBER OF A GROUP (a) (b) 3 SEC USE ONLY 4 CITIZENSHIP OR PLACE OF
+ORGANIZATION Delaware NUMBER OF SHARES BENEFICIALLY OWNED BY EACH REPORTING PERSON WITH 5 SOLE VOTING POWER 55,507,321
+6 SHARED VOTING POWER -0- 7 SOLE DISPOSITIVE POWER 57,339,666 8 SHARED DISPOSITIVE POWER -0- 9 AGGREGATE AMOUNT BENEFICIALLY
+OWNED BY EACH REPORTING PERSON 57,339,666 10 CHECK BOX IF THE AGGREGATE AMOUNT IN ROW (9) EXCLUDES CERTAIN SHARES
+11 PERCENT OF CLASS REPRESENTED BY AMOUNT IN ROW (9) 8.77% 12 TYPE OF REPORTING PERSON IA
+Item 1(a). Name of Issuer: American Airlines Group Inc. Item 1(b). Address of Issuer's Principal Executive Offices"""
+
+
+class TestCoverPageRules(unittest.TestCase):
+    def test_standard_cover_page(self):
+        data = extract_13g(COVER)
+        # same answer the llm gave for this filing (llm/llm_cache.json, 000108514624005552)
+        self.assertEqual(data, {"name_filer": "PRIMECAP Management Company", "report_date": "2024/09/30",
+                                "issuer": "American Airlines Group Inc.", "cusip": "02376R102", "shares_owned": 57339666,
+                                "percent_of_class": 8.77, "voting_sole": 55507321, "voting_shared": 0,
+                                "shares_dispo_sole": 57339666, "shares_dispo_shared": 0})
+
+    def test_inconsistent_or_incomplete_goes_to_llm(self):
+        bad = COVER.replace("6 SHARED VOTING POWER -0-", "6 SHARED VOTING POWER 9,000,000")
+        fields, confidence, problems = extract_cover_page(bad)
+        self.assertIn("voting_sole + voting_shared > shares_owned", problems)
+        self.assertLess(confidence, 0.9)
+        self.assertIsNone(extract_13g(bad))
+        # blank row: the row number of the next line must not be read as the value
+        blank = COVER.replace("5 SOLE VOTING POWER 55,507,321", "5 SOLE VOTING POWER")
+        self.assertNotIn("voting_sole", extract_cover_page(blank)[0])
+        self.assertIsNone(extract_13g(blank))
+
+    def test_cusip_check_digit(self):
+        self.assertTrue(valid_cusip("02376R102"))
+        self.assertTrue(valid_cusip("65290E101"))
+        self.assertFalse(valid_cusip("02376R103"))
+
+    def test_parser_skips_llm_for_standard_cover(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        client = MagicMock()
+        client.cik = "CIK0000763212"
+        client.get_manifest.return_value.primary_doc = "doc.htm"
+        client.fetch_file.return_value = ("<html><body>" + COVER + "</body></html>").encode()
+        llm = mock_llm()
+        parser = Form13GParser(client, llm, cache=LLMCache(str(Path(tmp.name).joinpath("c.db")), legacy_json=None))
+        filing = parser.parse_primary_doc("000108514624005552")
+        self.assertEqual(filing["shares_owned"], 57339666)
+        llm.extract_and_validate.assert_not_called()
+        self.assertEqual(parser.stats["rules"], 1)
+        parser.parse_primary_doc("000108514624005552") # rule result is cached too
+        self.assertEqual(parser.stats["cache"], 1)
+        client.fetch_file.assert_called_once()
+
+
+FILING_HTML = """<html><body>
+<p>SCHEDULE 13G</p><p>American Airlines Group Inc.</p><p>(Name of Issuer)</p>
+<table>
+<tr><td>1</td><td>NAMES OF REPORTING PERSONS</td><td>PRIMECAP Management Company</td></tr>
+<tr><td>5</td><td>SOLE VOTING POWER</td><td>55,507,321</td></tr>
+<tr><td>9</td><td>AGGREGATE AMOUNT BENEFICIALLY OWNED BY EACH REPORTING PERSON</td><td>57,339,666</td></tr>
+</table>
+<p>Item 1(a). Name of Issuer: American Airlines Group Inc.</p>
+<p>Item 3. If this statement is filed pursuant to Rule 13d-1(b) ... LONG BOILERPLATE</p>
+<p>Item 4. Ownership: see cover page rows 5 through 11</p>
+<p>Item 7. Identification and Classification of the Subsidiary: Not applicable. MORE BOILERPLATE</p>
+<p>Item 10. Certification</p><p>By signing below I certify ...</p><p>Signature</p><p>Exhibit 99 joint filing agreement</p>
+</body></html>"""
+
+
+class TestPrefilterBudget(unittest.TestCase):
+    def test_keeps_cover_rows_and_items(self):
+        parser = Form13GParser(MagicMock(), mock_llm(), cache=MagicMock())
+        text, report = parser.llm_input(FILING_HTML.encode())
+        self.assertIn("5 | SOLE VOTING POWER | 55,507,321", text) # table rows stay rows
+        self.assertIn("Item 4. Ownership", text)
+        self.assertIn("Item 1(a). Name of Issuer", text)
+        self.assertNotIn("Item 3.", text)
+        self.assertNotIn("Item 7.", text)
+        self.assertNotIn("Exhibit 99", text)
+        self.assertLess(report["kept_tokens"], report["raw_tokens"])
+        recall, missing = value_recall(text, {"name_filer": "PRIMECAP Management Company", "voting_sole": 55507321,
+                                              "shares_owned": 57339666, "voting_shared": 0})
+        self.assertEqual((recall, missing), (1.0, []))
+
+    def test_token_budget_and_fallback(self):
+        self.assertEqual(select_13g_sections("no items here"), "no items here")
+        tokenizer = MagicMock() # word-level stand-in for the model tokenizer
+        tokenizer.encode.side_effect = lambda t, add_special_tokens=False: t.split()
+        tokenizer.decode.side_effect = lambda ids, skip_special_tokens=True: " ".join(ids)
+        text, report = budget_13g_text("Schedule 13G " + "word " * 100, max_tokens=10, tokenizer=tokenizer)
+        self.assertEqual(report["kept_tokens"], 10)
+        self.assertEqual(report["raw_tokens"], 102)
+
+
 if __name__ == "__main__":
     unittest.main()
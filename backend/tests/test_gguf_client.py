@@ -0,0 +1,141 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest.mock import patch
+from data_models import FormGEntry
+
+'''python -m tests.test_gguf_client'''
+
+ENTRY = {"name_filer": "Fund LLC", "report_date": "2024/09/30", "issuer": "Test Corp", "cusip": "02376R102",
+         "shares_owned": 100, "percent_of_class": 5.5, "voting_sole": 100, "voting_shared": 0,
+         "shares_dispo_sole": 100, "shares_dispo_shared": 0}
+
+
+class FakeGrammar:
+    @classmethod
+    def from_json_schema(cls, schema, verbose=False):
+        return cls()
+
+
+class FakeLlama:
+    """llama_cpp.Llama stand-in: answers with the filing number from the prompt, records load and call order"""
+    instances = []
+    calls = []
+    running = max_running = 0
+    lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        FakeLlama.instances.append(self)
+
+    def create_chat_completion(self, messages, grammar=None, max_tokens=None, temperature=None):
+        text = messages[-1]["content"]
+        with FakeLlama.lock:
+            FakeLlama.calls.append(text)
+            FakeLlama.running += 1
+            FakeLlama.max_running = max(FakeLlama.max_running, FakeLlama.running)
+        time.sleep(0.02) # overlap the workers
+        with FakeLlama.lock:
+            FakeLlama.running -= 1
+        if "bad" in text:
+            return {"choices": [{"message": {"content": "not json"}}]}
+        issuer = "Corp " + re.search(r"filing (\d+)", text).group(1)
+        return {"choices": [{"message": {"content": json.dumps({**ENTRY, "issuer": issuer})}}], "usage": {}}
+
+    def tokenize(self, text: bytes, add_bos=False, special=False):
+        return ([1] if add_bos else []) + list(text)
+
+    def detokenize(self, ids):
+        return bytes(i for i in ids if i > 1)
+
+
+# llama_cpp stubbed only while the client module is imported; it keeps the fakes
+with patch.dict(sys.modules, {"llama_cpp": types.SimpleNamespace(Llama=FakeLlama, LlamaGrammar=FakeGrammar)}):
+    sys.modules.pop("llm.gguf_llm_client", None)
+    from llm import gguf_llm_client as gguf
+
+
+def filing(i: int, length: int) -> str:
+    return f"filing {i} " + "x" * length
+
+
+class TestGgufClient(unittest.TestCase):
+    def setUp(self):
+        FakeLlama.instances, FakeLlama.calls = [], []
+        FakeLlama.running = FakeLlama.max_running = 0
+        cores = patch.multiple(gguf, physical_cores=lambda: 8, logical_cores=lambda: 16)
+        cores.start()
+        self.addCleanup(cores.stop)
+
+    def test_threads_split_across_workers(self):
+        llm = gguf.GgufLLMClient("models/Qwen3-4B-Q4_K_M.gguf", n_workers=2)
+        self.assertEqual(llm.model_name, "Qwen3-4B-Q4_K_M.gguf")
+        self.assertEqual(llm.batch_size, 2)
+        self.assertEqual(len(FakeLlama.instances), 1) # the rest load on demand
+        kwargs = FakeLlama.instances[0].kwargs
+        self.assertEqual((kwargs["n_threads"], kwargs["n_threads_batch"]), (4, 8))
+
+    def test_batch_in_input_order(self):
+        llm = gguf.GgufLLMClient("m.gguf", n_workers=3)
+        texts = [filing(i, (i * 37) % 11 * 10) for i in range(8)] + ["bad filing"]
+        results = llm.extract_and_validate_batch(texts, entry_model=FormGEntry, max_tries=0)
+        self.assertEqual([r["issuer"] for r in results[:8]], [f"Corp {i}" for i in range(8)])
+        self.assertIsInstance(results[8], ValueError)
+        self.assertEqual(len(FakeLlama.instances), 3) # loaded up to n_workers, never more
+        self.assertEqual(FakeLlama.max_running, 3)
+        self.assertEqual(llm.models.qsize(), 3) # every instance back in the idle queue
+
+    def test_concurrent_callers_share_n_workers_instances(self):
+        llm = gguf.GgufLLMClient("m.gguf", n_workers=2)
+        threads = [threading.Thread(target=llm.extract_data_llm, args=(filing(i, 10),)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(FakeLlama.calls), 6)
+        self.assertEqual(len(FakeLlama.instances), 2) # extra callers wait for an idle instance
+        self.assertLessEqual(FakeLlama.max_running, 2)
+
+    def test_longest_first(self):
+        llm = gguf.GgufLLMClient("m.gguf", n_workers=1)
+        lengths = [5, 50, 20, 80, 0]
+        llm.extract_and_validate_batch([filing(i, n) for i, n in enumerate(lengths)], entry_model=FormGEntry)
+        order = [int(re.search(r"filing (\d+)", c).group(1)) for c in FakeLlama.calls]
+        self.assertEqual(order, [3, 1, 2, 0, 4])
+
+    def test_tokenizer(self):
+        tokenizer = gguf.GgufLLMClient("m.gguf").tokenizer
+        self.assertEqual(tokenizer.encode("ab"), [97, 98])
+        self.assertEqual(tokenizer.encode("ab", add_special_tokens=True), [1, 97, 98])
+        self.assertEqual(tokenizer.decode([1, 97, 98]), "ab")
+
+
+class TestPhysicalCores(unittest.TestCase):
+    def cpuinfo(self, text: str) -> str:
+        f = tempfile.NamedTemporaryFile("w", suffix=".cpuinfo", delete=False)
+        self.addCleanup(os.unlink, f.name)
+        with f:
+            f.write(text)
+        return f.name
+
+    @patch.object(gguf, "logical_cores", lambda: 16)
+    def test_hyperthreaded(self):
+        processor = "processor\t: {}\nmodel name\t: Xeon\nsiblings\t: 16\ncore id\t\t: {}\ncpu cores\t: 8\n\n"
+        path = self.cpuinfo("".join(processor.format(i, i % 8) for i in range(16)))
+        self.assertEqual(gguf.physical_cores(path), 8)
+
+    @patch.object(gguf, "logical_cores", lambda: 4)
+    def test_no_smt_or_unknown(self):
+        self.assertEqual(gguf.physical_cores(self.cpuinfo("processor\t: 0\nsiblings\t: 4\ncpu cores\t: 4\n")), 4)
+        self.assertEqual(gguf.physical_cores(self.cpuinfo("processor\t: 0\nBogoMIPS\t: 50.00\n")), 4) # arm: no fields
+        self.assertEqual(gguf.physical_cores("/nonexistent/cpuinfo"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+try:
+    import psycopg
+except ImportError: # optional: only the db paths need it
+    psycopg = None
+
+'''python -m tests.test_job_queue
+Needs a scratch Postgres: TEST_DATABASE_URL=postgresql://user:pw@localhost/edgar_test. Everything runs in a throwaway
+schema that is dropped afterwards.'''
+
+DSN = os.getenv("TEST_DATABASE_URL")
+
+
+@unittest.skipIf(psycopg is None or not DSN, "set TEST_DATABASE_URL (and install psycopg) to run the job queue tests")
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        from db.job_queue import create_jobs_table, enqueue_jobs
+        self.schema = f"test_job_queue_{os.getpid()}"
+        self.conn = psycopg.connect(DSN)
+        with self.conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {self.schema};")
+            cur.execute(f"SET search_path TO {self.schema};")
+        self.conn.commit()
+        create_jobs_table(self.conn)
+        self.assertEqual(enqueue_jobs(self.conn, [("CIK1", f"0000000000-24-00000{i}", "13f") for i in range(1, 5)]), 4)
+        self.assertEqual(enqueue_jobs(self.conn, [("CIK1", "0000000000-24-000001", "13f")]), 0) # already queued
+
+    def tearDown(self):
+        self.conn.rollback()
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {self.schema} CASCADE;")
+        self.conn.commit()
+        self.conn.close()
+
+    def _state(self, job_id):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT state, attempts, worker FROM ingest_jobs WHERE job_id = %s;", (job_id,))
+            return cur.fetchone()
+
+    def test_claim_complete(self):
+        from db.job_queue import claim_jobs, complete_jobs, queue_counts
+        a = claim_jobs(self.conn, "w1", batch_size=2)
+        b = claim_jobs(self.conn, "w2", batch_size=10)
+        self.assertEqual(len(a) + len(b), 4)
+        self.assertFalse({j["job_id"] for j in a} & {j["job_id"] for j in b}) # never the same job twice
+        complete_jobs(self.conn, [j["job_id"] for j in a], worker="w2") # not w2's jobs: untouched
+        self.assertEqual(self._state(a[0]["job_id"])[0], "running")
+        complete_jobs(self.conn, [j["job_id"] for j in a], worker="w1")
+        self.assertEqual(queue_counts(self.conn), {"done": 2, "running": 2})
+
+    def test_fail_retries_then_gives_up(self):
+        from db.job_queue import claim_jobs, fail_job
+        job = claim_jobs(self.conn, "w1", batch_size=1, max_attempts=2)[0]
+        fail_job(self.conn, job["job_id"], "boom", max_attempts=2, worker="w1")
+        self.assertEqual(self._state(job["job_id"])[:2], ("pending", 1))
+        again = claim_jobs(self.conn, "w1", batch_size=1, max_attempts=2)[0]
+        self.assertEqual(again["job_id"], job["job_id"]) # oldest first
+        fail_job(self.conn, job["job_id"], "boom", max_attempts=2, worker="w1")
+        self.assertEqual(self._state(job["job_id"])[:2], ("failed", 2))
+
+    def test_expired_lease_is_reclaimed_and_not_renewed(self):
+        from db.job_queue import claim_jobs, renew_leases
+        jobs = claim_jobs(self.conn, "w1", batch_size=4, lease_seconds=1)
+        ids = [j["job_id"] for j in jobs]
+        self.assertEqual(sorted(renew_leases(self.conn, "w1", ids, lease_seconds=1)), sorted(ids))
+        time.sleep(1.5)
+        stolen = claim_jobs(self.conn, "w2", batch_size=1) # w1 looks dead
+        self.assertEqual(len(stolen), 1)
+        self.assertEqual(self._state(stolen[0]["job_id"])[2], "w2")
+        self.assertEqual(sorted(renew_leases(self.conn, "w1", ids)), sorted(set(ids) - {stolen[0]["job_id"]}))
+
+    def test_worker_renews_and_skips_lost_jobs(self):
+        from db.job_queue import claim_jobs, queue_counts
+        from worker import IngestWorker
+        worker = IngestWorker(self.conn, batch_size=4, lease_seconds=600)
+        jobs = claim_jobs(self.conn, worker.worker, batch_size=4, lease_seconds=600)
+        with self.conn.cursor() as cur: # another worker took the last job over
+            cur.execute("UPDATE ingest_jobs SET worker = 'w2' WHERE job_id = %s;", (jobs[-1]["job_id"],))
+        self.conn.commit()
+        parsed = []
+        worker._parse = lambda job: parsed.append(job["job_id"]) or [{"accession_number": job["accession_number"]}]
+        with patch("db.savers.save_13f_to_db") as save:
+            worker.run_batch(jobs)
+        self.assertEqual(parsed, [j["job_id"] for j in jobs[:-1]])
+        self.assertTrue(save.call_args.kwargs["temp"])
+        self.assertEqual(queue_counts(self.conn), {"done": 3, "running": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+from data_models import FormGEntry
+from llm.json_constraint import MAX_STRING, JsonObjectPrefix, schema_fields
+
+'''python -m tests.test_json_constraint'''
+
+ENTRY = {"name_filer": 'PRIMECAP "Mgmt" Co é', "report_date": "2024/09/30", "issuer": "American Airlines Group Inc.",
+         "cusip": "02376R102", "shares_owned": 57339666, "percent_of_class": 8.77, "voting_sole": 55507321,
+         "voting_shared": 0, "shares_dispo_sole": 57339666, "shares_dispo_shared": -1}
+
+
+class TestJsonObjectPrefix(unittest.TestCase):
+    def setUp(self):
+        self.checker = JsonObjectPrefix(schema_fields(FormGEntry))
+
+    def feed(self, text):
+        return self.checker.feed(self.checker.start(), text)
+
+    def test_complete_object_any_whitespace(self):
+        for text in (json.dumps(ENTRY), json.dumps(ENTRY, indent=2), json.dumps(ENTRY, separators=(",", ":")),
+                     json.dumps(ENTRY, ensure_ascii=False)):
+            state = self.feed(text)
+            self.assertTrue(self.checker.is_done(state), text)
+        # every prefix is valid and none of them is done
+        text = json.dumps(ENTRY)
+        for i in range(len(text)):
+            state = self.feed(text[:i])
+            self.assertIsNotNone(state)
+            self.assertFalse(self.checker.is_done(state))
+
+    def test_rejects_what_broke_json_loads(self):
+        self.assertIsNone(self.feed("```json\n{"))
+        self.assertIsNone(self.feed("Here is the JSON: {"))
+        self.assertIsNone(self.feed('{"issuer": "x"')) # keys in schema order only
+        self.assertIsNone(self.feed('{"name_filer": "a", "report_date": "b", "issuer": "c", "cusip": "d", "shares_owned": "NA"'))
+        self.assertIsNone(self.feed('{"name_filer": "a", "report_date": "b", "issuer": "c", "cusip": "d", "shares_owned": 1,234'))
+        self.assertIsNone(self.feed('{"name_filer": "line\nbreak"'))
+        self.assertIsNone(self.feed(json.dumps(ENTRY) + " extra"))
+        self.assertIsNotNone(self.feed(json.dumps(ENTRY) + "\n"))
+
+    def test_types_and_caps(self):
+        prefix = '{"name_filer": "a", "report_date": "b", "issuer": "c", "cusip": "d", "shares_owned": '
+        self.assertIsNone(self.feed(prefix + "1.5")) # integer slot
+        self.assertIsNotNone(self.feed(prefix + '1, "percent_of_class": 8.5'))
+        self.assertIsNone(self.feed(prefix + '1, "percent_of_class": 8.,'))
+        self.assertIsNone(self.feed('{"name_filer": "' + "a" * (MAX_STRING + 1)))
+        self.assertIsNotNone(self.feed('{"name_filer": "\\u00e9\\"'))
+        self.assertIsNone(self.feed('{"name_filer": "\\x'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+from llm.kv_prefix import pad_after_prefix, repeat_cache, split_prefix
+try:
+    import torch
+    from transformers import DynamicCache, LlamaConfig, LlamaForCausalLM
+    from llm.hf_llm_client import HfLLMClient
+except ImportError: # optional: only the huggingface provider needs them
+    torch = None
+
+'''python -m tests.test_kv_prefix'''
+
+PREFIX = [11, 12, 13]
+PAD = 0
+
+
+class TestPrefixLayout(unittest.TestCase):
+    def test_split_prefix(self):
+        self.assertEqual(split_prefix(PREFIX, PREFIX + [5, 6]), [5, 6])
+        self.assertIsNone(split_prefix(PREFIX, [11, 99, 13, 5])) # template tokenized differently: fall back
+        self.assertIsNone(split_prefix(PREFIX, PREFIX)) # nothing left to prefill
+        self.assertIsNone(split_prefix(PREFIX, [11, 12]))
+
+    def test_padding_goes_between_prefix_and_filing(self):
+        input_ids, mask = pad_after_prefix(PREFIX, [[5], [5, 6, 7]], PAD)
+        self.assertEqual(input_ids, [PREFIX + [PAD, PAD, 5], PREFIX + [5, 6, 7]])
+        self.assertEqual(mask, [[1, 1, 1, 0, 0, 1], [1, 1, 1, 1, 1, 1]])
+
+    def test_unexpandable_cache(self):
+        legacy = ((object(),),) # tuple caches can't be repeated in place
+        self.assertIsNotNone(repeat_cache(legacy, 1))
+        self.assertIsNone(repeat_cache(legacy, 2))
+
+
+@unittest.skipIf(torch is None, "torch/transformers not installed")
+class TestPrefixGenerate(unittest.TestCase):
+    """Tiny random Llama: batched generate from a shared prefilled prefix == each prompt generated alone, uncached"""
+    def setUp(self):
+        torch.manual_seed(0)
+        config = LlamaConfig(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=4,
+                             num_key_value_heads=2, max_position_embeddings=128, pad_token_id=PAD, eos_token_id=1)
+        self.model = LlamaForCausalLM(config).eval()
+
+    def test_batched_prefix_matches_single(self):
+        prefix = [2, 3, 4, 5, 6, 7]
+        suffixes = [[8, 9], [10, 11, 12, 13, 14], [15]]
+        kwargs = {"max_new_tokens": 6, "do_sample": False, "min_new_tokens": 6}
+        expected = []
+        for suffix in suffixes:
+            ids = torch.tensor([prefix + suffix])
+            expected.append(self.model.generate(ids, attention_mask=torch.ones_like(ids), **kwargs)[0, ids.shape[1]:].tolist())
+
+        with torch.no_grad():
+            past = self.model(torch.tensor([prefix]), use_cache=True, past_key_values=DynamicCache()).past_key_values
+        input_ids, mask = pad_after_prefix(prefix, suffixes, PAD)
+        cache = repeat_cache(past, len(suffixes))
+        out = self.model.generate(torch.tensor(input_ids), attention_mask=torch.tensor(mask), past_key_values=cache, **kwargs)
+        self.assertEqual([row[len(input_ids[0]):] for row in out.tolist()], expected)
+        self.assertEqual(past.get_seq_length(), len(prefix)) # the shared prefix cache itself is untouched
+
+
+class CharTokenizer:
+    """One token per character, enough of the HF tokenizer interface for HfLLMClient"""
+    pad_token = eos_token = "\x01"
+    pad_token_id = eos_token_id = 1
+    padding_side = "right"
+
+    class Encoding(dict):
+        def __getattr__(self, name):
+            return self[name]
+
+        def to(self, device):
+            return self
+
+    def encode_one(self, text):
+        return [2 + ord(c) % 62 for c in text]
+
+    def __call__(self, texts, return_tensors=None, padding=False):
+        rows = [self.encode_one(t) for t in ([texts] if isinstance(texts, str) else texts)]
+        if return_tensors != "pt":
+            return self.Encoding(input_ids=rows)
+        width = max(len(r) for r in rows)
+        pad = [[self.pad_token_id] * (width - len(r)) for r in rows]
+        ids = [p + r if self.padding_side == "left" else r + p for p, r in zip(pad, rows)]
+        mask = [[0] * len(p) + [1] * len(r) if self.padding_side == "left" else [1] * len(r) + [0] * len(p) for p, r in zip(pad, rows)]
+        return self.Encoding(input_ids=torch.tensor(ids), attention_mask=torch.tensor(mask))
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True, enable_thinking=True):
+        return "".join(f"<{m['role']}>{m['content']}</{m['role']}>" for m in messages) + "<assistant>"
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(64 + i) for i in ids if not (skip_special_tokens and i == self.pad_token_id))
+
+
+@unittest.skipIf(torch is None, "torch/transformers not installed")
+class TestHfPrefixCache(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        config = LlamaConfig(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=4,
+                             num_key_value_heads=2, max_position_embeddings=1024, pad_token_id=PAD, eos_token_id=1)
+        llm = HfLLMClient.__new__(HfLLMClient) # no from_pretrained: tiny random model + char tokenizer
+        llm.model_name, llm.debug, llm.model, llm.tokenizer = "tiny", False, LlamaForCausalLM(config).eval(), CharTokenizer()
+        llm.batch_size, llm.max_new_tokens, llm.enable_thinking, llm.max_thinking_tokens = 2, 5, False, None
+        llm.constrained_json, llm.do_sample, llm.prefix_cache, llm._prefix_state = False, False, True, None
+        llm.build_messages = lambda text: [{"role": "system", "content": "extract 13G fields"}, {"role": "user", "content": text}]
+        self.llm = llm
+        self.texts = ["Fund A holds 5%", "B", "Fund C LLC 02376R102", "D 9"]
+
+    def test_batched_cached_matches_uncached(self):
+        self.llm.prefix_cache = False
+        uncached = self.llm.extract_data_llm_batch(self.texts)
+        single = [self.llm.extract_data_llm(t) for t in self.texts]
+        self.llm.prefix_cache = True
+        calls = []
+        original = self.llm._prefix_batch
+        self.llm._prefix_batch = lambda rows: calls.append(original(rows)) or calls[-1]
+        self.assertEqual(self.llm.extract_data_llm_batch(self.texts), uncached)
+        self.assertTrue(calls and all(c is not None for c in calls)) # every batch went through the cached prefix
+        self.assertEqual([self.llm.extract_data_llm(t) for t in self.texts], single)
+
+    def test_prefix_mismatch_falls_back(self):
+        expected = self.llm.extract_data_llm_batch(self.texts)
+        key, prefix_ids, past = self.llm._prefix_state
+        self.llm._prefix_state = (key, [prefix_ids[0] + 1] + prefix_ids[1:], past) # tokenizer merged across the boundary
+        self.assertIsNone(self.llm._prefix_batch([self.llm.tokenizer.encode_one(self.llm._chat_prompt(t)) for t in self.texts]))
+        self.assertIsNone(self.llm._prefix_kv(self.llm.tokenizer.encode_one(self.llm._chat_prompt(self.texts[0]))))
+        self.assertEqual(self.llm.extract_data_llm_batch(self.texts), expected) # same answers, left padded and uncached
+
+
+if __name__ == "__main__":
+    unittest.main()
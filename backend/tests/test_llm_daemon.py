@@ -0,0 +1,135 @@
+import io
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from data_models import FormGEntry
+from llm.base_llm_client import BaseLLMClient
+from llm.daemon import DaemonError, DaemonLLMClient, LLMDaemon, socket_for
+from llm.helpers import get_llm_client
+
+'''python -m tests.test_llm_daemon'''
+
+ENTRY = {"name_filer": "Fund LLC", "report_date": "2024/09/30", "issuer": "Test Corp", "cusip": "02376R102",
+         "shares_owned": 100, "percent_of_class": 5.5, "voting_sole": 100, "voting_shared": 0,
+         "shares_dispo_sole": 100, "shares_dispo_shared": 0}
+
+
+class FakeTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return [ord(c) for c in text]
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(i) for i in ids)
+
+
+class FakeModel(BaseLLMClient):
+    """stands in for the loaded model on the daemon side"""
+    model_name = "qwen-test"
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.calls = 0
+
+    def extract_and_validate(self, file_text, entry_model, max_tries=1):
+        self.calls += 1
+        if "bad" in file_text:
+            raise ValueError("no json")
+        return {**ENTRY, "issuer": file_text}
+
+
+class TestLLMDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.socket = str(Path(self.tmp.name).joinpath("llm.sock"))
+        self.config = {"provider": "huggingface", "model_name": "qwen-test", "daemon": True, "socket": self.socket,
+                       "autostart": False, "batch_size": 4}
+
+    def _serve(self) -> FakeModel:
+        model = FakeModel()
+        daemon = self.daemon = LLMDaemon(model, self.socket, provider="huggingface")
+        threading.Thread(target=daemon.run, daemon=True).start()
+        self.addCleanup(daemon.shutdown)
+        return model
+
+    def test_client_is_lazy(self):
+        llm = get_llm_client(self.config, debug=False) # no daemon running: must not fail or connect
+        self.assertIsInstance(llm, DaemonLLMClient)
+        self.assertEqual((llm.model_name, llm.batch_size), ("qwen-test", 4))
+        self.assertFalse(llm.connected)
+        with self.assertRaises(DaemonError): # only the first real call needs the daemon
+            llm.extract_and_validate("text", entry_model=FormGEntry)
+
+    def test_extract_batch_and_tokenizer(self):
+        model = self._serve()
+        llm = get_llm_client(self.config, debug=False)
+        results = llm.extract_and_validate_batch(["Corp A", "bad", "Corp B"], entry_model=FormGEntry)
+        self.assertEqual(results[0]["issuer"], "Corp A")
+        self.assertIsInstance(results[1], DaemonError)
+        self.assertEqual(results[2]["issuer"], "Corp B")
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(llm.tokenizer.decode(llm.tokenizer.encode("Item 4")[:4]), "Item")
+
+    def test_tokenizer_never_runs_beside_generate(self):
+        model = self._serve()
+        llm = get_llm_client(self.config, debug=False)
+        done = threading.Event()
+        with self.daemon.model_lock: # a batch is generating
+            threading.Thread(target=lambda: llm.tokenizer.encode("Item 4") and done.set(), daemon=True).start()
+            self.assertFalse(done.wait(0.3)) # shared tokenizer: waits for the model
+        self.assertTrue(done.wait(5))
+
+        model.tokenizer.padding_side = "left" # HF tokenizer: the daemon encodes with its own copy instead
+        copied = LLMDaemon(model, str(Path(self.tmp.name).joinpath("hf.sock")))
+        self.addCleanup(copied.server_close)
+        self.assertIsNot(copied.tokenizer, model.tokenizer)
+        self.assertIsNot(copied.tokenizer_lock, copied.model_lock)
+
+    def test_model_mismatch_is_refused(self):
+        self._serve()
+        llm = DaemonLLMClient({**self.config, "model_name": "other-model"})
+        with self.assertRaises(DaemonError): # would file answers under the wrong cache key
+            llm.extract_and_validate("text", entry_model=FormGEntry)
+
+    def test_socket_per_model(self):
+        small = DaemonLLMClient({"provider": "huggingface", "model_name": "Qwen/Qwen3-4B", "daemon": True})
+        large = DaemonLLMClient({"provider": "huggingface", "model_name": "Qwen/Qwen3-14B", "daemon": True})
+        self.assertEqual(small.socket_path, "llm/llm_daemon-Qwen_Qwen3-4B.sock")
+        self.assertNotEqual(small.socket_path, large.socket_path) # cascade tiers don't collide on one daemon
+        self.assertEqual(len(socket_for("org/" + "x" * 200)), len("llm/llm_daemon-.sock") + 48)
+
+    def _autostart(self, serve_on_exit: bool):
+        """Spawned daemon exits at once (pid/load failure, or it lost the race to another run's daemon)"""
+        test = self
+        class ExitedProc:
+            stdin, returncode = io.BytesIO(), 1
+            def poll(self):
+                if serve_on_exit and not hasattr(self, "model"):
+                    self.model = test._serve() # the other run's daemon came up meanwhile
+                return self.returncode
+        llm = DaemonLLMClient({**self.config, "autostart": True})
+        log = str(Path(self.tmp.name).joinpath("daemon.log")) # not the checkout's llm/llm_daemon.log
+        with patch("llm.daemon.subprocess.Popen", return_value=ExitedProc()) as popen, patch("llm.daemon.DAEMON_LOG", log):
+            result = llm.extract_and_validate("Corp A", entry_model=FormGEntry)
+        self.assertEqual(popen.call_count, 1)
+        return result
+
+    def test_autostart_race_uses_the_winning_daemon(self):
+        self.assertEqual(self._autostart(serve_on_exit=True)["issuer"], "Corp A")
+
+    def test_autostart_failure(self):
+        with self.assertRaises(DaemonError):
+            self._autostart(serve_on_exit=False)
+
+    def test_helpers_import_no_model_libraries(self):
+        code = "import sys, llm.helpers, main; print(any(m in sys.modules for m in ('torch', 'transformers', 'openai')))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import tempfile
+import time
+import unittest
+import uuid
+import urllib.request
+from data_models import FormGEntry
+from llm.stub_llm_server import StubLLMServer
+try:
+    import openai
+    from llm.openai_llm_client import OpenAILLMClient
+except ImportError: # optional: only the openai provider needs it
+    openai = None
+
+'''python -m tests.test_openai_client'''
+
+COVER = ("SCHEDULE 13G Test Corp {i} (Name of Issuer) CUSIP No. 02376R102 1 NAMES OF REPORTING PERSONS Fund {i} LLC "
+         "2 CHECK THE APPROPRIATE BOX 5 SOLE VOTING POWER {i},000")
+
+
+def _server(test: unittest.TestCase, **kwargs) -> StubLLMServer:
+    server = StubLLMServer(model="stub", thinking=False, **kwargs).start()
+    test.addCleanup(server.stop)
+    return server
+
+
+class TestStubBatchApi(unittest.TestCase):
+    """the Files/Batches endpoints OpenAILLMClient(batch_job=True) uses, over plain urllib"""
+    def _call(self, url, data=None, headers=None):
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers or {})) as r:
+            return r.read()
+
+    def test_upload_run_download(self):
+        server = _server(self, latency=0.01)
+        lines = [{"custom_id": f"000000000024{i:06d}", "method": "POST", "url": "/v1/chat/completions",
+                  "body": {"model": "stub" if i else "other", "messages": [{"role": "user", "content": COVER.format(i=i)}]}}
+                 for i in range(3)]
+        boundary = uuid.uuid4().hex
+        form = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"purpose\"\r\n\r\nbatch\r\n"
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"job.jsonl\"\r\n"
+                f"Content-Type: application/jsonl\r\n\r\n").encode() + "".join(json.dumps(l) + "\n" for l in lines).encode() \
+            + f"\r\n--{boundary}--\r\n".encode()
+        uploaded = json.loads(self._call(server.base_url + "/files", form, {"Content-Type": f"multipart/form-data; boundary={boundary}"}))
+        self.assertEqual((uploaded["filename"], uploaded["purpose"]), ("job.jsonl", "batch"))
+
+        batch = json.loads(self._call(server.base_url + "/batches", json.dumps(
+            {"input_file_id": uploaded["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"}).encode(),
+            {"Content-Type": "application/json"}))
+        for _ in range(100):
+            batch = json.loads(self._call(f"{server.base_url}/batches/{batch['id']}"))
+            if batch["status"] == "completed":
+                break
+            time.sleep(0.02)
+        self.assertEqual(batch["request_counts"], {"total": 3, "completed": 2, "failed": 1})
+        out = [json.loads(l) for l in self._call(f"{server.base_url}/files/{batch['output_file_id']}/content").splitlines()]
+        self.assertEqual([r["custom_id"] for r in out], ["000000000024000001", "000000000024000002"])
+        answer = json.loads(out[1]["response"]["body"]["choices"][0]["message"]["content"])
+        self.assertEqual(answer["name_filer"], "Fund 2 LLC")
+        errors = [json.loads(l) for l in self._call(f"{server.base_url}/files/{batch['error_file_id']}/content").splitlines()]
+        self.assertEqual(errors[0]["response"]["status_code"], 404)
+
+
+@unittest.skipIf(openai is None, "openai not installed")
+class TestOpenAIClient(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.batch_dir = tmp.name
+
+    def _llm(self, server, **kwargs) -> "OpenAILLMClient":
+        return OpenAILLMClient("sk-test", "stub", base_url=server.base_url, batch_dir=self.batch_dir, **kwargs)
+
+    def test_async_batch_in_order_with_429_backoff(self):
+        server = _server(self, latency=0.05, max_running=3, retry_after_ms=20)
+        llm = self._llm(server, max_concurrency=8)
+        results = llm.extract_and_validate_batch([COVER.format(i=i) for i in range(1, 13)], entry_model=FormGEntry)
+        self.assertEqual([r["name_filer"] for r in results], [f"Fund {i} LLC" for i in range(1, 13)])
+        self.assertGreaterEqual(server.stats["rejected"], 1) # more in flight than the server takes: 429s, then retried
+        self.assertEqual(server.stats["max_running_seen"], 3)
+
+    def test_single_call_strips_thinking(self):
+        server = StubLLMServer(model="stub", thinking=True).start()
+        self.addCleanup(server.stop)
+        self.assertEqual(self._llm(server).extract_and_validate(COVER.format(i=7), FormGEntry)["voting_sole"], 7000)
+
+    def test_wrong_model_fails_without_retrying(self):
+        server = _server(self)
+        llm = OpenAILLMClient("sk-test", "other", base_url=server.base_url, batch_dir=self.batch_dir)
+        with self.assertRaises(openai.NotFoundError):
+            llm.extract_and_validate(COVER.format(i=1), FormGEntry)
+        self.assertEqual(server.stats["requests"], 1)
+
+    def test_batch_job_maps_accessions_and_resumes(self):
+        server = _server(self, latency=0.01)
+        llm = self._llm(server, batch_job=True, poll_seconds=0.05)
+        items = {f"000000000024{i:06d}": COVER.format(i=i) for i in range(1, 5)}
+        results = llm.run_batch_job(items, FormGEntry)
+        self.assertEqual({acc: r["name_filer"] for acc, r in results.items()}, {acc: f"Fund {int(acc[-6:])} LLC" for acc in items})
+        # same filings again: the recorded job is picked up, nothing resubmitted
+        self.assertEqual(llm.run_batch_job(items, FormGEntry), results)
+        self.assertEqual(server.stats["batches"], 1)
+        # through the parser's entry point too (custom_id = position)
+        outputs = llm.extract_and_validate_batch([COVER.format(i=9)], entry_model=FormGEntry)
+        self.assertEqual(outputs[0]["name_filer"], "Fund 9 LLC")
+
+    def test_batch_job_retries_bad_rows(self):
+        server = _server(self, latency=0.01)
+        answer, bad = server.answer, {"Fund 2 LLC": 1, "Fund 3 LLC": 5} # bad answers before a good one
+        def flaky(prompt):
+            for name, n in bad.items():
+                if name in prompt and n:
+                    bad[name] -= 1
+                    return "not json"
+            return answer(prompt)
+        server.answer = flaky
+        llm = self._llm(server, batch_job=True, poll_seconds=0.05)
+        items = {f"000000000024{i:06d}": COVER.format(i=i) for i in range(1, 4)}
+        results = llm.run_batch_job(items, FormGEntry, max_tries=2)
+        self.assertEqual(results["000000000024000001"]["name_filer"], "Fund 1 LLC")
+        self.assertEqual(results["000000000024000002"]["name_filer"], "Fund 2 LLC") # retried once, through the async path
+        self.assertIsInstance(results["000000000024000003"], ValueError) # still bad after 1 + 2 tries
+        self.assertEqual((server.stats["batches"], server.stats["requests"]), (1, 1 + 2))
+        self.assertEqual(bad["Fund 3 LLC"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from packed_cache import PackedCache
+from parsers.f13_parser import Form13FParser
+
+'''python -m tests.test_packed_cache'''
+
+ROWS = [{"accession_number": "000108514624005560", "cusip": "02376R102", "value_dollar": 644295}]
+
+
+class TestPackedCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = str(Path(self.tmp.name).joinpath("packed"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_get_and_reopen(self):
+        cache = PackedCache(self.dir)
+        cache.put("acc1", ROWS, version=1)
+        self.assertEqual(cache.get("acc1"), ROWS) # read back from our own, still growing, segment
+        cache.put("acc2", ROWS * 2, version=1)
+        self.assertEqual(len(cache.get("acc2")), 2)
+        self.assertIsNone(cache.get("acc1", min_version=2)) # version checked from the index only
+        self.assertEqual(cache.version("acc1"), 1)
+        cache.close()
+
+        reopened = PackedCache(self.dir)
+        self.assertEqual(reopened.get("acc1"), ROWS)
+        self.assertEqual(len(list(Path(self.dir).iterdir())), 2) # one .dat + one .idx, not one file per accession
+        reopened.close()
+
+    def test_newest_record_wins_and_compact(self):
+        cache = PackedCache(self.dir)
+        cache.put("acc1", ROWS, version=1)
+        cache.put("acc1", ROWS * 3, version=2)
+        cache.put("acc2", ROWS, version=1)
+        self.assertEqual(len(cache.get("acc1")), 3)
+        self.assertGreater(cache.stats()["dead_bytes"], 0)
+
+        result = cache.compact(min_version=2)
+        self.assertEqual((result["kept"], result["dropped"]), (1, 1))
+        self.assertEqual(cache.stats()["dead_bytes"], 0)
+        self.assertEqual(len(cache.get("acc1")), 3)
+        cache.close()
+        reopened = PackedCache(self.dir)
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(len(reopened.get("acc1")), 3)
+        reopened.close()
+
+    def test_torn_index_line_is_ignored(self):
+        cache = PackedCache(self.dir)
+        cache.put("acc1", ROWS, version=1)
+        cache.close()
+        idx = next(Path(self.dir).glob("*.idx"))
+        with idx.open("a") as fh:
+            fh.write('["acc2", 1, 9')
+        reopened = PackedCache(self.dir)
+        self.assertEqual(len(reopened), 1)
+        reopened.close()
+
+    def test_parser_migrates_legacy_json(self):
+        legacy = Path(self.tmp.name)
+        legacy.joinpath("acc1.json").write_text(json.dumps({"cache_time": 0, "parser_version": 1, "rows": ROWS}))
+        with patch.object(Form13FParser, "CACHE_DIR", self.dir), patch.object(Form13FParser, "LEGACY_CACHE_DIR", str(legacy)):
+            parser = Form13FParser(client=None)
+            self.assertEqual(parser._load_cache("acc1"), ROWS)
+            self.assertFalse(legacy.joinpath("acc1.json").exists())
+            self.assertEqual(parser._load_cache("acc1"), ROWS) # now from the pack
+            parser._save_to_cache("acc2", ROWS)
+            self.assertEqual(parser._load_cache("acc2"), ROWS)
+            parser.cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from scheduler import CrawlScheduler, read_cik_file
+
+'''python -m tests.test_scheduler'''
+
+FEED = {"filings": {"recent": {"accessionNumber": ["0001085146-24-005560"], "form": ["13F-HR"], "filingDate": ["2024-11-12"]}}}
+
+
+class TestCrawlScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.status_file = str(Path(self.tmp.name).joinpath("crawl_status.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_cik_file(self):
+        path = Path(self.tmp.name).joinpath("ciks.txt")
+        path.write_text("763212\nCIK0001000001 # some fund\n\n")
+        self.assertEqual(read_cik_file(str(path)), ["CIK0000763212", "CIK0001000001"])
+
+    @patch("scheduler.Form13FParser")
+    @patch("scheduler.EdgarClient")
+    def test_failing_fund_does_not_stop_crawl(self, client_cls, parser_cls):
+        def make_client(cik, **kwargs):
+            client = MagicMock()
+            client.cik = cik
+            if cik == "CIK0000000002":
+                client.get_submissions_feed.side_effect = RuntimeError("boom")
+            else:
+                client.get_submissions_feed.return_value = FEED
+            return client
+        client_cls.side_effect = make_client
+        parser_cls.return_value.parse_all.return_value = [{"cusip": "02376R102"}, {"cusip": "65290E101"}]
+
+        scheduler = CrawlScheduler(["CIK0000000001", "CIK0000000002", "CIK0000000003"], "test agent",
+                                   max_funds=2, status_file=self.status_file)
+        scheduler._save = MagicMock()
+        status = scheduler.run()
+        self.assertEqual(status["CIK0000000002"]["state"], "failed")
+        self.assertIn("boom", status["CIK0000000002"]["error"])
+        self.assertEqual(status["CIK0000000001"]["n_13f"], 2)
+        self.assertEqual(status["CIK0000000003"]["state"], "done")
+        # every fund shares the scheduler's limiter and session
+        for call in client_cls.call_args_list:
+            self.assertIs(call.kwargs["limiter"], scheduler.limiter)
+            self.assertIs(call.kwargs["session"], scheduler.session)
+        self.assertTrue(Path(self.status_file).exists())
+
+    @patch("scheduler.SubmissionsSync")
+    @patch("scheduler.Form13FParser")
+    @patch("scheduler.EdgarClient")
+    def test_sync_mark_skips_failed_filings(self, client_cls, parser_cls, sync_cls):
+        filings = [{"accession": "0001085146-24-005560", "form": "13F-HR", "filing_date": "2024-11-12"}]
+        sync_cls.return_value.new_filings.return_value = filings
+        client_cls.return_value.get_submissions_feed.return_value = FEED
+        parser_cls.return_value.parse_all.return_value = []
+        parser_cls.return_value.failed = ["000108514624005560"]
+        scheduler = CrawlScheduler(["CIK0000000001"], "test agent", sync=True, status_file=self.status_file)
+        scheduler._save = MagicMock()
+        scheduler.run()
+        sync_cls.return_value.mark_done.assert_called_once_with("13f", filings, failed=["000108514624005560"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+from sync import SubmissionsSync
+
+'''python -m tests.test_sync'''
+
+
+def _block(rows):
+    return {
+        "accessionNumber": [r[0] for r in rows],
+        "form": [r[1] for r in rows],
+        "filingDate": [r[2] for r in rows],
+    }
+
+
+class TestSubmissionsSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_file = str(Path(self.tmp.name).joinpath("sync_state.json"))
+        self.client = MagicMock()
+        self.client.cik = "CIK0000763212"
+        self.shard = _block([("0000000000-19-000001", "13F-HR", "2019-02-14")])
+        self.client.fetch_json_with_retry.return_value = self.shard
+        self.submissions = {"filings": {
+            "recent": _block([
+                ("0001085146-24-000003", "SC 13G/A", "2024-11-12"),
+                ("0001085146-24-000002", "13F-HR", "2024-11-12"),
+                ("0001085146-24-000001", "13F-HR", "2024-08-14"),
+            ]),
+            "files": [{"name": "CIK0000763212-submissions-001.json", "filingFrom": "2001-01-01", "filingTo": "2019-12-31"}],
+        }}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_first_sync_follows_shards_oldest_first(self):
+        syncer = SubmissionsSync(self.client, state_file=self.state_file)
+        new = syncer.new_filings(self.submissions, "13f")
+        self.assertEqual([f["accession"] for f in new],
+                         ["0000000000-19-000001", "0001085146-24-000001", "0001085146-24-000002"])
+        self.client.fetch_json_with_retry.assert_called_once_with(
+            "https://data.sec.gov/submissions/CIK0000763212-submissions-001.json")
+
+    def test_high_water_mark_persists(self):
+        syncer = SubmissionsSync(self.client, state_file=self.state_file)
+        syncer.mark_done("13f", syncer.new_filings(self.submissions, "13f"))
+        self.client.fetch_json_with_retry.reset_mock()
+
+        # next run, one new 13F filed the same day as the old mark
+        self.submissions["filings"]["recent"] = _block([
+            ("0001085146-24-000004", "13F-HR", "2024-11-12"),
+            ("0001085146-24-000003", "SC 13G/A", "2024-11-12"),
+            ("0001085146-24-000002", "13F-HR", "2024-11-12"),
+            ("0001085146-24-000001", "13F-HR", "2024-08-14"),
+        ])
+        syncer = SubmissionsSync(self.client, state_file=self.state_file)
+        new = syncer.new_filings(self.submissions, "13f")
+        self.assertEqual([f["accession"] for f in new], ["0001085146-24-000004"])
+        self.client.fetch_json_with_retry.assert_not_called() # no shard requests once caught up
+        # 13G has its own mark, never synced, so it's still new
+        self.assertEqual([f["accession"] for f in syncer.new_filings(self.submissions, "13g")], ["0001085146-24-000003"])
+
+    def test_failed_filing_stays_above_mark(self):
+        syncer = SubmissionsSync(self.client, state_file=self.state_file)
+        new = syncer.new_filings(self.submissions, "13f")
+        # the middle filing's parse failed (network error, bad infotable, ...): the mark stops before it
+        syncer.mark_done("13f", new, failed=["000108514624000001"])
+        self.assertEqual(syncer.high_water_mark("13f")["accession"], "0000000000-19-000001")
+        syncer = SubmissionsSync(self.client, state_file=self.state_file)
+        self.assertEqual([f["accession"] for f in syncer.new_filings(self.submissions, "13f")],
+                         ["0001085146-24-000001", "0001085146-24-000002"]) # retried next run
+        # oldest one failed: no mark at all yet
+        other = SubmissionsSync(self.client, state_file=str(Path(self.tmp.name).joinpath("other.json")))
+        other.mark_done("13f", new, failed=["0000000000-19-000001"])
+        self.assertIsNone(other.high_water_mark("13f"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from data_models import FormGEntry
+from llm.stub_llm_server import StubLLMServer
+from llm.vllm_llm_client import VllmLLMClient
+
+'''python -m tests.test_vllm_client'''
+
+COVER = ("SCHEDULE 13G Test Corp {i} (Name of Issuer) CUSIP No. 02376R102 1 NAMES OF REPORTING PERSONS Fund {i} LLC "
+         "2 CHECK THE APPROPRIATE BOX 5 SOLE VOTING POWER {i},000")
+
+
+class TestVllmClient(unittest.TestCase):
+    def _server(self, **kwargs) -> StubLLMServer:
+        server = StubLLMServer(model="stub", **kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_batch_in_order_and_in_flight_cap(self):
+        server = self._server(latency=0.05, max_running=4)
+        llm = VllmLLMClient("stub", base_url=server.base_url, max_in_flight=4)
+        self.assertTrue(llm.health())
+        results = llm.extract_and_validate_batch([COVER.format(i=i) for i in range(1, 13)], entry_model=FormGEntry)
+        self.assertEqual([r["name_filer"] for r in results], [f"Fund {i} LLC" for i in range(1, 13)])
+        self.assertEqual(results[2]["voting_sole"], 3000)
+        # requests overlapped, but never more than max_in_flight: the server never had to turn one away
+        self.assertEqual(server.stats["max_running_seen"], 4)
+        self.assertEqual(server.stats["rejected"], 0)
+
+    def test_429_backs_off_and_retries(self):
+        server = self._server(latency=0.2, max_running=1)
+        llm = VllmLLMClient("stub", base_url=server.base_url, max_in_flight=2)
+        results = llm.extract_and_validate_batch([COVER.format(i=1), COVER.format(i=2)], entry_model=FormGEntry)
+        self.assertTrue(all(isinstance(r, dict) for r in results))
+        self.assertGreaterEqual(server.stats["rejected"], 1)
+        self.assertLess(llm.limiter.rate, llm.limiter.max_rate) # slowed down
+
+    def test_bad_model_is_an_error_not_a_retry(self):
+        server = self._server()
+        llm = VllmLLMClient("other-model", base_url=server.base_url)
+        self.assertFalse(llm.health())
+        results = llm.extract_and_validate_batch([COVER.format(i=1)], entry_model=FormGEntry)
+        self.assertIsInstance(results[0], Exception)
+        self.assertEqual(server.stats["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
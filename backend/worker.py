@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import socket
+import time
+import traceback
+from itertools import groupby
+from typing import Dict, List
+from edgar_client import EdgarClient, RateLimiter
+from http_cache import HttpCache
+from sync import FORM_MATCHERS, SubmissionsSync
+from parsers.f13_parser import Form13FParser
+from parsers.g13_parser import Form13GParser
+from db.connect_db import get_conn
+from db.job_queue import (create_jobs_table, enqueue_jobs, claim_jobs, complete_jobs, fail_job, queue_counts, reset_failed,
+                          renew_leases, drop_worker_staging_tables)
+
+'''
+Distributed ingestion: jobs live in the postgres ingest_jobs table (db/job_queue.py), any number of workers on any
+machine claim them with SKIP LOCKED, run the normal parser + saver, and mark them done.
+
+Queue work:     python worker.py enqueue --cik_file ciks.txt --form_type 13f [--sync]
+                python worker.py enqueue --index full-index/2024/QTR4/form.idx --form_type 13f
+Run a worker:   python worker.py work --batch 10 [--drain]
+Queue status:   python worker.py status
+'''
+
+USER_AGENT = "My Name myname@gmail.com"
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class IngestWorker:
+    def __init__(self, conn, batch_size: int = 10, lease_seconds: int = 600, max_attempts: int = 3,
+                 llm_factory=None, http_cache: HttpCache = None):
+        self.conn = conn
+        self.worker = worker_id()
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.llm_factory = llm_factory
+        self._llm = None
+        self.http_cache = http_cache
+        self.limiter = RateLimiter()
+        self.session = None
+        self.clients: Dict[str, EdgarClient] = {}
+
+    def _client(self, cik: str) -> EdgarClient:
+        if cik not in self.clients:
+            client = EdgarClient(cik, user_agent=USER_AGENT, limiter=self.limiter, session=self.session, http_cache=self.http_cache)
+            self.session = client.session
+            self.clients[cik] = client
+        return self.clients[cik]
+
+    def _parse(self, job: dict):
+        """Run the existing parser for one job. Raises on failure so the job gets retried"""
+        client = self._client(job["cik"])
+        acc = job["accession_number"].replace("-", "")
+        if job["form"] == "13f":
+            return Form13FParser(client).parse_one(acc) # [] = no infotable, nothing to retry
+        if self._llm is None:
+            self._llm = self.llm_factory()
+        entry = Form13GParser(client, self._llm).parse_primary_doc(acc)
+        if not entry:
+            raise RuntimeError("no data extracted")
+        return [entry]
+
+    def run_batch(self, jobs: List[dict]) -> None:
+        from db.savers import save_13f_to_db, save_13g_to_db
+        jobs = sorted(jobs, key=lambda j: j["form"])
+        held = {j["job_id"] for j in jobs} # leases we still own: renewed before each job, so a slow batch keeps them
+        for form, group in groupby(jobs, key=lambda j: j["form"]):
+            rows, ok_ids = [], []
+            for job in group:
+                held = set(renew_leases(self.conn, self.worker, list(held), self.lease_seconds))
+                if job["job_id"] not in held:
+                    print(f"Job {job['job_id']} ({job['accession_number']}) lease lost to another worker, skipping")
+                    continue
+                try:
+                    rows.extend(self._parse(job))
+                    ok_ids.append(job["job_id"])
+                except Exception as e:
+                    print(f"Job {job['job_id']} ({job['accession_number']}) failed: {e}")
+                    traceback.print_exc()
+                    fail_job(self.conn, job["job_id"], f"{type(e).__name__}: {e}", max_attempts=self.max_attempts, worker=self.worker)
+                    held.discard(job["job_id"])
+            try:
+                if rows:
+                    # TEMP staging table: private to the saver's connection, gone when it closes, so workers never collide
+                    (save_13f_to_db if form == "13f" else save_13g_to_db)(rows, temp=True)
+                complete_jobs(self.conn, ok_ids, worker=self.worker)
+            except Exception as e:
+                for job_id in ok_ids:
+                    fail_job(self.conn, job_id, f"save failed: {e}", max_attempts=self.max_attempts, worker=self.worker)
+            held -= set(ok_ids)
+
+    def run(self, drain: bool = False, poll_seconds: int = 10) -> None:
+        print(f"Worker {self.worker} started")
+        while True:
+            jobs = claim_jobs(self.conn, self.worker, self.batch_size, self.lease_seconds, self.max_attempts)
+            if not jobs:
+                if drain:
+                    print(f"Queue drained: {queue_counts(self.conn)}")
+                    return
+                time.sleep(poll_seconds)
+                continue
+            print(f"Claimed {len(jobs)} jobs")
+            self.run_batch(jobs)
+
+
+def enqueue_from_feeds(conn, ciks: List[str], form_type: str, sync: bool, http_cache: HttpCache) -> int:
+    """Queue every matching filing in each fund's submissions feed (full history). With sync, only filings newer than
+    the last enqueue run, and the fund's high-water mark advances once its jobs are committed"""
+    limiter, session = RateLimiter(), None
+    n = 0
+    for cik in ciks:
+        client = EdgarClient(cik, user_agent=USER_AGENT, limiter=limiter, session=session, http_cache=http_cache)
+        session = client.session
+        submissions = client.get_submissions_feed()
+        syncer = SubmissionsSync(client)
+        filings = syncer.new_filings(submissions, form_type) if sync else \
+            [f for f in syncer.iter_filings(submissions) if FORM_MATCHERS[form_type](f["form"])]
+        n += enqueue_jobs(conn, [(cik, f["accession"], form_type) for f in filings])
+        if sync:
+            syncer.mark_done(form_type, filings) # the queue owns these filings now
+    return n
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser(description="Postgres-backed distributed EDGAR ingestion")
+    sub = parse.add_subparsers(dest="cmd", required=True)
+    enq = sub.add_parser("enqueue", help="Queue filings")
+    enq.add_argument("--form_type", type=str, choices=["13f", "13g"], required=True)
+    enq.add_argument("--cik", type=str, nargs="*", default=[])
+    enq.add_argument("--cik_file", type=str)
+    enq.add_argument("--index", nargs="*", default=[], help="Local form.idx / master.idx files")
+    enq.add_argument("--sync", action="store_true", help="Only queue filings newer than the last enqueue run")
+    work = sub.add_parser("work", help="Claim and process jobs")
+    work.add_argument("--batch", type=int, default=10)
+    work.add_argument("--lease_seconds", type=int, default=600)
+    work.add_argument("--max_attempts", type=int, default=3)
+    work.add_argument("--drain", action="store_true", help="Exit when the queue is empty instead of polling")
+    work.add_argument("--config_file", type=str, default="config_hf.json", help="Name of config json file in config folder, for 13G LLM processing")
+    status = sub.add_parser("status", help="Job counts by state")
+    status.add_argument("--reset_failed", action="store_true", help="Requeue failed jobs")
+    status.add_argument("--drop_old_staging", action="store_true", help="Drop per-worker staging tables left by older workers")
+    args = parse.parse_args()
+
+    conn = get_conn()
+    create_jobs_table(conn)
+    if args.cmd == "enqueue":
+        from bulk_ingest import iter_full_index, filter_forms
+        from scheduler import read_cik_file
+        ciks = args.cik + (read_cik_file(args.cik_file) if args.cik_file else [])
+        http_cache = HttpCache()
+        n = enqueue_from_feeds(conn, ciks, args.form_type, args.sync, http_cache)
+        for path in args.index:
+            n += enqueue_jobs(conn, ((w.cik, w.accession, args.form_type) for w in filter_forms(iter_full_index(path), args.form_type)))
+        print(f"Queued {n} new jobs: {queue_counts(conn)}")
+    elif args.cmd == "work":
+        def llm_factory():
+            from llm.helpers import get_llm_client
+            return get_llm_client(json.load(open(os.path.join("config", args.config_file))), debug=False)
+        IngestWorker(conn, batch_size=args.batch, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts,
+                     llm_factory=llm_factory, http_cache=HttpCache()).run(drain=args.drain)
+    else:
+        if args.reset_failed:
+            print(f"Requeued {reset_failed(conn)} failed jobs")
+        if args.drop_old_staging:
+            print(f"Dropped {drop_worker_staging_tables(conn)} old staging tables")
+        print(queue_counts(conn))
+    conn.close()